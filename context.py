@@ -5,9 +5,16 @@ import xbmcaddon
 import xbmcvfs
 import json
 import os
-from resources.lib.database import ShowDatabase
+from resources.lib.database import ShowDatabase, CACHE_INVALIDATE_MESSAGE
 from resources.lib.metadata import ShowMetadata
 from resources.lib.chapters import ChapterManager
+from resources.lib.probe import shutdown_probe_backend
+
+# Where the entered times are applied
+SCOPE_SHOW = 'show'
+SCOPE_EPISODE = 'episode'
+SCOPE_SEASON = 'season'
+SCOPE_ALL_EPISODES = 'all'
 
 def get_selected_item_info():
     """Get info about the selected item in Kodi"""
@@ -15,20 +22,30 @@ def get_selected_item_info():
         xbmc.log('SkipIntro: Getting selected item info', xbmc.LOGINFO)
         
         # Get info from selected list item
-        showtitle = xbmc.getInfoLabel('ListItem.TVShowTitle')
+        dbtype = xbmc.getInfoLabel('ListItem.DBType') or 'episode'
+        showtitle = xbmc.getInfoLabel('ListItem.TVShowTitle') or xbmc.getInfoLabel('ListItem.Title')
         season = xbmc.getInfoLabel('ListItem.Season')
         episode = xbmc.getInfoLabel('ListItem.Episode')
         filepath = xbmc.getInfoLabel('ListItem.FileNameAndPath')
+        tvshowid = xbmc.getInfoLabel('ListItem.DBID' if dbtype == 'tvshow' else 'ListItem.TvShowDBID')
         
-        if not all([showtitle, season, episode, filepath]):
+        # Seasons and shows have no file; a season still needs its number
+        required = {
+            'episode': [showtitle, season, episode, filepath],
+            'season': [showtitle, season],
+            'tvshow': [showtitle]
+        }.get(dbtype, [showtitle, season, episode, filepath])
+        if not all(required):
             xbmc.log('SkipIntro: Missing required item info', xbmc.LOGWARNING)
             return None
             
         item = {
+            'dbtype': dbtype,
             'showtitle': showtitle,
-            'season': int(season),
-            'episode': int(episode),
-            'file': filepath
+            'season': int(season) if season else None,
+            'episode': int(episode) if episode and dbtype == 'episode' else None,
+            'file': filepath if dbtype == 'episode' else None,
+            'tvshowid': int(tvshowid) if tvshowid.isdigit() else None
         }
         
         xbmc.log(f'SkipIntro: Found item - Show: {showtitle}, S{season}E{episode}', xbmc.LOGINFO)
@@ -68,8 +85,12 @@ def get_time_input(dialog, prompt, default='', required=True):
             continue
         return None
 
-def get_manual_times(show_id, db):
-    """Get times manually from user input or select chapters"""
+def get_manual_times(show_id, db, episode_times=None):
+    """Get times manually from user input or select chapters.
+
+    With episode_times, the saved times of the selected episode are offered
+    for copying to other episodes.
+    """
     try:
         dialog = xbmcgui.Dialog()
         
@@ -77,12 +98,17 @@ def get_manual_times(show_id, db):
         config = get_show_settings(show_id, db)
         
         # Ask user to choose between manual time input or chapter selection
-        choice = dialog.select('Choose skip method', ['Manual time input', 'Chapter selection'])
+        options = ['Manual time input', 'Chapter selection']
+        if episode_times:
+            options.append('Copy times from this episode')
+        choice = dialog.select('Choose skip method', options)
         
         if choice == 0:  # Manual time input
             return get_manual_time_input(dialog, config)
         elif choice == 1:  # Chapter selection
             return get_chapter_selection(dialog)
+        elif choice == 2:  # Copy the selected episode's times
+            return dict(episode_times, copied=True)
         else:
             return None
         
@@ -157,18 +183,108 @@ def get_chapter_selection(dialog):
         'outro_start_time': None
     }
 
-def save_user_times():
-    """Save user-provided times for show"""
-    xbmc.log('SkipIntro: Starting manual time input', xbmc.LOGINFO)
-    
-    item = get_selected_item_info()
-    if not item:
-        xbmc.log('SkipIntro: No item selected', xbmc.LOGERROR)
-        xbmcgui.Dialog().notification('Skip Intro', 'No item selected', xbmcgui.NOTIFICATION_ERROR)
-        return
-    
-    xbmc.log(f'SkipIntro: Selected item info: {item}', xbmc.LOGINFO)
-        
+def get_scope(dialog, item, times):
+    """Ask where the times apply; returns a SCOPE_* value or None if cancelled"""
+    scopes = []
+    if not times.get('copied'):
+        scopes.append(('Show setting (episodes without their own times)', SCOPE_SHOW))
+        if item['episode'] is not None:
+            scopes.append((f'This episode (S{item["season"]:02d}E{item["episode"]:02d})', SCOPE_EPISODE))
+    # Listing a season or the whole show needs the library's tvshowid
+    if item['tvshowid'] is not None:
+        if item['season'] is not None:
+            scopes.append((f'Every episode of season {item["season"]}', SCOPE_SEASON))
+        scopes.append(('Every episode of the show', SCOPE_ALL_EPISODES))
+    if not scopes:
+        xbmc.log('SkipIntro: Show is not in the video library', xbmc.LOGWARNING)
+        xbmcgui.Dialog().notification('Skip Intro', 'Show is not in the video library', xbmcgui.NOTIFICATION_ERROR)
+        return None
+    if len(scopes) == 1:
+        return scopes[0][1]
+    choice = dialog.select('Apply times to', [label for label, _ in scopes])
+    return scopes[choice][1] if choice >= 0 else None
+
+def get_library_episodes(tvshowid, season=None):
+    """List the library's episodes of a show, optionally one season, or None on error"""
+    if tvshowid is None:
+        xbmc.log('SkipIntro: Show is not in the video library', xbmc.LOGWARNING)
+        return None
+    params = {'tvshowid': tvshowid, 'properties': ['season', 'episode', 'file']}
+    if season is not None:
+        params['season'] = season
+    try:
+        result = json.loads(xbmc.executeJSONRPC(json.dumps({
+            'jsonrpc': '2.0',
+            'method': 'VideoLibrary.GetEpisodes',
+            'params': params,
+            'id': 1
+        })))
+        if 'result' not in result:
+            xbmc.log(f'SkipIntro: VideoLibrary.GetEpisodes failed: {result.get("error")}', xbmc.LOGERROR)
+            return None
+        return result['result'].get('episodes', [])
+    except Exception as e:
+        xbmc.log(f'SkipIntro: Error listing episodes: {str(e)}', xbmc.LOGERROR)
+        return None
+
+def build_episode_rows(db, show_id, episodes, times):
+    """Return (rows, skipped) for save_episode_times_many.
+
+    Chapter numbers are resolved to times in every file, reading the files
+    in parallel on the probe pool; episodes lacking those chapters are
+    skipped.
+    """
+    if not times.get('use_chapters'):
+        episode_times = {column: times.get(column) for column in (
+            'intro_start_time', 'intro_end_time', 'outro_start_time',
+            'intro_start_chapter', 'intro_end_chapter')}
+        episode_times['source'] = 'manual'
+        return [(show_id, episode['season'], episode['episode'], dict(episode_times, episodeid=episode.get('episodeid')))
+                for episode in episodes], 0
+
+    chapter_manager = ChapterManager(db)
+    files = [episode['file'] for episode in episodes if episode.get('file')]
+    progress = xbmcgui.DialogProgressBG()
+    progress.create('Skip Intro', f'Reading chapters of {len(files)} episode(s)')
+    try:
+        chapters = chapter_manager.get_chapters_many(files)
+    finally:
+        progress.close()
+
+    rows = []
+    for episode in episodes:
+        episode_times = chapter_manager.resolve_chapter_times(
+            chapters.get(episode.get('file')),
+            times.get('intro_start_chapter'),
+            times.get('intro_end_chapter'),
+            times.get('outro_start_chapter'))
+        if episode_times is None:
+            xbmc.log(f'SkipIntro: Chapters not found in {episode.get("file")}', xbmc.LOGWARNING)
+            continue
+        episode_times['source'] = 'manual'
+        episode_times['episodeid'] = episode.get('episodeid')
+        rows.append((show_id, episode['season'], episode['episode'], episode_times))
+    return rows, len(episodes) - len(rows)
+
+def save_episode_times(db, show_id, item, times, scope):
+    """Write times to every episode in scope with one transaction; returns the number saved or None"""
+    if scope == SCOPE_EPISODE:
+        episodes = [{'season': item['season'], 'episode': item['episode'], 'file': item['file']}]
+    else:
+        episodes = get_library_episodes(item['tvshowid'], item['season'] if scope == SCOPE_SEASON else None)
+    if not episodes:
+        xbmc.log('SkipIntro: No library episodes found to apply times to', xbmc.LOGWARNING)
+        return None
+
+    rows, skipped = build_episode_rows(db, show_id, episodes, times)
+    if skipped:
+        xbmc.log(f'SkipIntro: Skipped {skipped} episode(s) without the selected chapters', xbmc.LOGWARNING)
+    if not rows or not db.save_episode_times_many(rows):
+        return None
+    return len(rows)
+
+def get_database():
+    """Open the add-on database, or None on error"""
     # Initialize database
     xbmc.log('SkipIntro: Initializing database', xbmc.LOGINFO)
     addon = xbmcaddon.Addon()
@@ -179,23 +295,40 @@ def save_user_times():
     translated_path = xbmcvfs.translatePath(db_path)
     xbmc.log(f'SkipIntro: Database path translated: {translated_path}', xbmc.LOGINFO)
     
-    # Ensure database directory exists
-    db_dir = os.path.dirname(translated_path)
-    if not os.path.exists(db_dir):
-        os.makedirs(db_dir)
-        xbmc.log(f'SkipIntro: Created database directory: {db_dir}', xbmc.LOGINFO)
-    
     try:
+        # Creates the directory if needed; an up-to-date schema costs one pragma read
         db = ShowDatabase(translated_path)
-        if not db:
-            raise Exception("Failed to initialize database")
         xbmc.log('SkipIntro: Database initialized successfully', xbmc.LOGINFO)
+        return db
     except Exception as e:
         xbmc.log(f'SkipIntro: Database initialization error: {str(e)}', xbmc.LOGERROR)
-        xbmcgui.Dialog().notification('Skip Intro', 'Database error', xbmcgui.NOTIFICATION_ERROR)
+        return None
+
+def save_user_times():
+    """Save user-provided times for a show, an episode, a season or every episode of a show"""
+    xbmc.log('SkipIntro: Starting manual time input', xbmc.LOGINFO)
+    
+    item = get_selected_item_info()
+    if not item:
+        xbmc.log('SkipIntro: No item selected', xbmc.LOGERROR)
+        xbmcgui.Dialog().notification('Skip Intro', 'No item selected', xbmcgui.NOTIFICATION_ERROR)
         return
     
-    show_id = db.get_show(item['showtitle'])
+    xbmc.log(f'SkipIntro: Selected item info: {item}', xbmc.LOGINFO)
+        
+    db = get_database()
+    if not db:
+        xbmcgui.Dialog().notification('Skip Intro', 'Database error', xbmcgui.NOTIFICATION_ERROR)
+        return
+    try:
+        apply_user_times(db, item)
+    finally:
+        shutdown_probe_backend()
+        db.close()
+
+def apply_user_times(db, item):
+    """Ask for times and save them where the user chooses"""
+    show_id = db.get_show(item['showtitle'], item['tvshowid'])
     if not show_id:
         xbmc.log('SkipIntro: Failed to get show ID', xbmc.LOGERROR)
         xbmcgui.Dialog().notification('Skip Intro', 'Database error', xbmcgui.NOTIFICATION_ERROR)
@@ -204,12 +337,29 @@ def save_user_times():
     xbmc.log(f'SkipIntro: Got show ID: {show_id}', xbmc.LOGINFO)
     
     # Get times from user
-    times = get_manual_times(show_id, db)
+    episode_times = None
+    if item['episode'] is not None:
+        episode_times = db.get_episode_times(show_id, item['season'], item['episode'])
+    times = get_manual_times(show_id, db, episode_times)
     if times is None:
         xbmc.log('SkipIntro: User cancelled time input', xbmc.LOGINFO)
         return
     
     xbmc.log(f'SkipIntro: User input times: {times}', xbmc.LOGINFO)
+
+    scope = get_scope(xbmcgui.Dialog(), item, times)
+    if scope is None:
+        xbmc.log('SkipIntro: User cancelled scope selection', xbmc.LOGINFO)
+        return
+
+    if scope != SCOPE_SHOW:
+        count = save_episode_times(db, show_id, item, times, scope)
+        if count:
+            xbmc.executebuiltin(f'NotifyAll(SkipIntro,{CACHE_INVALIDATE_MESSAGE})')
+            xbmcgui.Dialog().notification('Skip Intro', f'Times saved for {count} episode(s)', xbmcgui.NOTIFICATION_INFO)
+        else:
+            xbmcgui.Dialog().notification('Skip Intro', 'Failed to save times', xbmcgui.NOTIFICATION_ERROR)
+        return
     
     # Save times or chapters for the show
     try:
@@ -233,6 +383,8 @@ def save_user_times():
         
         if success:
             xbmc.log('SkipIntro: Show times saved successfully', xbmc.LOGINFO)
+            # Let the running service drop its cached copy of this show
+            xbmc.executebuiltin(f'NotifyAll(SkipIntro,{CACHE_INVALIDATE_MESSAGE})')
             xbmcgui.Dialog().notification('Skip Intro', 'Times saved successfully', xbmcgui.NOTIFICATION_INFO)
         else:
             raise Exception("Failed to save show times")
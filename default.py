@@ -12,14 +12,25 @@ import xbmcaddon
 import xbmcgui
 import xbmcvfs
 import os
+import threading
 import time
 
 from resources.lib.settings import Settings
 from resources.lib.chapters import ChapterManager
 from resources.lib.ui import PlayerUI
 from resources.lib.show import ShowManager
-from resources.lib.database import ShowDatabase
+from resources.lib.database import ShowDatabase, CACHE_INVALIDATE_MESSAGE
 from resources.lib.metadata import ShowMetadata
+from resources.lib.prefetch import NextEpisodePrefetcher
+from resources.lib.indexer import LibraryIndexer, INDEX_LIBRARY_MESSAGE
+from resources.lib.fingerprint import IntroDetector
+from resources.lib.fingerprint_store import FingerprintStore
+from resources.lib.refine import BoundaryRefiner
+from resources.lib.probe import shutdown_probe_backend
+from resources.lib.sync import create_sync
+from resources.lib.readiness import PlaybackReadiness
+from resources.lib.scheduler import MarkerScheduler
+from resources.lib.timeline import Segment, Timeline
 
 addon = xbmcaddon.Addon()
 
@@ -42,6 +53,9 @@ def get_database():
         return None
 
 class SkipIntroPlayer(xbmc.Player):
+    # Marker sources whose boundaries are worth snapping to a scene cut
+    REFINE_SOURCES = ('chapters', 'default')
+
     def __init__(self):
         super(SkipIntroPlayer, self).__init__()
         self.intro_start = None
@@ -55,15 +69,39 @@ class SkipIntroPlayer(xbmc.Player):
         self.db = get_database()
         self.metadata = ShowMetadata()
         self.ui = PlayerUI()
+        self.chapter_manager = ChapterManager(self.db)
+        self.prefetcher = NextEpisodePrefetcher(self.db, self.chapter_manager)
         self.show_from_start = False  # New flag for chapter-only mode
+        self.timeline = Timeline()
+        self.active_segment = None
+        
+        # Background chapter read and boundary refinement for the current file;
+        # the generation changes on every new file so late results for an old one are dropped
+        self.chapters = None
+        self.chapter_request = None
+        self.refine_request = None
+        self.refiner = BoundaryRefiner()
+        self.marker_source = None
+        self.request_generation = 0
+        self.request_lock = threading.RLock()
         
         # Initialize settings
         self.settings_manager = Settings()
         self.settings = self.settings_manager.settings
         
+        detector = None
+        if self.settings['fingerprint_intros']:
+            detector = IntroDetector(scan_seconds=self.settings['fingerprint_minutes'] * 60,
+                                     db=self.db, store=FingerprintStore.for_database(self.db))
+        refiner = self.refiner if self.settings['refine_boundaries'] else None
+        self.indexer = LibraryIndexer(self.db, self.chapter_manager, self, detector=detector, refiner=refiner)
+        
         # New timing control variables
         self.timer_active = False
         self.next_check_time = 0
+        # request_generation the marker timer was armed under
+        self.timer_generation = 0
+        self.scheduler = MarkerScheduler(self, self.onPlayBackTime)
         
     def onPlayBackStopped(self):
         """Called when playback is stopped by user"""
@@ -73,6 +111,22 @@ class SkipIntroPlayer(xbmc.Player):
         """Called when playback ends naturally"""
         self.cleanup()
         
+    def onPlayBackSeek(self, time, seekOffset):
+        """Re-evaluate segments from the new position"""
+        if self.bookmarks_checked:
+            self.schedule_next_segment(time / 1000.0)
+        else:
+            self.scheduler.rearm(time / 1000.0)
+
+    def onPlayBackPaused(self):
+        self.scheduler.pause()
+
+    def onPlayBackResumed(self):
+        self.scheduler.resume()
+
+    def onPlayBackSpeedChanged(self, speed):
+        self.scheduler.set_speed(speed)
+
     def onPlayBackStarted(self):
         """Called when Kodi starts playing a file"""
         xbmc.log('SkipIntro: Playback started', xbmc.LOGINFO)
@@ -82,133 +136,307 @@ class SkipIntroPlayer(xbmc.Player):
         """Called when Kodi has prepared audio/video for the file"""
         xbmc.log('SkipIntro: AV started', xbmc.LOGINFO)
         # Reset flags for new video
-        self.bookmarks_checked = False
-        self.prompt_shown = False
-        self.default_skip_checked = False
-        self.timer_active = False
-        self.next_check_time = 0
-        self.show_from_start = False
+        with self.request_lock:
+            self.bookmarks_checked = False
+            self.prompt_shown = False
+            self.default_skip_checked = False
+            self.timer_active = False
+            self.next_check_time = 0
+            self.show_from_start = False
+            self.scheduler.reset()
+            self.cancel_background_requests()
         
-        # Wait longer for video info and chapters to be available
-        xbmc.sleep(5000)  # Initial 5 second wait
-        if not self.isPlaying():
+        # Poll until video info is available instead of sleeping a fixed time
+        readiness = PlaybackReadiness(self)
+        if not readiness.wait_for_video_info():
             return
             
         self.detect_show()
-        
-        # Additional wait for chapters with player state validation
-        xbmc.sleep(3000)  # 3 more seconds
-        if not self.isPlaying():
+        if not self.show_info:
             return
-            
-        if self.show_info:
-            # First check saved times
-            self.check_saved_times()
-            
-            # If no saved times and chapters enabled AND show is configured to use chapters, check chapters
-            if not self.intro_bookmark and self.settings['use_chapters'] and self.show_info:
-                show_id = self.db.get_show(self.show_info['title'])
-                if show_id:
-                    config = self.db.get_show_config(show_id)
-                    if config and config['use_chapters']:
-                        chapters = self.getChapters()
-                        if chapters:
-                            xbmc.log(f'SkipIntro: Found {len(chapters)} chapters', xbmc.LOGINFO)
-                            self.check_for_intro_chapter()
-            
-            # If still no intro bookmark, use default skip
-            if not self.intro_bookmark:
-                self.check_for_default_skip()
-            self.bookmarks_checked = True
-            
-            # If we have intro times, set up the timer
-            if self.intro_bookmark is not None:
-                current_time = self.getTime()
-                if self.show_from_start:
-                    # For chapter-only mode, show button from start
-                    self.next_check_time = 0
-                    self.timer_active = True
-                    xbmc.log('SkipIntro: Timer set to show button from start', xbmc.LOGINFO)
-                elif self.intro_start is not None and current_time < self.intro_start:
-                    # Set timer to wake up at intro start
-                    self.next_check_time = self.intro_start
-                    self.timer_active = True
-                    xbmc.log(f'SkipIntro: Timer set to check at {self.next_check_time}', xbmc.LOGINFO)
-                elif current_time < self.intro_bookmark:
-                    # Already in intro period, show button immediately
-                    self.show_skip_button()
+
+        # Warm caches for the next episode while this one plays
+        self.prefetcher.prefetch(self.show_info)
+
+        config = None
+        show_id = self.current_show_id()
+        if show_id:
+            config = self.db.get_show_config(show_id)
+
+        if config and config.get('use_chapters'):
+            # Reading chapters can take seconds on network shares, so do it on the
+            # probe pool and resolve the markers once they arrive
+            self.request_chapters(config, readiness)
+        else:
+            self.resolve_markers()
+
+    def request_chapters(self, config, readiness):
+        """Start reading the playing file's chapters in the background"""
+        # Intro chapter detection matches on chapter titles, which Kodi does not expose
+        need_names = not (config.get('intro_start_chapter') and config.get('intro_end_chapter'))
+        with self.request_lock:
+            self.cancel_background_requests()
+            generation = self.request_generation
+            self.chapter_request = self.chapter_manager.get_chapters_async(
+                self.show_info.get('file'), need_names=need_names, before=readiness.wait_for_chapters)
+            self.chapter_request.add_done_callback(lambda chapters: self.on_chapters_ready(generation, chapters), [])
+
+    def on_chapters_ready(self, generation, chapters):
+        """Runs on the probe worker when the chapters for a file have been read"""
+        with self.request_lock:
+            if generation != self.request_generation or not self.isPlaying():
+                xbmc.log('SkipIntro: Discarding chapters for a file that is no longer playing', xbmc.LOGINFO)
+                return
+            self.chapter_request = None
+            self.chapters = chapters
+            xbmc.log(f'SkipIntro: Found {len(chapters)} chapters', xbmc.LOGINFO)
+            self.resolve_markers(chapters)
+
+    def request_refinement(self):
+        """Snap the intro boundaries to the nearest scene cuts in the background"""
+        playing_file = self.show_info.get('file') if self.show_info else None
+        if not playing_file:
+            return
+        with self.request_lock:
+            generation = self.request_generation
+            self.refine_request = self.refiner.probe.request(
+                self.refiner.refine_markers, playing_file, self.intro_start, self.intro_bookmark)
+            self.refine_request.add_done_callback(lambda markers: self.on_refined(generation, markers))
+
+    def on_refined(self, generation, markers):
+        """Runs on the probe worker with the refined (intro_start, intro_bookmark)"""
+        with self.request_lock:
+            if generation != self.request_generation or not markers:
+                return
+            self.refine_request = None
+            intro_start, intro_bookmark = markers
+            if (intro_start, intro_bookmark) == (self.intro_start, self.intro_bookmark):
+                return
+            xbmc.log(f'SkipIntro: Refined intro to {intro_start}-{intro_bookmark}', xbmc.LOGINFO)
+            self.intro_start = intro_start
+            self.intro_bookmark = intro_bookmark
+            if intro_start is not None:
+                self.intro_duration = intro_bookmark - intro_start
+
+            # Move the armed timer rather than redrawing the UI from this thread
+            self.build_timeline()
+            intro = next((segment for segment in self.timeline if segment.kind == 'intro'), None)
+            if not self.timer_active or intro is None:
+                return
+            if self.active_segment is not None and self.active_segment.kind == 'intro':
+                # The button is up: keep it and hide it at the refined end
+                self.active_segment = intro
+                self.start_timer(intro.end)
+            elif intro.start < self.next_check_time:
+                # A start that has already passed fires at once and shows the button
+                self.start_timer(intro.start)
+
+    def cancel_background_requests(self):
+        """Drop any pending chapter read or refinement so its result is never applied"""
+        with self.request_lock:
+            self.request_generation += 1
+            for request in (self.chapter_request, self.refine_request):
+                if request is not None:
+                    request.cancel()
+            self.chapter_request = None
+            self.refine_request = None
+
+    def resolve_markers(self, chapters=None):
+        """Pick intro/outro markers from saved times, chapters or the default skip"""
+        # First check saved times
+        self.check_saved_times(chapters)
+        
+        # If no saved times and chapters enabled AND show is configured to use chapters, check chapters
+        if not self.intro_bookmark and self.settings['use_chapters'] and chapters:
+            self.check_for_intro_chapter(chapters)
+        
+        # If still no intro bookmark, use default skip
+        if not self.intro_bookmark:
+            self.check_for_default_skip()
+        self.bookmarks_checked = True
+        
+        # Lay out every skippable segment and arm the timer for the first one
+        self.show_skip_button()
+
+        # Chapter and default markers are often a few seconds off the actual cut
+        if (self.settings.get('refine_boundaries') and self.marker_source in self.REFINE_SOURCES
+                and self.intro_bookmark is not None and self.refiner.available):
+            self.request_refinement()
 
     def onPlayBackTime(self, time):
-        """Called during playback with current time"""
-        if not self.prompt_shown and self.timer_active:
-            if time >= self.next_check_time:
+        """Runs on the scheduler thread when playback reaches next_check_time"""
+        with self.request_lock:
+            if self.timer_generation != self.request_generation:
+                xbmc.log('SkipIntro: Discarding timer armed for a file that is no longer playing', xbmc.LOGINFO)
+                return
+            if self.timer_active and time >= self.next_check_time:
                 xbmc.log(f'SkipIntro: Timer triggered at {time}', xbmc.LOGINFO)
-                self.show_skip_button()
-                self.timer_active = False  # Disable timer after showing button
+                self.timer_active = False
+                self.schedule_next_segment(time)
+
+    def start_timer(self, check_time):
+        """Schedule onPlayBackTime for when playback reaches check_time"""
+        with self.request_lock:
+            self.next_check_time = check_time
+            self.timer_active = True
+            self.timer_generation = self.request_generation
+            self.scheduler.arm(check_time)
 
     def show_skip_button(self):
-        """Show skip intro button and handle timing"""
-        if not self.prompt_shown and self.intro_bookmark is not None:
+        """Rebuild the timeline and show the button if playback is inside a segment"""
+        with self.request_lock:
+            self.build_timeline()
+            if len(self.timeline):
+                self.schedule_next_segment()
+            else:
+                xbmc.log('SkipIntro: No segments to skip for this episode', xbmc.LOGINFO)
+
+    def build_timeline(self):
+        """Collect the resolved intro/outro markers and stored segments into a timeline"""
+        total_time = None
+        try:
+            total_time = self.getTotalTime()
+        except Exception:
+            pass
+
+        # Resolved markers go first so they win over overlapping stored segments
+        segments = []
+        if self.intro_bookmark is not None:
+            start = 0 if self.show_from_start or self.intro_start is None else self.intro_start
+            segments.append(Segment(start, self.intro_bookmark, 'intro'))
+        if self.outro_bookmark is not None and total_time:
+            segments.append(Segment(self.outro_bookmark, total_time, 'outro'))
+
+        show_id = self.current_show_id()
+        if show_id:
+            for stored in self.db.get_segments(show_id, self.show_info['season'], self.show_info['episode']):
+                end = stored['end_time'] if stored['end_time'] is not None else total_time
+                if end is not None:
+                    segments.append(Segment(stored['start_time'], end, stored['kind']))
+
+        self.timeline = Timeline(segments)
+        xbmc.log(f'SkipIntro: Timeline: {self.timeline}', xbmc.LOGINFO)
+
+    def schedule_next_segment(self, current_time=None):
+        """Handle the segment playing now and arm the timer for the next boundary"""
+        if current_time is None:
             current_time = self.getTime()
-            show_button = False
-            
-            if self.show_from_start:
-                # For chapter-only mode, show button until end chapter
-                show_button = current_time < self.intro_bookmark
-            elif self.intro_start is not None:
-                # For normal mode, show button during intro period
-                show_button = current_time >= self.intro_start and current_time < self.intro_bookmark
-            
-            if show_button:
-                xbmc.log(f'SkipIntro: Showing skip button at {current_time}', xbmc.LOGINFO)
-                if self.ui.prompt_skip_intro(lambda: self.skip_to_intro_end()):
-                    self.prompt_shown = True
-                    xbmc.log('SkipIntro: Skip button shown successfully', xbmc.LOGINFO)
-                else:
-                    xbmc.log('SkipIntro: Failed to show skip button', xbmc.LOGWARNING)
+
+        with self.request_lock:
+            segment = self.timeline.segment_at(current_time)
+            if segment != self.active_segment:
+                self.leave_segment()
+                if segment is not None:
+                    self.enter_segment(segment)
+                    if self.settings.get('auto_skip'):
+                        return
+
+            if segment is not None:
+                # Hide the button once the segment is over
+                self.start_timer(segment.end)
+                return
+
+            next_segment = self.timeline.next_segment(current_time)
+            if next_segment is not None:
+                self.start_timer(next_segment.start)
+                xbmc.log(f'SkipIntro: Timer set for {next_segment.kind} at {next_segment.start}', xbmc.LOGINFO)
             else:
-                xbmc.log(f'SkipIntro: Not showing skip button. Current time: {current_time}, Intro start: {self.intro_start}, Intro end: {self.intro_bookmark}', xbmc.LOGINFO)
+                self.timer_active = False
+                self.scheduler.cancel()
+
+    def enter_segment(self, segment):
+        """Skip the segment or offer the skip button for it"""
+        self.active_segment = segment
+        if self.settings.get('auto_skip'):
+            xbmc.log(f'SkipIntro: Automatically skipping {segment.kind}', xbmc.LOGINFO)
+            self.skip_segment(segment)
+            return
+
+        xbmc.log(f'SkipIntro: Showing skip button for {segment.kind} at {segment.start}-{segment.end}', xbmc.LOGINFO)
+        # Skip to the active segment's end, which refinement may move while the button is up
+        if self.ui.prompt_skip(lambda: self.skip_segment(self.active_segment or segment), segment.label):
+            self.prompt_shown = True
+            xbmc.log('SkipIntro: Skip button shown successfully', xbmc.LOGINFO)
+        else:
+            xbmc.log('SkipIntro: Failed to show skip button', xbmc.LOGWARNING)
+
+    def leave_segment(self):
+        """Dismiss the button of the segment we were in"""
+        if self.active_segment is not None:
+            self.ui.cleanup()
+            self.prompt_shown = False
+            self.active_segment = None
+
+    def skip_segment(self, segment):
+        try:
+            xbmc.log(f'SkipIntro: Skipping {segment.kind} to {segment.end} seconds', xbmc.LOGINFO)
+            self.seekTime(segment.end)
+        except Exception as e:
+            xbmc.log('SkipIntro: Error skipping segment: {}'.format(str(e)), xbmc.LOGERROR)
 
     def detect_show(self):
-        """Detect current TV show and episode"""
+        """Detect current TV show and episode.
+
+        show_info is the episode identity for the rest of the playback: it
+        carries the playing file and the database show_id, so later steps
+        do not ask Kodi or the database again.
+        """
         if not self.isPlaying():
             xbmc.log('SkipIntro: Not playing, skipping show detection', xbmc.LOGINFO)
             return
             
-        playing_file = self.getPlayingFile()
-        xbmc.log(f'SkipIntro: Detecting show for file: {playing_file}', xbmc.LOGINFO)
-            
         self.show_info = self.metadata.get_show_info()
         if self.show_info:
             xbmc.log('SkipIntro: Detected show info:', xbmc.LOGINFO)
+            xbmc.log(f'  File: {self.show_info.get("file")}', xbmc.LOGINFO)
             xbmc.log(f'  Title: {self.show_info.get("title")}', xbmc.LOGINFO)
             xbmc.log(f'  Season: {self.show_info.get("season")}', xbmc.LOGINFO)
             xbmc.log(f'  Episode: {self.show_info.get("episode")}', xbmc.LOGINFO)
+            show_id = self.current_show_id()
+            if show_id and self.show_info.get('aliases'):
+                for alias in self.show_info['aliases']:
+                    self.db.add_show_alias(show_id, alias)
         else:
             xbmc.log('SkipIntro: Could not detect show info', xbmc.LOGINFO)
 
+    def current_show_id(self):
+        """Database id of the playing show, looked up once per playback"""
+        if not self.db or not self.show_info:
+            return None
+        if self.show_info.get('show_id') is None:
+            self.show_info['show_id'] = self.db.get_show(
+                self.show_info['title'], self.show_info.get('tvshowid'), self.show_info.get('show_uniqueid'))
+        return self.show_info['show_id']
+
     def find_chapter_by_name(self, chapters, name):
         return ChapterManager.find_chapter_by_name(chapters, name)
 
-    def check_saved_times(self):
+    def check_saved_times(self, chapters=None):
         """Check database for saved intro/outro times or chapters"""
         if not self.db or not self.show_info:
             xbmc.log('SkipIntro: Database or show_info not available', xbmc.LOGINFO)
             return
 
         try:
-            show_id = self.db.get_show(self.show_info['title'])
+            show_id = self.current_show_id()
             if not show_id:
                 xbmc.log(f'SkipIntro: No show_id found for {self.show_info["title"]}', xbmc.LOGINFO)
                 return
 
+            # Times the user set for this episode, or its season, beat the show's settings
+            episode_times = self.db.get_episode_times(show_id, self.show_info['season'], self.show_info['episode'],
+                                                      self.show_info.get('episodeid'))
+            if episode_times and episode_times.get('source') == 'manual':
+                self.set_time_based_markers(episode_times, "episode")
+                return
+
             # Get show config
             config = self.db.get_show_config(show_id)
             xbmc.log(f'SkipIntro: Show config: {config}', xbmc.LOGINFO)
             
             if config:
                 if config.get('use_chapters'):
-                    self.set_chapter_based_markers(config)
+                    self.set_chapter_based_markers(config, chapters if chapters is not None else self.chapters)
                 else:
                     self.set_time_based_markers(config, "show config")
             else:
@@ -220,6 +448,20 @@ class SkipIntroPlayer(xbmc.Player):
                 }
                 self.set_time_based_markers(default_times, "default")
 
+            # Fall back to times stored for this particular episode
+            if self.intro_bookmark is None:
+                if episode_times:
+                    self.set_time_based_markers(episode_times, "episode")
+
+            # Then to what the season's confirmed episodes have in common
+            if self.intro_bookmark is None:
+                inferred = self.db.get_inferred_times(show_id, self.show_info['season'])
+                if inferred:
+                    xbmc.log(f'SkipIntro: Inferred times with confidence {inferred["confidence"]}', xbmc.LOGINFO)
+                    chapters = chapters if chapters is not None else self.chapters
+                    if not (inferred['intro_start_chapter'] and chapters and self.set_chapter_based_markers(inferred, chapters)):
+                        self.set_time_based_markers(inferred, "inferred")
+
         except Exception as e:
             xbmc.log('SkipIntro: Error checking saved times: {}'.format(str(e)), xbmc.LOGERROR)
         
@@ -235,12 +477,12 @@ class SkipIntroPlayer(xbmc.Player):
             xbmc.log(f'SkipIntro: Using {source_desc} time-based markers - start: {self.intro_start}, end: {self.intro_bookmark}', xbmc.LOGINFO)
             self.outro_bookmark = times.get('outro_start_time')
             self.show_from_start = self.intro_start == 0
+            self.marker_source = source_desc
             return True
         return False
 
-    def set_chapter_based_markers(self, config):
+    def set_chapter_based_markers(self, config, chapters):
         """Set chapter-based markers"""
-        chapters = self.getChapters()
         if not chapters:
             xbmc.log('SkipIntro: No chapters found for chapter-based markers', xbmc.LOGWARNING)
             return False
@@ -259,6 +501,7 @@ class SkipIntroPlayer(xbmc.Player):
                 if outro_start_chapter is not None and 1 <= outro_start_chapter <= len(chapters):
                     self.outro_bookmark = chapters[outro_start_chapter - 1]['time']
                 
+                self.marker_source = 'chapters'
                 xbmc.log(f'SkipIntro: Using chapter-based markers - start: {self.intro_start}, end: {self.intro_bookmark}', xbmc.LOGINFO)
                 return True
             else:
@@ -268,57 +511,38 @@ class SkipIntroPlayer(xbmc.Player):
         
         return False
 
-    def check_for_intro_chapter(self):
+    def check_for_intro_chapter(self, chapters):
         try:
-            playing_file = self.getPlayingFile()
+            playing_file = self.show_info.get('file') if self.show_info else None
             if not playing_file:
                 xbmc.log('SkipIntro: No file playing, skipping chapter check', xbmc.LOGINFO)
                 return
 
-            # Retrieve chapters
-            xbmc.log('SkipIntro: Getting chapters for file', xbmc.LOGINFO)
-            chapters = self.getChapters()
             if chapters:
                 xbmc.log(f'SkipIntro: Found {len(chapters)} chapters:', xbmc.LOGINFO)
                 for i, chapter in enumerate(chapters):
                     xbmc.log(f'  Chapter {i+1}: time={chapter.get("time")}, name={chapter.get("name", "Unnamed")}', xbmc.LOGINFO)
                 
-                intro_start = self.find_intro_chapter(chapters)
-                if intro_start is not None:
-                    xbmc.log(f'SkipIntro: Found potential intro start at {intro_start}', xbmc.LOGINFO)
-                    intro_chapter_index = None
-                    for i, chapter in enumerate(chapters):
-                        if abs(chapter['time'] - intro_start) < 0.1:  # Compare with small tolerance
-                            intro_chapter_index = i
-                            xbmc.log(f'SkipIntro: Matched intro to chapter {i+1}', xbmc.LOGINFO)
-                            break
+                times = self.chapter_manager.detect_intro_times(chapters)
+                if times:
+                    self.intro_start = times['intro_start_time']
+                    self.intro_bookmark = times['intro_end_time']
+                    self.intro_duration = self.intro_bookmark - self.intro_start
+                    self.show_from_start = False
+                    self.marker_source = 'chapters'
+                    xbmc.log('SkipIntro: Set chapter-based intro times:', xbmc.LOGINFO)
+                    xbmc.log(f'  Start: {self.intro_start}', xbmc.LOGINFO)
+                    xbmc.log(f'  End: {self.intro_bookmark}', xbmc.LOGINFO)
+                    xbmc.log(f'  Duration: {self.intro_duration}', xbmc.LOGINFO)
                     
-                    if intro_chapter_index is not None and intro_chapter_index + 1 < len(chapters):
-                        self.intro_start = chapters[intro_chapter_index]['time']
-                        self.intro_bookmark = chapters[intro_chapter_index + 1]['time']
-                        self.intro_duration = self.intro_bookmark - self.intro_start
-                        self.show_from_start = False
-                        xbmc.log('SkipIntro: Set chapter-based intro times:', xbmc.LOGINFO)
-                        xbmc.log(f'  Start: {self.intro_start}', xbmc.LOGINFO)
-                        xbmc.log(f'  End: {self.intro_bookmark}', xbmc.LOGINFO)
-                        xbmc.log(f'  Duration: {self.intro_duration}', xbmc.LOGINFO)
-                        
-                        if self.settings['save_times'] and self.show_info and self.db:
-                            show_id = self.db.get_show(self.show_info['title'])
-                            times = {
-                                'intro_start_time': self.intro_start,
-                                'intro_end_time': self.intro_bookmark,
-                                'intro_start_chapter': intro_chapter_index + 1,  # Convert to 1-based index
-                                'intro_end_chapter': intro_chapter_index + 2,
-                                'outro_start_time': None,
-                                'source': 'chapters'
-                            }
-                            self.db.save_episode_times(
-                                show_id,
-                                self.show_info['season'],
-                                self.show_info['episode'],
-                                times
-                            )
+                    show_id = self.current_show_id()
+                    if self.settings['save_times'] and show_id:
+                        self.db.save_episode_times(
+                            show_id,
+                            self.show_info['season'],
+                            self.show_info['episode'],
+                            dict(times, episodeid=self.show_info.get('episodeid'))
+                        )
                 else:
                     self.bookmarks_checked = True
             else:
@@ -327,13 +551,12 @@ class SkipIntroPlayer(xbmc.Player):
             xbmc.log('SkipIntro: Error in check_for_intro_chapter: {}'.format(str(e)), xbmc.LOGERROR)
             self.bookmarks_checked = True
 
-    def getChapters(self):
-        chapter_manager = ChapterManager()
-        return chapter_manager.get_chapters()
+    def getChapters(self, need_names=False):
+        playing_file = self.show_info.get('file') if self.show_info else None
+        return self.chapter_manager.get_chapters(playing_file, need_names=need_names, playing=True)
 
     def find_intro_chapter(self, chapters):
-        chapter_manager = ChapterManager()
-        return chapter_manager.find_intro_chapter(chapters)
+        return self.chapter_manager.find_intro_chapter(chapters)
 
     def check_for_default_skip(self):
         if self.default_skip_checked:
@@ -349,12 +572,14 @@ class SkipIntroPlayer(xbmc.Player):
             
             if current_time >= default_delay:
                 self.intro_bookmark = current_time + skip_duration
+                self.marker_source = 'default'
                 xbmc.log(f'SkipIntro: Using default skip - will skip to: {self.intro_bookmark}', xbmc.LOGINFO)
-                self.show_skip_button()
             else:
-                # Set up timer for default skip
-                self.next_check_time = default_delay
-                self.timer_active = True
+                # Treat the default window as the intro so the timer fires at its start
+                self.intro_start = default_delay
+                self.intro_bookmark = default_delay + skip_duration
+                self.intro_duration = skip_duration
+                self.marker_source = 'default'
                 xbmc.log(f'SkipIntro: Set timer for default skip at {default_delay}', xbmc.LOGINFO)
         except Exception as e:
             xbmc.log('SkipIntro: Error in default skip check: {}'.format(str(e)), xbmc.LOGERROR)
@@ -373,18 +598,25 @@ class SkipIntroPlayer(xbmc.Player):
 
     def cleanup(self):
         """Clean up resources"""
-        self.ui.cleanup()
-        self.intro_start = None
-        self.intro_duration = None
-        self.intro_bookmark = None
-        self.outro_bookmark = None
-        self.bookmarks_checked = False
-        self.default_skip_checked = False
-        self.prompt_shown = False
-        self.show_info = None
-        self.timer_active = False
-        self.next_check_time = 0
-        self.show_from_start = False
+        with self.request_lock:
+            self.cancel_background_requests()
+            self.chapters = None
+            self.marker_source = None
+            self.scheduler.reset()
+            self.ui.cleanup()
+            self.intro_start = None
+            self.intro_duration = None
+            self.intro_bookmark = None
+            self.outro_bookmark = None
+            self.bookmarks_checked = False
+            self.default_skip_checked = False
+            self.prompt_shown = False
+            self.show_info = None
+            self.timer_active = False
+            self.next_check_time = 0
+            self.show_from_start = False
+            self.timeline = Timeline()
+            self.active_segment = None
 
     def set_manual_times(self):
         """Prompt user for manual intro/outro times and save them"""
@@ -392,7 +624,7 @@ class SkipIntroPlayer(xbmc.Player):
             xbmc.log('SkipIntro: No show info available for manual time setting', xbmc.LOGWARNING)
             return
 
-        show_id = self.db.get_show(self.show_info['title'])
+        show_id = self.current_show_id()
         if not show_id:
             xbmc.log('SkipIntro: Failed to get show ID for manual time setting', xbmc.LOGWARNING)
             return
@@ -422,34 +654,53 @@ class SkipIntroPlayer(xbmc.Player):
                 xbmcgui.Dialog().notification('SkipIntro', 'Times saved successfully', xbmcgui.NOTIFICATION_INFO, 3000)
                 # Refresh times for current playback
                 self.check_saved_times()
+                self.show_skip_button()
             else:
                 xbmcgui.Dialog().notification('SkipIntro', 'Failed to save times', xbmcgui.NOTIFICATION_ERROR, 3000)
         else:
             xbmcgui.Dialog().notification('SkipIntro', 'Invalid time format', xbmcgui.NOTIFICATION_ERROR, 3000)
 
+class SkipIntroMonitor(xbmc.Monitor):
+    def __init__(self, player):
+        super(SkipIntroMonitor, self).__init__()
+        self.player = player
+
+    def onNotification(self, sender, method, data):
+        """Handle NotifyAll messages sent by the addon's other entry points"""
+        if sender != 'SkipIntro':
+            return
+        if method.endswith(CACHE_INVALIDATE_MESSAGE) and self.player.db:
+            xbmc.log('SkipIntro: Database changed by another process, clearing cache', xbmc.LOGINFO)
+            self.player.db.invalidate_cache()
+        elif method.endswith(INDEX_LIBRARY_MESSAGE):
+            if self.player.indexer.start():
+                xbmcgui.Dialog().notification('SkipIntro', 'Indexing library chapters', xbmcgui.NOTIFICATION_INFO, 3000)
+
 def main():
     xbmc.log('SkipIntro: Service starting', xbmc.LOGINFO)
     player = SkipIntroPlayer()
-    monitor = xbmc.Monitor()
+    monitor = SkipIntroMonitor(player)
+    if player.settings.get('index_on_start'):
+        player.indexer.start()
+    # Optional sharing of markers with the other Kodi devices of the household
+    sync = create_sync(player.db, player.settings)
+    if sync is not None:
+        sync.start()
 
     try:
-        # Main service loop
-        while not monitor.abortRequested():
-            if monitor.waitForAbort(0.5):  # Check every 500ms
-                break
-                
-            if player.isPlaying() and player.timer_active:
-                try:
-                    time = player.getTime()
-                    player.onPlayBackTime(time)
-                except Exception as e:
-                    xbmc.log(f'SkipIntro: Error checking playback time: {str(e)}', xbmc.LOGERROR)
-                
+        # Markers are fired by the player's scheduler, so just wait for shutdown
+        monitor.waitForAbort()
     except Exception as e:
         xbmc.log(f'SkipIntro: Error in main loop: {str(e)}', xbmc.LOGERROR)
     finally:
         try:
             player.cleanup()
+            player.indexer.stop()
+            if sync is not None:
+                sync.stop()
+            if player.db:
+                player.db.close()
+            shutdown_probe_backend()
             xbmc.log('SkipIntro: Service stopped', xbmc.LOGINFO)
         except:
             pass  # Ensure we don't hang during cleanup
@@ -0,0 +1,10 @@
+import xbmc
+from resources.lib.indexer import INDEX_LIBRARY_MESSAGE
+
+def main():
+    """Ask the running service to index the video library"""
+    xbmc.log('SkipIntro: Requesting library indexing', xbmc.LOGINFO)
+    xbmc.executebuiltin(f'NotifyAll(SkipIntro,{INDEX_LIBRARY_MESSAGE})')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import sys
+import xbmc
+import xbmcgui
+import xbmcvfs
+from context import get_database
+from resources.lib.database import CACHE_INVALIDATE_MESSAGE
+from resources.lib.transfer import (
+    FORMAT_BINARY, FORMAT_CSV, FORMAT_NDJSON, export_markers, import_markers
+)
+
+# (label, format, extension) offered when exporting
+EXPORT_FORMATS = (
+    ('Newline-delimited JSON', FORMAT_NDJSON, '.ndjson'),
+    ('CSV', FORMAT_CSV, '.csv'),
+    ('Compact binary', FORMAT_BINARY, '.bin'),
+)
+EXPORT_FILENAME = 'skipintro-markers'
+IMPORT_MASK = '.ndjson|.jsonl|.json|.csv|.bin'
+
+def export_file(db):
+    """Ask for a folder and format and export every marker there"""
+    dialog = xbmcgui.Dialog()
+    folder = dialog.browse(3, 'Export Skip Intro markers to', 'files')
+    if not folder:
+        return
+    choice = dialog.select('Export format', [label for label, _, _ in EXPORT_FORMATS])
+    if choice < 0:
+        return
+    _, fmt, extension = EXPORT_FORMATS[choice]
+    path = xbmcvfs.translatePath(folder.rstrip('/\\') + '/' + EXPORT_FILENAME + extension)
+
+    counts = export_markers(db, path, fmt)
+    if counts is None:
+        dialog.notification('Skip Intro', 'Export failed', xbmcgui.NOTIFICATION_ERROR)
+    else:
+        dialog.notification('Skip Intro', f'Exported {counts["episodes"]} episode(s)', xbmcgui.NOTIFICATION_INFO)
+
+def import_file(db):
+    """Ask for an exported file and upsert its markers"""
+    dialog = xbmcgui.Dialog()
+    path = dialog.browse(1, 'Import Skip Intro markers', 'files', IMPORT_MASK)
+    if not path:
+        return
+
+    counts = import_markers(db, xbmcvfs.translatePath(path))
+    if counts is None:
+        dialog.notification('Skip Intro', 'Import failed', xbmcgui.NOTIFICATION_ERROR)
+        return
+    # Let the running service drop what it cached before the import
+    xbmc.executebuiltin(f'NotifyAll(SkipIntro,{CACHE_INVALIDATE_MESSAGE})')
+    dialog.notification('Skip Intro', f'Imported {counts["episodes"]} episode(s)', xbmcgui.NOTIFICATION_INFO)
+
+def main(argv):
+    """Run RunScript(.../markers.py,export) or RunScript(.../markers.py,import)"""
+    action = argv[1] if len(argv) > 1 else ''
+    if action not in ('export', 'import'):
+        xbmc.log(f'SkipIntro: Unknown marker action "{action}"', xbmc.LOGERROR)
+        return
+
+    db = get_database()
+    if not db:
+        xbmcgui.Dialog().notification('Skip Intro', 'Database error', xbmcgui.NOTIFICATION_ERROR)
+        return
+    try:
+        if action == 'export':
+            export_file(db)
+        else:
+            import_file(db)
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    main(sys.argv)
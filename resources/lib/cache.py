@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key and mark it as recently used"""
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return default
+
+    def put(self, key, value):
+        """Store value for key, evicting the least recently used entry if full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """Remove key from the cache if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def remove_if(self, predicate):
+        """Remove every entry whose (key, value) matches predicate"""
+        with self._lock:
+            for key in [k for k, v in self._data.items() if predicate(k, v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
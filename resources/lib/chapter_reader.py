@@ -0,0 +1,489 @@
+import struct
+import xbmc
+import xbmcvfs
+from typing import Dict, List, Optional, Union
+
+Chapter = Dict[str, Union[str, int, float]]
+
+# Refuse to load metadata elements/boxes larger than this
+MAX_ELEMENT_SIZE = 4 * 1024 * 1024
+
+# Matroska element IDs
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_SEEK_HEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_CHAPTERS = 0x1043A770
+MKV_EDITION_ENTRY = 0x45B9
+MKV_EDITION_FLAG_DEFAULT = 0x45DB
+MKV_CHAPTER_ATOM = 0xB6
+MKV_CHAPTER_TIME_START = 0x91
+MKV_CHAPTER_TIME_END = 0x92
+MKV_CHAPTER_FLAG_HIDDEN = 0x98
+MKV_CHAPTER_DISPLAY = 0x80
+MKV_CHAP_STRING = 0x85
+MKV_CLUSTER = 0x1F43B675
+
+MP4_TOP_LEVEL = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pdin', b'uuid')
+
+class VFSStream:
+    """Minimal seekable byte stream over xbmcvfs.File"""
+
+    def __init__(self, path):
+        self._file = xbmcvfs.File(path)
+        self._position = 0
+
+    def read(self, size):
+        data = bytes(self._file.readBytes(size))
+        self._position += len(data)
+        return data
+
+    def seek(self, position):
+        self._file.seek(position, 0)
+        self._position = position
+
+    def tell(self):
+        return self._position
+
+    def size(self):
+        return self._file.size()
+
+    def close(self):
+        self._file.close()
+
+def read_chapters(path: str) -> Optional[List[Chapter]]:
+    """Read chapters from a Matroska or MP4 file without spawning a process.
+
+    Returns None when the format is not supported, the file could not be
+    parsed or its chapters could not be located, so the caller can fall back
+    to an external prober.
+    """
+    stream = None
+    try:
+        stream = VFSStream(path)
+        return parse_chapters(stream)
+    except Exception as e:
+        xbmc.log(f'SkipIntro: Native chapter reader failed for {path}: {str(e)}', xbmc.LOGDEBUG)
+        return None
+    finally:
+        if stream is not None:
+            stream.close()
+
+def parse_chapters(stream) -> Optional[List[Chapter]]:
+    """Parse chapters from a stream providing read(size), seek(position) and size()"""
+    stream.seek(0)
+    head = stream.read(12)
+    if len(head) < 12:
+        return None
+    if struct.unpack('>I', head[:4])[0] == EBML_HEADER:
+        return _MatroskaReader(stream).chapters()
+    if head[4:8] in MP4_TOP_LEVEL:
+        return _MP4Reader(stream).chapters()
+    return None
+
+def _make_chapters(entries, duration):
+    """Turn sorted (start, end, name) tuples into ChapterManager's chapter dicts"""
+    chapters = []
+    for index, (start, end, name) in enumerate(entries):
+        if end is None:
+            end = entries[index + 1][0] if index + 1 < len(entries) else (duration or start)
+        chapters.append({
+            'name': name or f'Chapter {index + 1}',
+            'time': start,
+            'end_time': end,
+            'number': index + 1
+        })
+    return chapters
+
+class _MatroskaReader:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def chapters(self):
+        stream = self.stream
+        stream.seek(0)
+        element_id, size, data_start = self._read_header()
+        if element_id != EBML_HEADER or size is None:
+            return None
+        stream.seek(data_start + size)
+
+        element_id, size, segment_start = self._read_header()
+        if element_id != MKV_SEGMENT:
+            return None
+
+        positions = self._locate(segment_start, size)
+        info = self._load(positions.get(MKV_INFO))
+        duration = self._duration(info) if info is not None else None
+        chapters = self._load(positions.get(MKV_CHAPTERS))
+        if chapters is None:
+            # Not found before the media data; let ffprobe look
+            return None
+        return self._parse_chapters(chapters, duration)
+
+    def _locate(self, segment_start, segment_size):
+        """Find Info and Chapters offsets via the SeekHead, scanning top-level elements if needed"""
+        positions = {}
+        stream = self.stream
+        segment_end = segment_start + segment_size if segment_size is not None else None
+        position = segment_start
+        seek_heads_read = 0
+        while segment_end is None or position < segment_end:
+            stream.seek(position)
+            header = self._read_header()
+            if header is None:
+                break
+            element_id, size, data_start = header
+            if element_id == MKV_SEEK_HEAD and seek_heads_read < 2:
+                seek_heads_read += 1
+                for target_id, offset in self._parse_seek_head(self._read_body(size)):
+                    if target_id == MKV_SEEK_HEAD and seek_heads_read < 2:
+                        # A second SeekHead further into the file
+                        stream.seek(segment_start + offset)
+                        nested = self._read_header()
+                        if nested and nested[0] == MKV_SEEK_HEAD:
+                            seek_heads_read += 1
+                            for nested_id, nested_offset in self._parse_seek_head(self._read_body(nested[1])):
+                                positions.setdefault(nested_id, segment_start + nested_offset)
+                    else:
+                        positions.setdefault(target_id, segment_start + offset)
+                # Info alone is not enough: Chapters may still follow unindexed
+                if MKV_CHAPTERS in positions:
+                    return positions
+            elif element_id in (MKV_INFO, MKV_CHAPTERS):
+                positions.setdefault(element_id, position)
+            elif element_id == MKV_CLUSTER or size is None:
+                # Media data starts here; chapters are written before it when not indexed
+                break
+            position = data_start + size
+        return positions
+
+    def _load(self, position):
+        """Return the body of the element at position, or None"""
+        if position is None:
+            return None
+        self.stream.seek(position)
+        header = self._read_header()
+        if header is None or header[1] is None:
+            return None
+        return self._read_body(header[1])
+
+    def _read_body(self, size):
+        if size is None or size > MAX_ELEMENT_SIZE:
+            raise ValueError(f'Matroska element too large: {size}')
+        return self.stream.read(size)
+
+    def _read_header(self):
+        """Read an element header at the current position: (id, size, data_start)"""
+        first = self.stream.read(1)
+        if not first:
+            return None
+        length = _vint_length(first[0], 4)
+        element_id = int.from_bytes(first + self.stream.read(length - 1), 'big')
+        size_first = self.stream.read(1)
+        if not size_first:
+            return None
+        length = _vint_length(size_first[0], 8)
+        raw = size_first + self.stream.read(length - 1)
+        size = _vint_value(raw, length)
+        return element_id, size, self.stream.tell()
+
+    def _parse_seek_head(self, data):
+        for element_id, seek in _iter_elements(data):
+            if element_id != MKV_SEEK:
+                continue
+            target_id = offset = None
+            for child_id, value in _iter_elements(seek):
+                if child_id == MKV_SEEK_ID:
+                    target_id = int.from_bytes(value, 'big')
+                elif child_id == MKV_SEEK_POSITION:
+                    offset = int.from_bytes(value, 'big')
+            if target_id is not None and offset is not None:
+                yield target_id, offset
+
+    def _duration(self, info):
+        scale = 1000000
+        duration = None
+        for element_id, value in _iter_elements(info):
+            if element_id == MKV_TIMECODE_SCALE:
+                scale = int.from_bytes(value, 'big')
+            elif element_id == MKV_DURATION:
+                duration = struct.unpack('>f' if len(value) == 4 else '>d', value)[0]
+        return duration * scale / 1e9 if duration is not None else None
+
+    def _parse_chapters(self, data, duration):
+        editions = []
+        for element_id, edition in _iter_elements(data):
+            if element_id != MKV_EDITION_ENTRY:
+                continue
+            entries = []
+            is_default = False
+            for child_id, value in _iter_elements(edition):
+                if child_id == MKV_EDITION_FLAG_DEFAULT:
+                    is_default = int.from_bytes(value, 'big') == 1
+                elif child_id == MKV_CHAPTER_ATOM:
+                    entry = self._parse_atom(value)
+                    if entry is not None:
+                        entries.append(entry)
+            if entries:
+                editions.append((is_default, entries))
+        if not editions:
+            return []
+        # The default edition if one is flagged, otherwise the first
+        entries = next((e for default, e in editions if default), editions[0][1])
+        return _make_chapters(sorted(entries, key=lambda entry: entry[0]), duration)
+
+    def _parse_atom(self, atom):
+        start = end = name = None
+        for element_id, value in _iter_elements(atom):
+            if element_id == MKV_CHAPTER_TIME_START:
+                start = int.from_bytes(value, 'big') / 1e9
+            elif element_id == MKV_CHAPTER_TIME_END:
+                end = int.from_bytes(value, 'big') / 1e9
+            elif element_id == MKV_CHAPTER_FLAG_HIDDEN and int.from_bytes(value, 'big'):
+                return None
+            elif element_id == MKV_CHAPTER_DISPLAY and name is None:
+                for display_id, display_value in _iter_elements(value):
+                    if display_id == MKV_CHAP_STRING:
+                        name = display_value.decode('utf-8', 'replace')
+                        break
+        if start is None:
+            return None
+        return start, end, name
+
+def _vint_length(first_byte, max_length):
+    for length in range(1, max_length + 1):
+        if first_byte & (0x80 >> (length - 1)):
+            return length
+    raise ValueError('Invalid EBML variable-length integer')
+
+def _vint_value(raw, length):
+    """Decode an EBML size; None means 'unknown size'"""
+    value = raw[0] & (0xFF >> length)
+    for byte in raw[1:]:
+        value = (value << 8) | byte
+    if value == (1 << (7 * length)) - 1:
+        return None
+    return value
+
+def _iter_elements(data):
+    """Yield (id, body) for the EBML elements packed in data"""
+    position = 0
+    end = len(data)
+    while position < end:
+        length = _vint_length(data[position], 4)
+        element_id = int.from_bytes(data[position:position + length], 'big')
+        position += length
+        length = _vint_length(data[position], 8)
+        size = _vint_value(data[position:position + length], length)
+        position += length
+        if size is None:
+            size = end - position
+        yield element_id, data[position:position + size]
+        position += size
+
+class _MP4Reader:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def chapters(self):
+        moov = self._find_moov()
+        if moov is None:
+            return None
+
+        duration = None
+        chpl = None
+        tracks = []
+        for box_type, body in _iter_boxes(moov):
+            if box_type == b'mvhd':
+                duration = _mvhd_duration(body)
+            elif box_type == b'udta':
+                chpl = _find_child(body, b'chpl')
+            elif box_type == b'trak':
+                tracks.append(body)
+
+        if chpl is not None:
+            entries = _parse_chpl(chpl)
+            if entries:
+                return _make_chapters(entries, duration)
+
+        entries = self._quicktime_chapters(tracks)
+        return _make_chapters(entries, duration) if entries else []
+
+    def _find_moov(self):
+        """Walk top-level boxes, seeking over media data, and return the moov body"""
+        stream = self.stream
+        file_size = stream.size()
+        position = 0
+        while position + 8 <= file_size:
+            stream.seek(position)
+            header = stream.read(8)
+            if len(header) < 8:
+                return None
+            size, box_type = struct.unpack('>I4s', header)
+            header_size = 8
+            if size == 1:
+                size = struct.unpack('>Q', stream.read(8))[0]
+                header_size = 16
+            elif size == 0:
+                size = file_size - position
+            if size < header_size:
+                return None
+            if box_type == b'moov':
+                if size - header_size > MAX_ELEMENT_SIZE:
+                    raise ValueError(f'moov box too large: {size}')
+                return stream.read(size - header_size)
+            position += size
+        return None
+
+    def _quicktime_chapters(self, tracks):
+        """Read titles from a text track referenced by another track's tref/chap"""
+        chapter_ids = set()
+        by_id = {}
+        for track in tracks:
+            tkhd = _find_child(track, b'tkhd')
+            if tkhd is not None:
+                by_id[_tkhd_track_id(tkhd)] = track
+            tref = _find_child(track, b'tref')
+            chap = _find_child(tref, b'chap') if tref is not None else None
+            if chap is not None:
+                chapter_ids.update(struct.unpack(f'>{len(chap) // 4}I', chap[:len(chap) // 4 * 4]))
+
+        for track_id in chapter_ids:
+            track = by_id.get(track_id)
+            if track is not None:
+                entries = self._read_text_track(track)
+                if entries:
+                    return entries
+        return []
+
+    def _read_text_track(self, track):
+        mdia = _find_child(track, b'mdia')
+        mdhd = _find_child(mdia, b'mdhd') if mdia is not None else None
+        minf = _find_child(mdia, b'minf') if mdia is not None else None
+        stbl = _find_child(minf, b'stbl') if minf is not None else None
+        if mdhd is None or stbl is None:
+            return []
+        timescale = _mdhd_timescale(mdhd)
+
+        boxes = dict(_iter_boxes(stbl))
+        if b'stts' not in boxes or b'stsz' not in boxes or b'stsc' not in boxes:
+            return []
+        starts = _sample_times(boxes[b'stts'], timescale)
+        sizes = _sample_sizes(boxes[b'stsz'])
+        offsets = _sample_offsets(boxes[b'stsc'], boxes.get(b'stco'), boxes.get(b'co64'), sizes)
+
+        entries = []
+        for start, size, offset in zip(starts, sizes, offsets):
+            self.stream.seek(offset)
+            sample = self.stream.read(min(size, 1024))
+            if len(sample) < 2:
+                continue
+            length = struct.unpack('>H', sample[:2])[0]
+            text = sample[2:2 + length]
+            if text.startswith(b'\xfe\xff'):
+                name = text[2:].decode('utf-16-be', 'replace')
+            else:
+                name = text.decode('utf-8', 'replace')
+            entries.append((start, None, name))
+        return entries
+
+def _iter_boxes(data):
+    """Yield (type, body) for the MP4 boxes packed in data"""
+    position = 0
+    end = len(data)
+    while position + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[position:position + 8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[position + 8:position + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            return
+        yield box_type, data[position + header_size:position + size]
+        position += size
+
+def _find_child(data, box_type):
+    for child_type, body in _iter_boxes(data):
+        if child_type == box_type:
+            return body
+    return None
+
+def _parse_chpl(body):
+    """Nero chapter list: start times in 100 ns units followed by a Pascal-string title"""
+    version = body[0]
+    position = 4 + (4 if version else 0)
+    count = body[position]
+    position += 1
+    entries = []
+    for _ in range(count):
+        if position + 9 > len(body):
+            break
+        start = struct.unpack('>Q', body[position:position + 8])[0] / 1e7
+        length = body[position + 8]
+        name = body[position + 9:position + 9 + length].decode('utf-8', 'replace')
+        position += 9 + length
+        entries.append((start, None, name))
+    return sorted(entries, key=lambda entry: entry[0])
+
+def _mvhd_duration(body):
+    if body[0] == 1:
+        timescale, duration = struct.unpack('>IQ', body[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', body[12:20])
+    return duration / timescale if timescale else None
+
+def _mdhd_timescale(body):
+    return struct.unpack('>I', body[20:24] if body[0] == 1 else body[12:16])[0]
+
+def _tkhd_track_id(body):
+    return struct.unpack('>I', body[20:24] if body[0] == 1 else body[12:16])[0]
+
+def _sample_times(stts, timescale):
+    count = struct.unpack('>I', stts[4:8])[0]
+    times = []
+    current = 0
+    for index in range(count):
+        sample_count, delta = struct.unpack('>II', stts[8 + index * 8:16 + index * 8])
+        for _ in range(sample_count):
+            times.append(current / timescale)
+            current += delta
+    return times
+
+def _sample_sizes(stsz):
+    sample_size, count = struct.unpack('>II', stsz[4:12])
+    if sample_size:
+        return [sample_size] * count
+    return list(struct.unpack(f'>{count}I', stsz[12:12 + count * 4]))
+
+def _sample_offsets(stsc, stco, co64, sizes):
+    if stco is not None:
+        count = struct.unpack('>I', stco[4:8])[0]
+        chunk_offsets = struct.unpack(f'>{count}I', stco[8:8 + count * 4])
+    elif co64 is not None:
+        count = struct.unpack('>I', co64[4:8])[0]
+        chunk_offsets = struct.unpack(f'>{count}Q', co64[8:8 + count * 8])
+    else:
+        return []
+
+    entry_count = struct.unpack('>I', stsc[4:8])[0]
+    runs = [struct.unpack('>III', stsc[8 + i * 12:20 + i * 12]) for i in range(entry_count)]
+    offsets = []
+    sample = 0
+    for index, (first_chunk, samples_per_chunk, _) in enumerate(runs):
+        last_chunk = runs[index + 1][0] - 1 if index + 1 < len(runs) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(samples_per_chunk):
+                if sample >= len(sizes):
+                    return offsets
+                offsets.append(offset)
+                offset += sizes[sample]
+                sample += 1
+    return offsets
@@ -1,102 +1,206 @@
 import xbmc
+import xbmcvfs
 import json
-import subprocess
-from typing import List, Dict, Union
+import re
+import threading
+from typing import List, Dict, Optional, Tuple, Union
+from resources.lib.cache import LRUCache
+from resources.lib.chapter_reader import read_chapters
+from resources.lib.probe import ProbeRequest, get_probe_backend
+
+# Chapter titles that mark the opening sequence
+INTRO_CHAPTER_PATTERN = re.compile(r'\b(intro|opening|op|title sequence)\b', re.IGNORECASE)
+
+# Chapters read in this process, keyed by file identity; shared by every ChapterManager
+_chapter_cache = LRUCache(128)
+
+def file_identity(path: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """Return (path, size, mtime) for a file, with None size/mtime if it cannot be stat'ed"""
+    try:
+        stat = xbmcvfs.Stat(path)
+        size = stat.st_size()
+        if size:
+            return path, size, int(stat.st_mtime())
+    except Exception:
+        pass
+    return path, None, None
+
+def get_player_chapters(total_time: float = None) -> Optional[List[Dict[str, Union[str, int, float]]]]:
+    """Chapters Kodi has already demuxed for the playing file, or None if unavailable.
+
+    Player.Chapters lists chapter starts as percentages of the total time.
+    Kodi only exposes the name of the current chapter, so the others get
+    placeholder names.
+    """
+    try:
+        positions = xbmc.getInfoLabel('Player.Chapters')
+        if not positions:
+            return None
+        if not total_time:
+            total_time = xbmc.Player().getTotalTime()
+        if not total_time:
+            return None
+
+        starts = [float(position) * total_time / 100.0 for position in positions.split(',') if position.strip()]
+        current = xbmc.getInfoLabel('Player.Chapter')
+        current_name = xbmc.getInfoLabel('Player.ChapterName')
+        chapters = []
+        for index, start in enumerate(starts):
+            number = index + 1
+            name = current_name if current_name and current == str(number) else f'Chapter {number}'
+            chapters.append({
+                'name': name,
+                'time': start,
+                'end_time': starts[index + 1] if index + 1 < len(starts) else total_time,
+                'number': number
+            })
+        xbmc.log(f'SkipIntro: Got {len(chapters)} chapters from the player', xbmc.LOGINFO)
+        return chapters
+    except Exception as e:
+        xbmc.log(f'SkipIntro: Error reading chapters from the player: {str(e)}', xbmc.LOGWARNING)
+        return None
 
 class ChapterManager:
-    """Manages chapter detection for video files using FFmpeg."""
+    """Manages chapter detection for video files."""
     
-    def __init__(self):
-        self._cached_chapters = {}
-        # On macOS, ffmpeg is typically installed in /usr/local/bin
-        self._ffmpeg_path = "/usr/local/bin/ffmpeg"
+    def __init__(self, db=None, probe=None):
+        # Optional ShowDatabase that persists parsed chapters across restarts
+        self.db = db
+        self._probe = probe
+
+    @property
+    def probe(self):
+        """ffprobe/ffmpeg backend, discovered the first time a file needs it"""
+        if self._probe is None:
+            self._probe = get_probe_backend()
+        return self._probe
     
-    def get_chapters(self) -> List[Dict[str, Union[str, int, float]]]:
-        """Get chapter information using ffmpeg."""
-        try:
-            # Get current file using Kodi's JSON-RPC API
-            result = xbmc.executeJSONRPC(json.dumps({
-                "jsonrpc": "2.0",
-                "method": "Player.GetItem",
-                "params": {
-                    "playerid": 1,
-                    "properties": ["title", "file"]
-                },
-                "id": 1
-            }))
-            
-            result = json.loads(result)
-            if 'result' not in result or 'item' not in result['result']:
+    def get_chapters_async(self, current_file: str = None, need_names: bool = False, before=None) -> ProbeRequest:
+        """Read the playing file's chapters on the probe pool instead of the calling thread.
+
+        current_file is the playing file if the caller already knows it.
+        before is an optional callable run on the worker first, e.g. to wait
+        for the player to publish its chapters.
+        """
+        def run(cancel_event):
+            if before is not None:
+                before()
+            if cancel_event.is_set():
                 return []
-                
-            current_file = result['result']['item'].get('file')
+            return self.get_chapters(current_file, need_names, cancel_event, playing=True)
+
+        return self.probe.request(run)
+
+    def get_chapters(self, current_file: str = None, need_names: bool = False,
+                     cancel_event: threading.Event = None, playing: bool = None) -> List[Dict[str, Union[str, int, float]]]:
+        """Get chapter information for a file.
+
+        Without current_file, or with playing set, the file is the one being
+        played and the chapters Kodi already knows are used first, unless
+        need_names asks for real chapter titles. Otherwise the file is
+        read natively, with ffmpeg as a last resort. Results are cached in
+        memory and, when a database is available, on disk, so each file is
+        only parsed once while its size and mtime stay the same.
+        """
+        try:
+            if playing is None:
+                playing = not current_file
+            if playing and not need_names:
+                chapters = get_player_chapters()
+                if chapters:
+                    return chapters
+
             if not current_file:
-                return []
-            
-            # Return cached chapters if available
-            if current_file in self._cached_chapters:
-                return self._cached_chapters[current_file]
-            
-            # Get chapter metadata using ffmpeg
-            cmd = [self._ffmpeg_path, "-i", current_file, "-f", "ffmetadata", "-"]
-            
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-                metadata = result.stdout
+                # Get current file using Kodi's JSON-RPC API
+                result = xbmc.executeJSONRPC(json.dumps({
+                    "jsonrpc": "2.0",
+                    "method": "Player.GetItem",
+                    "params": {
+                        "playerid": 1,
+                        "properties": ["title", "file"]
+                    },
+                    "id": 1
+                }))
                 
-                if result.returncode != 0:
-                    xbmc.log(f"SkipIntro: FFmpeg error: {result.stderr}", xbmc.LOGERROR)
+                result = json.loads(result)
+                if 'result' not in result or 'item' not in result['result']:
                     return []
-                
-                chapters = []
-                current_chapter = {}
-                chapter_number = 1
-                
-                # Parse metadata
-                for line in metadata.splitlines():
-                    if line.startswith("[CHAPTER]"):
-                        if current_chapter and 'start' in current_chapter and 'end' in current_chapter:
-                            chapters.append({
-                                'name': current_chapter.get('title', f'Chapter {chapter_number}'),
-                                'time': current_chapter['start'],
-                                'end_time': current_chapter['end'],
-                                'number': chapter_number
-                            })
-                            chapter_number += 1
-                        current_chapter = {}
-                    elif line.startswith("START="):
-                        current_chapter["start"] = int(line.split("=")[1]) / 1e9  # Convert nanoseconds to seconds
-                    elif line.startswith("END="):
-                        current_chapter["end"] = int(line.split("=")[1]) / 1e9  # Convert nanoseconds to seconds
-                    elif line.startswith("title="):
-                        current_chapter["title"] = line.split("=")[1]
-                
-                # Add the last chapter
-                if current_chapter and 'start' in current_chapter and 'end' in current_chapter:
-                    chapters.append({
-                        'name': current_chapter.get('title', f'Chapter {chapter_number}'),
-                        'time': current_chapter['start'],
-                        'end_time': current_chapter['end'],
-                        'number': chapter_number
-                    })
-                
-                if chapters:
-                    xbmc.log(f"SkipIntro: Found {len(chapters)} chapters", xbmc.LOGINFO)
-                        
-                self._cached_chapters[current_file] = chapters
+                    
+                current_file = result['result']['item'].get('file')
+                if not current_file:
+                    return []
+            
+            # Return cached chapters if available
+            identity = file_identity(current_file)
+            chapters = _chapter_cache.get(identity)
+            if chapters is not None:
                 return chapters
-                
-            except subprocess.TimeoutExpired:
-                xbmc.log("SkipIntro: FFmpeg command timed out", xbmc.LOGERROR)
-                return []
-            except Exception as e:
-                xbmc.log(f"SkipIntro: Error running ffmpeg: {str(e)}", xbmc.LOGERROR)
+
+            persistent = self.db is not None and identity[1] is not None
+            if persistent:
+                chapters = self.db.get_cached_chapters(*identity)
+                if chapters is not None:
+                    _chapter_cache.put(identity, chapters)
+                    return chapters
+
+            chapters = self._read_chapters(current_file, cancel_event)
+            if chapters is None:
                 return []
 
+            _chapter_cache.put(identity, chapters)
+            if persistent:
+                self.db.save_cached_chapters(*identity, chapters)
+            return chapters
+
         except Exception as e:
             xbmc.log(f'SkipIntro: Error getting chapters: {str(e)}', xbmc.LOGERROR)
             return []
 
+    def _read_chapters(self, current_file: str, cancel_event: threading.Event = None) -> Optional[List[Dict[str, Union[str, int, float]]]]:
+        """Read chapters from the file; returns None if the file could not be read"""
+        # Matroska and MP4 chapters are read in-process from a few KB of the file
+        chapters = read_chapters(current_file)
+        if chapters is not None:
+            xbmc.log(f"SkipIntro: Read {len(chapters)} chapters natively", xbmc.LOGINFO)
+            return chapters
+
+        # Fall back to ffprobe/ffmpeg for other formats
+        return self.probe.probe_chapters(current_file, cancel_event)
+
+    def get_chapters_many(self, files, cancel_event: threading.Event = None) -> Dict[str, List[Dict[str, Union[str, int, float]]]]:
+        """Read the chapters of several files in parallel on the probe pool.
+
+        Returns {file: chapters}; files whose chapters could not be read map
+        to an empty list.
+        """
+        futures = {path: self.probe.submit(self.get_chapters, path, False, cancel_event) for path in files}
+        results = {}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                xbmc.log(f'SkipIntro: Error reading chapters of {path}: {str(e)}', xbmc.LOGERROR)
+                results[path] = []
+        return results
+
+    def resolve_chapter_times(self, chapters, start_chapter, end_chapter, outro_chapter=None):
+        """Turn 1-based chapter numbers into episode times, or None if a chapter is missing.
+
+        The intro ends where the end chapter starts, as with chapter-based
+        show settings during playback.
+        """
+        start, end = self.get_intro_chapters(chapters, start_chapter, end_chapter)
+        if not start or not end or end['time'] <= start['time']:
+            return None
+        outro = self.get_outro_chapter(chapters, outro_chapter)
+        return {
+            'intro_start_time': start['time'],
+            'intro_end_time': end['time'],
+            'outro_start_time': outro['time'] if outro else None,
+            'intro_start_chapter': start['number'],
+            'intro_end_chapter': end['number']
+        }
+
     def get_chapter_by_number(self, chapters, chapter_number):
         """Get chapter info by chapter number."""
         if not chapters or chapter_number is None:
@@ -149,3 +253,49 @@ class ChapterManager:
         except Exception as e:
             xbmc.log(f'SkipIntro: Error getting outro chapter: {str(e)}', xbmc.LOGERROR)
             return None
+
+    @staticmethod
+    def find_chapter_by_name(chapters, name):
+        """Get the first chapter whose title contains name, ignoring case."""
+        if not chapters or not name:
+            return None
+        name = name.lower()
+        for chapter in chapters:
+            if name in str(chapter.get('name', '')).lower():
+                return chapter
+        return None
+
+    @staticmethod
+    def find_intro_chapter_index(chapters):
+        """Get the index of the first chapter titled like an intro, or None."""
+        for index, chapter in enumerate(chapters or []):
+            if INTRO_CHAPTER_PATTERN.search(str(chapter.get('name', ''))):
+                return index
+        return None
+
+    def find_intro_chapter(self, chapters):
+        """Get the time the intro chapter ends, or None if no chapter looks like an intro."""
+        index = self.find_intro_chapter_index(chapters)
+        if index is None:
+            return None
+        if index + 1 < len(chapters):
+            return chapters[index + 1]['time']
+        return chapters[index].get('end_time')
+
+    def detect_intro_times(self, chapters):
+        """Build episode times from the intro chapter, or None if there is none.
+
+        The intro runs from the start of the matching chapter to the start of
+        the next one; chapter numbers are 1-based.
+        """
+        index = self.find_intro_chapter_index(chapters)
+        if index is None or index + 1 >= len(chapters):
+            return None
+        return {
+            'intro_start_time': chapters[index]['time'],
+            'intro_end_time': chapters[index + 1]['time'],
+            'intro_start_chapter': index + 1,
+            'intro_end_chapter': index + 2,
+            'outro_start_time': None,
+            'source': 'chapters'
+        }
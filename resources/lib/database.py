@@ -1,73 +1,421 @@
 import sqlite3
+import json
 import os
+import re
+import threading
+import unicodedata
 import xbmc
 import xbmcvfs
+from resources.lib.cache import LRUCache
+from resources.lib.inference import summarize_season, inferred_times
+
+# NotifyAll message other processes send after writing to the database,
+# e.g. NotifyAll(SkipIntro,ShowsChanged) from the context menu
+CACHE_INVALIDATE_MESSAGE = 'ShowsChanged'
+
+# Marks "not cached" where None is itself a cacheable answer
+_MISSING = object()
+
+_TITLE_SEPARATORS = re.compile(r'[._\-]+')
+_TITLE_PUNCTUATION = re.compile(r'[^\w\s]')
+
+def normalize_title(title):
+    """Reduce a show title to the form used for lookups.
+
+    Case, accents, punctuation and dot/underscore separators are dropped so
+    'Marvel's Agents of S.H.I.E.L.D.' and 'marvels.agents.of.s.h.i.e.l.d'
+    map to the same key.
+    """
+    text = unicodedata.normalize('NFKD', title or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = text.replace('&', ' and ')
+    text = _TITLE_SEPARATORS.sub(' ', text)
+    text = _TITLE_PUNCTUATION.sub('', text)
+    return ' '.join(text.split())
 
 class ShowDatabase:
+    # Ordered (schema version, migration method) steps, applied in sequence
+    _MIGRATIONS = (
+        (1, '_migrate_v1_base_schema'),
+        (2, '_migrate_v2_normalized_titles'),
+        (3, '_migrate_v3_segments'),
+        (4, '_migrate_v4_chapter_cache'),
+        (5, '_migrate_v5_index_state'),
+        (6, '_migrate_v6_fingerprints'),
+        (7, '_migrate_v7_library_ids'),
+        (8, '_migrate_v8_revisions'),
+    )
+    SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+    # Per-episode columns accepted by save_episode_times and returned by get_episode_times
+    _EPISODE_COLUMNS = (
+        'intro_start_chapter',
+        'intro_end_chapter',
+        'intro_start_time',
+        'intro_end_time',
+        'outro_start_time',
+        'source'
+    )
+    # Per-show columns of shows_config besides use_chapters
+    _CONFIG_COLUMNS = _EPISODE_COLUMNS[:-1]
+    # Upper end of a revision range left open
+    _MAX_REVISION = 2 ** 63 - 1
+    # Kodi's episodeid is taken from times['episodeid'] and kept when a later save lacks it
+    _UPSERT_EPISODE_SQL = f'''
+        INSERT INTO episodes (show_id, season, episode, {', '.join(_EPISODE_COLUMNS)}, episodeid)
+        VALUES (?, ?, ?, {', '.join('?' for _ in _EPISODE_COLUMNS)}, ?)
+        ON CONFLICT(show_id, season, episode) DO UPDATE SET
+        {', '.join(f'{column} = excluded.{column}' for column in _EPISODE_COLUMNS)},
+        episodeid = COALESCE(excluded.episodeid, episodes.episodeid)
+    '''
+    # Used for synced rows so times detected elsewhere never replace manual ones
+    _UPSERT_EPISODE_KEEP_MANUAL_SQL = _UPSERT_EPISODE_SQL + '''
+        WHERE (episodes.source IS NOT 'manual' OR excluded.source = 'manual')
+    '''
+    # Appended for pulled rows so local changes not yet pushed are kept, unless
+    # manual times replace detected ones; takes the last push's revision
+    _KEEP_UNSENT_CONDITION = '''
+        (episodes.revision IS NULL OR episodes.revision <= ? OR
+         (excluded.source = 'manual' AND episodes.source IS NOT 'manual'))
+    '''
+
+    # Applied once to every connection when it is opened
+    _PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA cache_size=-2000',
+        'PRAGMA busy_timeout=5000',
+    )
+
     def __init__(self, db_path):
         """Initialize database connection"""
         try:
             self.db_path = db_path
+            self._local = threading.local()
+            self._connections = []
+            self._connections_lock = threading.Lock()
+            self._show_cache = LRUCache(256)    # title -> show_id
+            self._config_cache = LRUCache(256)  # show_id -> config dict
+            self._episode_cache = LRUCache(1024)  # (show_id, season, episode) -> times or None
+            self._segment_cache = LRUCache(256)  # (show_id, season, episode) -> segment dicts
+            self._season_cache = LRUCache(256)  # (show_id, season) -> season summary or None
             xbmc.log(f'SkipIntro: Initializing database at: {db_path}', xbmc.LOGINFO)
             
             # Ensure directory exists
             db_dir = os.path.dirname(db_path)
-            if not os.path.exists(db_dir):
+            if db_dir and not os.path.exists(db_dir):
                 os.makedirs(db_dir)
                 xbmc.log(f'SkipIntro: Created database directory: {db_dir}', xbmc.LOGINFO)
             
-            # Always create tables and migrate database
-            self._create_tables()
+            # Apply any pending schema migrations
             self._migrate_database()
             xbmc.log('SkipIntro: Database initialized and migrated', xbmc.LOGINFO)
         except Exception as e:
             xbmc.log(f'SkipIntro: Database initialization error: {str(e)}', xbmc.LOGERROR)
             raise
+
+    def _get_connection(self):
+        """Return this thread's connection, opening it on first use.
+
+        Connections are kept open for the lifetime of the database object so
+        the file handle, page cache and compiled statements are reused.
+        Note that with ':memory:' every thread sees its own database.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=5.0,
+                check_same_thread=False,
+                cached_statements=64
+            )
+            for pragma in self._PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+            xbmc.log(f'SkipIntro: Opened database connection for thread {threading.current_thread().name}', xbmc.LOGDEBUG)
+        return conn
+
+    def close(self):
+        """Close every connection opened by this database object"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                xbmc.log(f'SkipIntro: Error closing database connection: {str(e)}', xbmc.LOGWARNING)
+        self._local = threading.local()
+        xbmc.log('SkipIntro: Database connections closed', xbmc.LOGINFO)
+
+    def invalidate_cache(self, show_id=None):
+        """Drop cached lookups for one show, or everything when show_id is None"""
+        if show_id is None:
+            self._show_cache.clear()
+            self._config_cache.clear()
+            self._episode_cache.clear()
+            self._segment_cache.clear()
+            self._season_cache.clear()
+            xbmc.log('SkipIntro: Database cache cleared', xbmc.LOGDEBUG)
+        else:
+            self._config_cache.pop(show_id)
+            self._episode_cache.remove_if(lambda key, value: key[0] == show_id)
+            self._segment_cache.remove_if(lambda key, value: key[0] == show_id)
+            self._season_cache.remove_if(lambda key, value: key[0] == show_id)
     
     def _migrate_database(self):
-        """Migrate database to current schema"""
+        """Bring the schema up to SCHEMA_VERSION using PRAGMA user_version.
+
+        An up-to-date database costs a single pragma read. Otherwise every
+        pending step runs in its own transaction and bumps user_version.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                c = conn.cursor()
-                
-                # Migrate shows_config table
-                self._migrate_table(c, 'shows_config', {
-                    'show_id': 'INTEGER PRIMARY KEY',
-                    'use_chapters': 'BOOLEAN DEFAULT 0',
-                    'intro_start_chapter': 'INTEGER',
-                    'intro_end_chapter': 'INTEGER',
-                    'intro_start_time': 'REAL',
-                    'intro_end_time': 'REAL',
-                    'outro_start_time': 'REAL',
-                    'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
-                }, 'FOREIGN KEY (show_id) REFERENCES shows(id)')
-                
-                # Migrate episodes table
-                self._migrate_table(c, 'episodes', {
-                    'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
-                    'show_id': 'INTEGER',
-                    'season': 'INTEGER',
-                    'episode': 'INTEGER',
-                    'intro_start_chapter': 'INTEGER',
-                    'intro_end_chapter': 'INTEGER',
-                    'intro_start_time': 'REAL',
-                    'intro_end_time': 'REAL',
-                    'outro_start_time': 'REAL',
-                    'source': 'TEXT',
-                    'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
-                }, 'FOREIGN KEY (show_id) REFERENCES shows(id), UNIQUE(show_id, season, episode)')
-                
-                conn.commit()
-                xbmc.log('SkipIntro: Database migration completed successfully', xbmc.LOGINFO)
+            conn = self._get_connection()
+            current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if current_version >= self.SCHEMA_VERSION:
+                return
+
+            for version, step_name in self._MIGRATIONS:
+                if version <= current_version:
+                    continue
+                with conn:
+                    # Take the write lock first so a concurrent process cannot run the same step
+                    conn.execute('BEGIN IMMEDIATE')
+                    if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                        continue
+                    xbmc.log(f'SkipIntro: Migrating database to schema version {version}', xbmc.LOGINFO)
+                    getattr(self, step_name)(conn.cursor())
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+            xbmc.log('SkipIntro: Database migration completed successfully', xbmc.LOGINFO)
         except Exception as e:
             xbmc.log(f'SkipIntro: Database migration error: {str(e)}', xbmc.LOGERROR)
 
+    def _migrate_v1_base_schema(self, cursor):
+        """Create the original tables and add any columns older installs lack"""
+        self._create_tables(cursor)
+
+        # Migrate shows_config table
+        self._migrate_table(cursor, 'shows_config', {
+            'show_id': 'INTEGER PRIMARY KEY',
+            'use_chapters': 'BOOLEAN DEFAULT 0',
+            'intro_start_chapter': 'INTEGER',
+            'intro_end_chapter': 'INTEGER',
+            'intro_start_time': 'REAL',
+            'intro_end_time': 'REAL',
+            'outro_start_time': 'REAL',
+            'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        }, 'FOREIGN KEY (show_id) REFERENCES shows(id)')
+
+        # Migrate episodes table
+        self._migrate_table(cursor, 'episodes', {
+            'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+            'show_id': 'INTEGER',
+            'season': 'INTEGER',
+            'episode': 'INTEGER',
+            'intro_start_chapter': 'INTEGER',
+            'intro_end_chapter': 'INTEGER',
+            'intro_start_time': 'REAL',
+            'intro_end_time': 'REAL',
+            'outro_start_time': 'REAL',
+            'source': 'TEXT',
+            'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        }, 'FOREIGN KEY (show_id) REFERENCES shows(id), UNIQUE(show_id, season, episode)')
+
+    def _migrate_v2_normalized_titles(self, cursor):
+        """Add a unique normalised title key and a table of alternate titles"""
+        self._migrate_table(cursor, 'shows', {
+            'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+            'title': 'TEXT NOT NULL',
+            'normalized_title': 'TEXT',
+            'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        })
+
+        # Backfill the key, folding rows that normalise to the same title into the oldest one
+        cursor.execute('SELECT id, title FROM shows ORDER BY id')
+        canonical_ids = {}
+        for show_id, title in cursor.fetchall():
+            key = normalize_title(title)
+            if key not in canonical_ids:
+                canonical_ids[key] = show_id
+                cursor.execute('UPDATE shows SET normalized_title = ? WHERE id = ?', (key, show_id))
+            else:
+                self._merge_show(cursor, show_id, canonical_ids[key])
+
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_shows_normalized_title ON shows(normalized_title)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS show_aliases (
+                alias TEXT PRIMARY KEY,
+                show_id INTEGER NOT NULL,
+                FOREIGN KEY (show_id) REFERENCES shows(id)
+            ) WITHOUT ROWID
+        ''')
+
+    def _migrate_v3_segments(self, cursor):
+        """Add a table of typed skip segments (recap, intro, preview, outro, credits)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                show_id INTEGER NOT NULL,
+                season INTEGER,
+                episode INTEGER,
+                kind TEXT NOT NULL,
+                start_time REAL NOT NULL,
+                end_time REAL,
+                source TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (show_id) REFERENCES shows(id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_segments_episode ON segments(show_id, season, episode)')
+
+    def _migrate_v4_chapter_cache(self, cursor):
+        """Add a cache of parsed chapters keyed by file path, size and mtime"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chapter_cache (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                chapters TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    def _migrate_v5_index_state(self, cursor):
+        """Add a key/value table where the library indexer keeps its progress"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS index_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            ) WITHOUT ROWID
+        ''')
+
+    def _migrate_v6_fingerprints(self, cursor):
+        """Index intro fingerprints kept in the binary fingerprint store"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                show_id INTEGER NOT NULL,
+                season INTEGER,
+                episode INTEGER,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (show_id) REFERENCES shows(id),
+                UNIQUE(show_id, season, episode)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_fingerprints_show ON fingerprints(show_id, season)')
+
+    def _migrate_v7_library_ids(self, cursor):
+        """Key shows and episodes by Kodi library ids and shows by external ids"""
+        self._migrate_table(cursor, 'shows', {
+            'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+            'title': 'TEXT NOT NULL',
+            'normalized_title': 'TEXT',
+            'tvshowid': 'INTEGER',
+            'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        })
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_shows_tvshowid ON shows(tvshowid)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS show_ids (
+                provider TEXT NOT NULL,
+                value TEXT NOT NULL,
+                show_id INTEGER NOT NULL,
+                PRIMARY KEY (provider, value),
+                FOREIGN KEY (show_id) REFERENCES shows(id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_show_ids_show ON show_ids(show_id)')
+        self._migrate_table(cursor, 'episodes', {
+            'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+            'show_id': 'INTEGER',
+            'season': 'INTEGER',
+            'episode': 'INTEGER',
+            'intro_start_chapter': 'INTEGER',
+            'intro_end_chapter': 'INTEGER',
+            'intro_start_time': 'REAL',
+            'intro_end_time': 'REAL',
+            'outro_start_time': 'REAL',
+            'source': 'TEXT',
+            'episodeid': 'INTEGER',
+            'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        }, 'FOREIGN KEY (show_id) REFERENCES shows(id), UNIQUE(show_id, season, episode)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_episodes_episodeid ON episodes(episodeid)')
+
+    def _migrate_v8_revisions(self, cursor):
+        """Number every change to episode and show markers for syncing between devices.
+
+        Triggers stamp a row with the next value of a single counter when it
+        is inserted or a marker column actually changes, so rewriting the
+        same values, as a sync echo does, leaves the revision alone.
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS revision_counter (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO revision_counter (id, value) VALUES (1, 1)')
+        tracked = {
+            'episodes': self._EPISODE_COLUMNS,
+            'shows_config': ('use_chapters',) + self._CONFIG_COLUMNS
+        }
+        # The empty config get_show gives every new show stays without a revision
+        # until something is set, so only a config that was cleared syncs as cleared
+        settings = ' OR '.join(['{row}use_chapters'] + [f'{{row}}{column} IS NOT NULL' for column in self._CONFIG_COLUMNS])
+        stamped_when = {'shows_config': settings}
+        for table, columns in tracked.items():
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN revision INTEGER')
+            # Rows from before syncing all count as the first revision
+            condition = stamped_when.get(table)
+            cursor.execute(f'UPDATE {table} SET revision = 1' + (' WHERE ' + condition.format(row='') if condition else ''))
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_revision ON {table}(revision)')
+            stamp = f'''
+                BEGIN
+                    UPDATE revision_counter SET value = value + 1;
+                    UPDATE {table} SET revision = (SELECT value FROM revision_counter) WHERE rowid = NEW.rowid;
+                END
+            '''
+            when = 'WHEN ' + condition.format(row='NEW.') if condition else ''
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_revision_insert AFTER INSERT ON {table} {when} {stamp}')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_revision_update
+                AFTER UPDATE OF {', '.join(columns)} ON {table}
+                WHEN {' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in columns)}
+                {stamp}
+            ''')
+
+    def _merge_show(self, cursor, duplicate_id, show_id):
+        """Move a duplicate show's data onto show_id and delete the duplicate"""
+        xbmc.log(f'SkipIntro: Merging duplicate show {duplicate_id} into {show_id}', xbmc.LOGINFO)
+        configured = '''
+            SELECT 1 FROM shows_config WHERE show_id = ? AND (
+                intro_start_chapter IS NOT NULL OR intro_end_chapter IS NOT NULL OR
+                intro_start_time IS NOT NULL OR intro_end_time IS NOT NULL OR
+                outro_start_time IS NOT NULL)
+        '''
+        # Keep the duplicate's config only when the surviving show has none of its own
+        if cursor.execute(configured, (show_id,)).fetchone() is None and \
+                cursor.execute(configured, (duplicate_id,)).fetchone() is not None:
+            cursor.execute('DELETE FROM shows_config WHERE show_id = ?', (show_id,))
+            cursor.execute('UPDATE shows_config SET show_id = ? WHERE show_id = ?', (show_id, duplicate_id))
+        else:
+            cursor.execute('DELETE FROM shows_config WHERE show_id = ?', (duplicate_id,))
+
+        cursor.execute('UPDATE OR IGNORE episodes SET show_id = ? WHERE show_id = ?', (show_id, duplicate_id))
+        cursor.execute('DELETE FROM episodes WHERE show_id = ?', (duplicate_id,))
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='segments'").fetchone():
+            cursor.execute('UPDATE segments SET show_id = ? WHERE show_id = ?', (show_id, duplicate_id))
+        cursor.execute('DELETE FROM shows WHERE id = ?', (duplicate_id,))
+
     def _migrate_table(self, cursor, table_name, columns, additional_sql=''):
         """Migrate a single table"""
         xbmc.log(f'SkipIntro: Migrating {table_name} table', xbmc.LOGINFO)
         
         # Check if the table exists
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
         table_exists = cursor.fetchone() is not None
 
         if table_exists:
@@ -86,44 +434,40 @@ class ShowDatabase:
 
         xbmc.log(f'SkipIntro: {table_name} table migration completed', xbmc.LOGINFO)
     
-    def _create_tables(self):
-        """Create database tables with current schema"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                c = conn.cursor()
-                
-                # Shows table
-                c.execute('''
-                    CREATE TABLE IF NOT EXISTS shows (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        title TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Shows config table
-                c.execute('''
-                    CREATE TABLE IF NOT EXISTS shows_config (
-                        show_id INTEGER PRIMARY KEY,
-                        use_chapters BOOLEAN DEFAULT 0,
-                        intro_start_chapter INTEGER,
-                        intro_end_chapter INTEGER,
-                        intro_start_time REAL,
-                        intro_end_time REAL,
-                        outro_start_time REAL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (show_id) REFERENCES shows(id)
-                    )
-                ''')
-                
-                conn.commit()
-        except Exception as e:
-            xbmc.log(f'SkipIntro: Database error: {str(e)}', xbmc.LOGERROR)
+    def _create_tables(self, cursor):
+        """Create database tables with the base schema"""
+        # Shows table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shows (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Shows config table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shows_config (
+                show_id INTEGER PRIMARY KEY,
+                use_chapters BOOLEAN DEFAULT 0,
+                intro_start_chapter INTEGER,
+                intro_end_chapter INTEGER,
+                intro_start_time REAL,
+                intro_end_time REAL,
+                outro_start_time REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (show_id) REFERENCES shows(id)
+            )
+        ''')
 
     def get_show_config(self, show_id):
         """Get show configuration"""
+        cached = self._config_cache.get(show_id)
+        if cached is not None:
+            return dict(cached)
+
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._get_connection() as conn:
                 c = conn.cursor()
                 c.execute('''
                     SELECT use_chapters, intro_start_chapter, intro_end_chapter,
@@ -143,7 +487,8 @@ class ShowDatabase:
                         'outro_start_time': result[5]
                     }
                     xbmc.log(f'SkipIntro: Found show config: {config}', xbmc.LOGINFO)
-                    return config
+                    self._config_cache.put(show_id, config)
+                    return dict(config)
                 
                 return None
         except Exception as e:
@@ -152,62 +497,237 @@ class ShowDatabase:
 
     def save_show_config(self, show_id, config):
         """Save show configuration"""
+        if not self.save_show_config_many([(show_id, config)]):
+            return False
+        xbmc.log(f'SkipIntro: Successfully saved show config: {config}', xbmc.LOGINFO)
+        return True
+
+    def save_show_config_many(self, rows, unsent_since=None):
+        """Save (show_id, config) rows in a single transaction.
+
+        With unsent_since, configs changed after that revision are kept as they are.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                c = conn.cursor()
-                c.execute('''
-                    INSERT OR REPLACE INTO shows_config 
-                    (show_id, use_chapters, intro_start_chapter, intro_end_chapter,
-                     intro_start_time, intro_end_time, outro_start_time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    show_id,
-                    config.get('use_chapters', False),
-                    config.get('intro_start_chapter'),
-                    config.get('intro_end_chapter'),
-                    config.get('intro_start_time'),
-                    config.get('intro_end_time'),
-                    config.get('outro_start_time')
-                ))
-                conn.commit()
-                xbmc.log(f'SkipIntro: Successfully saved show config: {config}', xbmc.LOGINFO)
+            extra = () if unsent_since is None else (unsent_since,)
+            params = [(
+                show_id,
+                config.get('use_chapters', False),
+                config.get('intro_start_chapter'),
+                config.get('intro_end_chapter'),
+                config.get('intro_start_time'),
+                config.get('intro_end_time'),
+                config.get('outro_start_time')
+            ) + extra for show_id, config in rows]
+            if not params:
                 return True
+
+            where = ''
+            if unsent_since is not None:
+                where = 'WHERE shows_config.revision IS NULL OR shows_config.revision <= ?'
+            # An upsert rather than a replace, so saving unchanged values keeps the row's revision
+            with self._get_connection() as conn:
+                conn.executemany(f'''
+                    INSERT INTO shows_config
+                    (show_id, use_chapters, {', '.join(self._CONFIG_COLUMNS)})
+                    VALUES (?, ?, {', '.join('?' for _ in self._CONFIG_COLUMNS)})
+                    ON CONFLICT(show_id) DO UPDATE SET
+                    use_chapters = excluded.use_chapters,
+                    {', '.join(f'{column} = excluded.{column}' for column in self._CONFIG_COLUMNS)}
+                    {where}
+                ''', params)
+            for row in params:
+                self._config_cache.pop(row[0])
+            return True
         except Exception as e:
             xbmc.log(f'SkipIntro: Error saving show config: {str(e)}', xbmc.LOGERROR)
             return False
 
-    def get_show(self, title):
-        """Get show by title, create if doesn't exist"""
+    def get_show(self, title, tvshowid=None, uniqueid=None):
+        """Get show by title, create if doesn't exist.
+
+        Kodi's tvshowid is tried first, then external ids such as
+        {'tvdb': '81189'}, then the normalised title and known aliases.
+        Ids the show is found or created with are stored for later lookups,
+        and a new spelling found through an id becomes an alias.
+        """
+        # Each spelling is looked up once per id, so new ones get stored as aliases
+        cache_key = (tvshowid, title) if tvshowid else title
+        show_id = self._show_cache.get(cache_key)
+        if show_id is not None:
+            return show_id
+
         try:
             xbmc.log(f'SkipIntro: Looking up show: {title}', xbmc.LOGINFO)
-            with sqlite3.connect(self.db_path) as conn:
+            key = normalize_title(title)
+            uniqueid = {provider.lower(): str(value) for provider, value in (uniqueid or {}).items() if value}
+            with self._get_connection() as conn:
                 c = conn.cursor()
-                c.execute('SELECT id FROM shows WHERE title = ?', (title,))
-                result = c.fetchone()
-                
-                if result:
-                    xbmc.log(f'SkipIntro: Found existing show ID: {result[0]}', xbmc.LOGINFO)
-                    return result[0]
-                
-                xbmc.log(f'SkipIntro: Creating new show entry for: {title}', xbmc.LOGINFO)
-                c.execute('INSERT INTO shows (title) VALUES (?)', (title,))
-                conn.commit()
-                show_id = c.lastrowid
-                
-                # Create empty show config without default values
-                self.save_show_config(show_id, {
-                    'use_chapters': False,
-                    'intro_start_time': None,
-                    'intro_end_time': None,
-                    'outro_start_time': None
-                })
-                
-                xbmc.log(f'SkipIntro: Created show with ID: {show_id}', xbmc.LOGINFO)
+                show_id = self._find_show_by_ids(c, tvshowid, uniqueid)
+                if show_id is not None:
+                    if self._find_show_id(c, key) is None:
+                        c.execute('INSERT OR IGNORE INTO show_aliases (alias, show_id) VALUES (?, ?)', (key, show_id))
+                else:
+                    result = self._find_show_id(c, key)
+                    show_id = result[0] if result else None
+
+                if show_id is not None:
+                    xbmc.log(f'SkipIntro: Found existing show ID: {show_id}', xbmc.LOGINFO)
+                else:
+                    xbmc.log(f'SkipIntro: Creating new show entry for: {title}', xbmc.LOGINFO)
+                    c.execute('INSERT OR IGNORE INTO shows (title, normalized_title) VALUES (?, ?)', (title, key))
+                    if c.rowcount == 0:
+                        # Another process created it since we looked
+                        show_id = self._find_show_id(c, key)[0]
+                    else:
+                        show_id = c.lastrowid
+                        # Create empty show config without default values, in the same transaction
+                        c.execute('''
+                            INSERT OR REPLACE INTO shows_config (show_id, use_chapters)
+                            VALUES (?, 0)
+                        ''', (show_id,))
+                        xbmc.log(f'SkipIntro: Created show with ID: {show_id}', xbmc.LOGINFO)
+
+                self._store_show_ids(c, show_id, tvshowid, uniqueid)
+                self._show_cache.put(cache_key, show_id)
                 return show_id
         except Exception as e:
             xbmc.log(f'SkipIntro: Error getting show: {str(e)}', xbmc.LOGERROR)
             return None
 
+    def import_shows(self, shows):
+        """Find or create the shows of imported (title, uniqueid, aliases) entries.
+
+        Shows are matched by external id, then title or alias, like
+        get_show. Missing shows, ids and new aliases are written with one
+        executemany each in a single transaction. Returns the show_id of each
+        entry in order, or None on error.
+        """
+        try:
+            entries = []
+            for title, uniqueid, aliases in shows:
+                uniqueid = {provider.lower(): str(value) for provider, value in (uniqueid or {}).items() if value}
+                entries.append((title, normalize_title(title), uniqueid, aliases or ()))
+            with self._get_connection() as conn:
+                c = conn.cursor()
+                show_ids = []
+                for title, key, uniqueid, _ in entries:
+                    show_id = self._find_show_by_ids(c, None, uniqueid)
+                    if show_id is None:
+                        result = self._find_show_id(c, key)
+                        show_id = result[0] if result else None
+                    show_ids.append(show_id)
+
+                missing = {key: title for (title, key, _, _), show_id in zip(entries, show_ids) if show_id is None}
+                if missing:
+                    c.executemany('INSERT OR IGNORE INTO shows (title, normalized_title) VALUES (?, ?)',
+                                  [(title, key) for key, title in missing.items()])
+                    created = {key: self._find_show_id(c, key)[0] for key in missing}
+                    # Empty configs like get_show creates; shows made meanwhile keep theirs
+                    c.executemany('INSERT OR IGNORE INTO shows_config (show_id, use_chapters) VALUES (?, 0)',
+                                  [(show_id,) for show_id in created.values()])
+                    show_ids = [created[key] if show_id is None else show_id
+                                for (_, key, _, _), show_id in zip(entries, show_ids)]
+
+                c.executemany('INSERT OR IGNORE INTO show_ids (provider, value, show_id) VALUES (?, ?, ?)', [
+                    (provider, value, show_id)
+                    for (_, _, uniqueid, _), show_id in zip(entries, show_ids)
+                    for provider, value in uniqueid.items()])
+                # A title found through an id is a new spelling too
+                aliases = {}
+                for (title, _, _, titles), show_id in zip(entries, show_ids):
+                    for alias in (title,) + tuple(titles):
+                        key = normalize_title(alias)
+                        if key not in aliases and self._find_show_id(c, key) is None:
+                            aliases[key] = show_id
+                c.executemany('INSERT OR IGNORE INTO show_aliases (alias, show_id) VALUES (?, ?)', list(aliases.items()))
+
+            for (title, _, _, _), show_id in zip(entries, show_ids):
+                self._show_cache.put(title, show_id)
+            xbmc.log(f'SkipIntro: Imported {len(entries)} show(s), {len(missing)} new, '
+                     f'{len(aliases)} new alias(es)', xbmc.LOGINFO)
+            return show_ids
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error importing shows: {str(e)}', xbmc.LOGERROR)
+            return None
+
+    def find_show(self, title, tvshowid=None, uniqueid=None):
+        """Look a show up like get_show, but return None instead of creating it"""
+        show_id = self._show_cache.get((tvshowid, title) if tvshowid else title)
+        if show_id is not None:
+            return show_id
+        try:
+            uniqueid = {provider.lower(): str(value) for provider, value in (uniqueid or {}).items() if value}
+            cursor = self._get_connection().cursor()
+            show_id = self._find_show_by_ids(cursor, tvshowid, uniqueid, drop_stale=False)
+            if show_id is None:
+                result = self._find_show_id(cursor, normalize_title(title))
+                show_id = result[0] if result else None
+            return show_id
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error finding show: {str(e)}', xbmc.LOGERROR)
+            return None
+
+    def _find_show_by_ids(self, cursor, tvshowid, uniqueid, drop_stale=True):
+        """Return the show_id stored for a Kodi tvshowid or any external id, or None.
+
+        Kodi can hand a deleted show's tvshowid to a new one, so a tvshowid
+        match whose external ids disagree is ignored, and dropped as stale
+        unless drop_stale is False.
+        """
+        if tvshowid:
+            row = cursor.execute('SELECT id FROM shows WHERE tvshowid = ?', (tvshowid,)).fetchone()
+            if row:
+                stored = dict(cursor.execute('SELECT provider, value FROM show_ids WHERE show_id = ?', (row[0],)))
+                if not any(provider in stored and stored[provider] != value for provider, value in uniqueid.items()):
+                    return row[0]
+                if drop_stale:
+                    xbmc.log(f'SkipIntro: Dropping stale tvshowid {tvshowid} of show {row[0]}', xbmc.LOGINFO)
+                    cursor.execute('UPDATE shows SET tvshowid = NULL WHERE id = ?', (row[0],))
+        for provider, value in uniqueid.items():
+            row = cursor.execute('SELECT show_id FROM show_ids WHERE provider = ? AND value = ?',
+                                 (provider, value)).fetchone()
+            if row:
+                return row[0]
+        return None
+
+    def _store_show_ids(self, cursor, show_id, tvshowid, uniqueid):
+        if tvshowid:
+            cursor.execute('UPDATE shows SET tvshowid = ? WHERE id = ? AND tvshowid IS NOT ?',
+                           (tvshowid, show_id, tvshowid))
+        if uniqueid:
+            cursor.executemany('INSERT OR IGNORE INTO show_ids (provider, value, show_id) VALUES (?, ?, ?)',
+                               [(provider, value, show_id) for provider, value in uniqueid.items()])
+
+    def _find_show_id(self, cursor, key):
+        """Return a (show_id,) row for a normalised title or alias, or None"""
+        cursor.execute('SELECT id FROM shows WHERE normalized_title = ?', (key,))
+        result = cursor.fetchone()
+        if result is None:
+            cursor.execute('SELECT show_id FROM show_aliases WHERE alias = ?', (key,))
+            result = cursor.fetchone()
+        return result
+
+    def add_show_alias(self, show_id, title):
+        """Map an alternate spelling of a show title to show_id"""
+        if self._show_cache.get(title) == show_id:
+            return True
+        try:
+            key = normalize_title(title)
+            with self._get_connection() as conn:
+                c = conn.cursor()
+                existing = self._find_show_id(c, key)
+                if existing is None:
+                    c.execute('INSERT OR REPLACE INTO show_aliases (alias, show_id) VALUES (?, ?)', (key, show_id))
+                    xbmc.log(f'SkipIntro: Added alias "{title}" for show {show_id}', xbmc.LOGINFO)
+                elif existing[0] != show_id:
+                    xbmc.log(f'SkipIntro: Alias "{title}" already belongs to show {existing[0]}', xbmc.LOGDEBUG)
+                    return False
+            self._show_cache.put(title, show_id)
+            return True
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error adding show alias: {str(e)}', xbmc.LOGERROR)
+            return False
+
     def set_manual_show_times(self, show_id, intro_start, intro_end, outro_start=None):
         """Manually set intro/outro times for a show"""
         try:
@@ -271,3 +791,315 @@ class ShowDatabase:
         except Exception as e:
             xbmc.log(f'SkipIntro: Error getting show times/chapters: {str(e)}', xbmc.LOGERROR)
             return None
+
+    def save_episode_times(self, show_id, season, episode, times):
+        """Save intro/outro times or chapters for a single episode"""
+        return self.save_episode_times_many([(show_id, season, episode, times)])
+
+    def save_episode_times_many(self, rows, keep_manual=False, unsent_since=None):
+        """Save (show_id, season, episode, times) rows in a single transaction.
+
+        With keep_manual, rows whose stored times were entered by hand are
+        only replaced by other manual times. With unsent_since, rows changed
+        after that revision are kept as they are. Rows without season and
+        episode numbers, such as dated files, cannot be keyed and are skipped.
+        """
+        try:
+            params = []
+            extra = () if unsent_since is None else (unsent_since,)
+            for show_id, season, episode, times in rows:
+                if season is None or episode is None:
+                    continue
+                params.append((show_id, season, episode) +
+                              tuple(times.get(column) for column in self._EPISODE_COLUMNS) +
+                              (times.get('episodeid'),) + extra)
+            if not params:
+                return True
+
+            sql = self._UPSERT_EPISODE_KEEP_MANUAL_SQL if keep_manual else self._UPSERT_EPISODE_SQL
+            if unsent_since is not None:
+                sql += (' AND ' if keep_manual else ' WHERE ') + self._KEEP_UNSENT_CONDITION
+            with self._get_connection() as conn:
+                conn.executemany(sql, params)
+            for row in params:
+                self._episode_cache.pop(row[:3])
+                self._season_cache.pop(row[:2])
+            xbmc.log(f'SkipIntro: Saved times for {len(params)} episode(s)', xbmc.LOGINFO)
+            return True
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error saving episode times: {str(e)}', xbmc.LOGERROR)
+            return False
+
+    def get_episode_times(self, show_id, season, episode, episodeid=None):
+        """Get saved times for one episode, or None if nothing is stored.
+
+        With Kodi's episodeid the row saved for that library item is tried
+        first, so times survive a change of season or episode numbering.
+        """
+        key = (show_id, season, episode)
+        cached = self._episode_cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return dict(cached) if cached else None
+
+        try:
+            conn = self._get_connection()
+            row = None
+            if episodeid:
+                row = conn.execute(f'''
+                    SELECT {', '.join(self._EPISODE_COLUMNS)}
+                    FROM episodes
+                    WHERE episodeid = ? AND show_id = ?
+                    ORDER BY id DESC LIMIT 1
+                ''', (episodeid, show_id)).fetchone()
+            if row is None:
+                row = conn.execute(f'''
+                    SELECT {', '.join(self._EPISODE_COLUMNS)}
+                    FROM episodes
+                    WHERE show_id = ? AND season = ? AND episode = ?
+                ''', key).fetchone()
+            times = dict(zip(self._EPISODE_COLUMNS, row)) if row else None
+            self._episode_cache.put(key, times)
+            return dict(times) if times else None
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error getting episode times: {str(e)}', xbmc.LOGERROR)
+            return None
+
+    def get_season_times(self, show_id, season):
+        """Get saved times for every stored episode of a season as {episode: times}"""
+        try:
+            conn = self._get_connection()
+            rows = conn.execute(f'''
+                SELECT episode, {', '.join(self._EPISODE_COLUMNS)}
+                FROM episodes
+                WHERE show_id = ? AND season = ?
+                ORDER BY episode
+            ''', (show_id, season)).fetchall()
+            season_times = {}
+            for row in rows:
+                times = dict(zip(self._EPISODE_COLUMNS, row[1:]))
+                self._episode_cache.put((show_id, season, row[0]), times)
+                season_times[row[0]] = dict(times)
+            return season_times
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error getting season times: {str(e)}', xbmc.LOGERROR)
+            return {}
+
+    def get_season_summary(self, show_id, season):
+        """Get the summary of a season's confirmed times, or None if there are too few"""
+        key = (show_id, season)
+        cached = self._season_cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return dict(cached) if cached else None
+
+        summary = summarize_season(self.get_season_times(show_id, season))
+        self._season_cache.put(key, summary)
+        return dict(summary) if summary else None
+
+    def get_inferred_times(self, show_id, season):
+        """Get times for an episode without saved times from its season's summary, or None"""
+        return inferred_times(self.get_season_summary(show_id, season))
+
+    def save_segments(self, show_id, season, episode, segments, source='manual'):
+        """Replace the stored segments for an episode.
+
+        segments is a list of dicts with kind, start_time and end_time (None
+        meaning the end of the file). Pass season and episode as None for
+        segments that apply to every episode of the show.
+        """
+        try:
+            rows = [
+                (show_id, season, episode, segment['kind'], segment['start_time'],
+                 segment.get('end_time'), segment.get('source', source))
+                for segment in segments
+            ]
+            with self._get_connection() as conn:
+                conn.execute('''
+                    DELETE FROM segments
+                    WHERE show_id = ? AND season IS ? AND episode IS ?
+                ''', (show_id, season, episode))
+                conn.executemany('''
+                    INSERT INTO segments (show_id, season, episode, kind, start_time, end_time, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            self._segment_cache.remove_if(lambda key, value: key[0] == show_id)
+            xbmc.log(f'SkipIntro: Saved {len(rows)} segment(s) for show {show_id}', xbmc.LOGINFO)
+            return True
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error saving segments: {str(e)}', xbmc.LOGERROR)
+            return False
+
+    def get_segments(self, show_id, season, episode):
+        """Get segments for an episode, including show-wide ones it does not override"""
+        key = (show_id, season, episode)
+        cached = self._segment_cache.get(key)
+        if cached is not None:
+            return [dict(segment) for segment in cached]
+
+        try:
+            rows = self._get_connection().execute('''
+                SELECT kind, start_time, end_time, source, season IS NULL
+                FROM segments
+                WHERE show_id = ? AND ((season = ? AND episode = ?) OR season IS NULL)
+                ORDER BY start_time
+            ''', key).fetchall()
+            episode_kinds = {row[0] for row in rows if not row[4]}
+            segments = [
+                {'kind': row[0], 'start_time': row[1], 'end_time': row[2], 'source': row[3]}
+                for row in rows
+                if not (row[4] and row[0] in episode_kinds)
+            ]
+            self._segment_cache.put(key, segments)
+            return [dict(segment) for segment in segments]
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error getting segments: {str(e)}', xbmc.LOGERROR)
+            return []
+
+    def get_revision(self):
+        """Return the revision of the latest marker change, or None on error"""
+        try:
+            row = self._get_connection().execute('SELECT value FROM revision_counter WHERE id = 1').fetchone()
+            return row[0] if row else 0
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error reading revision: {str(e)}', xbmc.LOGERROR)
+            return None
+
+    def iter_show_records(self, since=None, until=None):
+        """Yield every show with its config, external ids and aliases, for export.
+
+        use_chapters is None for shows that were never configured, and False
+        with no chapters or times for a config that was cleared, so importing
+        it clears the config elsewhere too. With since, only shows with markers changed in revisions after since,
+        up to and including until, are included. Rows are read from a live cursor, so exporting a
+        large database stays flat in memory; errors are left to the caller.
+        """
+        conn = self._get_connection()
+        ids = {}
+        for provider, value, show_id in conn.execute('SELECT provider, value, show_id FROM show_ids'):
+            ids.setdefault(show_id, {})[provider] = value
+        aliases = {}
+        for alias, show_id in conn.execute('SELECT alias, show_id FROM show_aliases ORDER BY alias'):
+            aliases.setdefault(show_id, []).append(alias)
+
+        where, params = '', ()
+        if since is not None:
+            until = self._MAX_REVISION if until is None else until
+            where = '''
+                WHERE s.id IN (
+                    SELECT show_id FROM episodes WHERE revision > ? AND revision <= ?
+                    UNION SELECT show_id FROM shows_config WHERE revision > ? AND revision <= ?)
+            '''
+            params = (since, until, since, until)
+        cursor = conn.execute(f'''
+            SELECT s.id, s.title, c.revision, c.use_chapters, {', '.join('c.' + column for column in self._CONFIG_COLUMNS)}
+            FROM shows s LEFT JOIN shows_config c ON c.show_id = s.id
+            {where}
+            ORDER BY s.id
+        ''', params)
+        for row in cursor:
+            config = dict(zip(self._CONFIG_COLUMNS, row[4:]))
+            # get_show leaves an unrevisioned empty config on every new show; it must not overwrite a real one elsewhere
+            configured = row[2] is not None or bool(row[3]) or any(value is not None for value in config.values())
+            record = {
+                'show': row[0],
+                'title': row[1],
+                'ids': ids.get(row[0], {}),
+                'aliases': aliases.get(row[0], []),
+                'use_chapters': bool(row[3]) if configured else None
+            }
+            record.update(config)
+            yield record
+
+    def iter_episode_records(self, since=None, until=None):
+        """Yield every episode's saved times, grouped by show, for export.
+
+        With since, only episodes changed in revisions after since, up to and
+        including until.
+        """
+        where, params = '', ()
+        if since is not None:
+            until = self._MAX_REVISION if until is None else until
+            where, params = 'WHERE revision > ? AND revision <= ?', (since, until)
+        cursor = self._get_connection().execute(f'''
+            SELECT show_id, season, episode, {', '.join(self._EPISODE_COLUMNS)}
+            FROM episodes
+            {where}
+            ORDER BY show_id, season, episode
+        ''', params)
+        keys = ('show', 'season', 'episode') + self._EPISODE_COLUMNS
+        for row in cursor:
+            yield dict(zip(keys, row))
+
+    def get_cached_chapters(self, path, size, mtime):
+        """Get chapters parsed earlier for a file, or None if the file changed since"""
+        try:
+            row = self._get_connection().execute('''
+                SELECT chapters FROM chapter_cache
+                WHERE path = ? AND size = ? AND mtime = ?
+            ''', (path, size, mtime)).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error reading chapter cache: {str(e)}', xbmc.LOGERROR)
+            return None
+
+    def save_cached_chapters(self, path, size, mtime, chapters):
+        """Store parsed chapters for a file, replacing any entry for an older version"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO chapter_cache (path, size, mtime, chapters)
+                    VALUES (?, ?, ?, ?)
+                ''', (path, size, mtime, json.dumps(chapters)))
+            return True
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error writing chapter cache: {str(e)}', xbmc.LOGERROR)
+            return False
+
+    def get_index_state(self, key, default=None):
+        """Get a value saved by the library indexer"""
+        try:
+            row = self._get_connection().execute(
+                'SELECT value FROM index_state WHERE key = ?', (key,)).fetchone()
+            return row[0] if row else default
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error reading index state: {str(e)}', xbmc.LOGERROR)
+            return default
+
+    def set_index_state(self, key, value):
+        """Save a library indexer value, or remove it when value is None"""
+        try:
+            with self._get_connection() as conn:
+                if value is None:
+                    conn.execute('DELETE FROM index_state WHERE key = ?', (key,))
+                else:
+                    conn.execute('INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)', (key, str(value)))
+            return True
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error saving index state: {str(e)}', xbmc.LOGERROR)
+            return False
+
+    def save_fingerprint(self, show_id, season, episode, offset, length):
+        """Record where an episode's intro fingerprint sits in the fingerprint store"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO fingerprints (show_id, season, episode, offset, length)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (show_id, season, episode, offset, length))
+            return True
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error saving fingerprint index: {str(e)}', xbmc.LOGERROR)
+            return False
+
+    def get_fingerprints(self, show_id, season=None, limit=None):
+        """Get a show's stored intro fingerprints, those of season first, newest first"""
+        try:
+            rows = self._get_connection().execute('''
+                SELECT season, episode, offset, length FROM fingerprints
+                WHERE show_id = ?
+                ORDER BY season IS NOT ?, id DESC
+                LIMIT ?
+            ''', (show_id, season, -1 if limit is None else limit)).fetchall()
+            return [dict(zip(('season', 'episode', 'offset', 'length'), row)) for row in rows]
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error reading fingerprint index: {str(e)}', xbmc.LOGERROR)
+            return []
@@ -0,0 +1,129 @@
+import re
+from resources.lib.cache import LRUCache
+
+# Parsed paths, including ones that did not match; shared by every caller
+_parse_cache = LRUCache(1024)
+_MISSING = object()
+
+# Release group tags such as "[SubsPlease] " in front of anime titles
+_LEADING_TAG = re.compile(r'^(?:\[[^\]]*\][ ._-]*)+')
+_TITLE_SEPARATORS = str.maketrans('._', '  ')
+_EPISODE_NUMBER = re.compile(r'\d+')
+
+def _episode_list(first, more):
+    """Episode numbers of a multi-episode file; E01-E03 is a range, E01E02 a list"""
+    if not more:
+        return [first]
+    numbers = [first] + [int(number) for number in _EPISODE_NUMBER.findall(more)]
+    if len(numbers) == 2 and '-' in more and numbers[1] > numbers[0]:
+        return list(range(numbers[0], numbers[1] + 1))
+    return numbers
+
+def _season_episode(match):
+    season, first, more = match.group('season', 'episode', 'more')
+    first = int(first)
+    return {
+        'season': int(season),
+        'episode': first,
+        'episodes': _episode_list(first, more)
+    }
+
+def _air_date(match):
+    year, month, day = (int(match.group(name)) for name in ('year', 'month', 'day'))
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    # Dated files carry no episode numbers; inventing some would collide with real ones
+    return {'season': None, 'episode': None, 'air_date': f'{year:04d}-{month:02d}-{day:02d}'}
+
+def _absolute(match):
+    return {'season': None, 'episode': None, 'absolute': int(match.group('absolute'))}
+
+# Tried in order; the first match wins, so explicit SxxEyy markers beat
+# looser forms that also occur in titles. Each pattern finds the episode
+# marker only and everything before it is the title. A pattern is skipped
+# unless its hint occurs in the lowercased name, which keeps misses cheap.
+# Patterns spell out both cases instead of using re.IGNORECASE, which
+# would stop re from scanning ahead for the first character.
+PATTERNS = (
+    ('season_episode', None, re.compile(
+        r'[sS](?<![a-zA-Z0-9][sS])(?P<season>\d{1,4})[ ._-]?[eE](?P<episode>\d{1,4})'
+        r'(?P<more>(?:[ ._]?-?[ ._]?[eE]\d{1,4}(?!\d))*)'), _season_episode),
+    ('words', 'season', re.compile(
+        r'(?<![a-z0-9])season[ ._-]*(?P<season>\d{1,4})[ ._-]*episode[ ._-]*(?P<episode>\d{1,4})(?P<more>)',
+        re.IGNORECASE), _season_episode),
+    ('date', None, re.compile(
+        r'(?<!\d)(?P<year>(?:19|20)\d{2})[ ._-](?P<month>\d{2})[ ._-](?P<day>\d{2})(?!\d)'), _air_date),
+    # 1x02 needs a two-digit episode and separators around it, so 1920x1080 or "4x4" titles do not match
+    ('cross', 'x', re.compile(
+        r'(?:^|(?<=[ ._\[(-]))(?P<season>\d{1,2})[xX](?P<episode>\d{2,3})(?P<more>(?:[xX-]\d{2,3}(?!\d))*)'
+        r'(?=$|[ ._\])-])'), _season_episode),
+    ('anime_absolute', '-', re.compile(
+        r'[ ._]-[ ._](?:[eE][pP]?[ ._]?)?(?P<absolute>\d{1,4})(?:v\d)?(?=$|[ ._]*[\[(]|[ ._]+-)'), _absolute),
+    ('episode_only', 'ep', re.compile(
+        r'(?<![a-z0-9])(?:ep|episode)[ ._-]?(?P<absolute>\d{1,4})(?!\d)', re.IGNORECASE), _absolute),
+)
+_SEASON_EPISODE = PATTERNS[0][2]
+
+def clean_title(raw):
+    """Turn the part of a filename before the episode marker into a title"""
+    if raw.startswith('['):
+        raw = _LEADING_TAG.sub('', raw)
+    return ' '.join(raw.translate(_TITLE_SEPARATORS).split()).strip(' -[(')
+
+def _basename(path):
+    return path.rsplit('/', 1)[-1].rsplit('\\', 1)[-1]
+
+def parse_basename(basename):
+    """Parse a filename without its directory; returns a dict or None.
+
+    The dict has title, season and episode, plus episodes for multi-episode
+    files. Dated episodes and anime numbering give air_date or absolute
+    instead, with season and episode left as None.
+    """
+    stem = basename
+    dot = stem.rfind('.')
+    if dot > 0 and len(stem) - dot <= 5 and stem[dot + 1:].isalnum():
+        stem = stem[:dot]
+
+    # Most names carry SxxEyy, so match it before paying for the hinted table
+    match = _SEASON_EPISODE.search(stem)
+    if match:
+        result = _season_episode(match)
+        result['title'] = clean_title(stem[:match.start()])
+        result['pattern'] = 'season_episode'
+        return result
+
+    lowered = stem.lower()
+    for kind, hint, pattern, build in PATTERNS[1:]:
+        if hint and hint not in lowered:
+            continue
+        match = pattern.search(stem)
+        if not match:
+            continue
+        result = build(match)
+        if result is None:
+            continue
+        result['title'] = clean_title(stem[:match.start()])
+        result['pattern'] = kind
+        return result
+    return None
+
+def parse_filename(path):
+    """Parse a path, remembering the result; returns a new dict or None"""
+    result = _parse_cache.get(path, _MISSING)
+    if result is _MISSING:
+        result = parse_basename(_basename(path))
+        _parse_cache.put(path, result)
+    return dict(result) if result else None
+
+def parse_many(paths):
+    """Parse many paths, e.g. for a library scan; returns {path: dict or None}.
+
+    Batches bypass the shared cache so a large scan does not evict the
+    paths playback keeps asking about.
+    """
+    results = {}
+    for path in paths:
+        if path not in results:
+            results[path] = parse_basename(_basename(path))
+    return results
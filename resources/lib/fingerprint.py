@@ -0,0 +1,275 @@
+import xbmc
+from resources.lib.probe import get_probe_backend
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SAMPLE_RATE = 8000
+FRAME_SIZE = 1024
+HOP_SIZE = 400
+FRAME_SECONDS = HOP_SIZE / SAMPLE_RATE
+
+# Energy bands between these frequencies give 15 bits per fingerprint frame
+BAND_COUNT = 16
+MIN_FREQUENCY = 300
+MAX_FREQUENCY = 3000
+
+# Hashes this common in one episode are silence or tones and say nothing about alignment
+MAX_HASH_REPEATS = 20
+MIN_VOTES = 10
+# Share of differing bits below which two aligned frames count as the same audio
+MAX_BIT_ERROR = 0.35
+SMOOTHING_FRAMES = 20
+
+MIN_INTRO_SECONDS = 10
+MAX_INTRO_SECONDS = 180
+
+def compute_fingerprint(pcm):
+    """Turn mono 16-bit PCM at SAMPLE_RATE into one 15-bit hash per frame.
+
+    Each bit says whether the energy difference between two neighbouring
+    bands rose or fell since the previous frame, which survives volume
+    changes and lossy encoding.
+    """
+    samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+    if len(samples) < FRAME_SIZE + HOP_SIZE:
+        return np.zeros(0, dtype=np.uint32)
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE), axis=1)) ** 2
+    energies = spectrum @ _band_matrix()
+
+    band_diff = energies[:, :-1] - energies[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    return (bits @ (1 << np.arange(BAND_COUNT - 1))).astype(np.uint32)
+
+def _band_matrix():
+    """Matrix summing FFT bins into log-spaced bands"""
+    frequencies = np.fft.rfftfreq(FRAME_SIZE, 1.0 / SAMPLE_RATE)
+    edges = np.geomspace(MIN_FREQUENCY, MAX_FREQUENCY, BAND_COUNT + 1)
+    band = np.searchsorted(edges, frequencies, side='right') - 1
+    matrix = np.zeros((len(frequencies), BAND_COUNT), dtype=np.float32)
+    inside = (band >= 0) & (band < BAND_COUNT)
+    matrix[np.nonzero(inside)[0], band[inside]] = 1.0
+    return matrix
+
+def to_seconds(frame):
+    """Time of a fingerprint frame; hash n describes the change into frame n + 1"""
+    return round((frame + 1) * FRAME_SECONDS, 2)
+
+def to_frame(seconds):
+    """Index of the fingerprint frame at a time returned by to_seconds"""
+    return max(0, int(round(seconds / FRAME_SECONDS)) - 1)
+
+def find_best_offset(a, b):
+    """Return the frame offset of b within a that most hashes agree on, or None"""
+    order = np.argsort(a, kind='stable')
+    sorted_a = a[order]
+    left = np.searchsorted(sorted_a, b, side='left')
+    counts = np.searchsorted(sorted_a, b, side='right') - left
+    counts[counts > MAX_HASH_REPEATS] = 0
+    total = int(counts.sum())
+    if total == 0:
+        return None
+
+    # For every matching pair (i in a, j in b) vote for offset i - j
+    run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    positions = order[np.arange(total) - run_starts + np.repeat(left, counts)]
+    offsets = positions - np.repeat(np.arange(len(b)), counts)
+    votes = np.bincount(offsets - offsets.min())
+    best = int(votes.argmax())
+    if votes[best] < MIN_VOTES:
+        return None
+    return best + int(offsets.min())
+
+def find_common_segment(a, b):
+    """Find the longest stretch of audio shared by two fingerprints.
+
+    Returns (start_a, end_a, start_b, end_b) in seconds, or None if the
+    episodes share no stretch of intro length.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return None
+    offset = find_best_offset(a, b)
+    if offset is None:
+        return None
+
+    start_a, start_b = max(0, offset), max(0, -offset)
+    length = min(len(a) - start_a, len(b) - start_b)
+    if length <= 0:
+        return None
+
+    diff = (a[start_a:start_a + length] ^ b[start_b:start_b + length]).astype('>u2')
+    errors = np.unpackbits(diff.view(np.uint8).reshape(-1, 2), axis=1).sum(axis=1) / (BAND_COUNT - 1)
+    smoothed = np.convolve(errors, np.ones(SMOOTHING_FRAMES) / SMOOTHING_FRAMES, mode='same')
+    matched = np.concatenate(([0], (smoothed < MAX_BIT_ERROR).astype(np.int8), [0]))
+
+    edges = np.diff(matched)
+    run_starts = np.nonzero(edges == 1)[0]
+    run_ends = np.nonzero(edges == -1)[0]
+    if len(run_starts) == 0:
+        return None
+    longest = int((run_ends - run_starts).argmax())
+    first, last = int(run_starts[longest]), int(run_ends[longest])
+
+    seconds = (last - first) * FRAME_SECONDS
+    if not MIN_INTRO_SECONDS <= seconds <= MAX_INTRO_SECONDS:
+        return None
+    return (to_seconds(start_a + first), to_seconds(start_a + last),
+            to_seconds(start_b + first), to_seconds(start_b + last))
+
+class IntroDetector:
+    """Finds intros as the audio that episodes of a season have in common.
+
+    With a database and FingerprintStore, the intros it finds are kept so
+    later episodes of the show are matched against them directly instead of
+    being decoded alongside other episodes.
+    """
+
+    # Other episodes each episode is compared with
+    MAX_REFERENCES = 2
+    # Stored intros tried before falling back to other episodes
+    MAX_KNOWN_INTROS = 3
+    # Intros kept per season; more would rarely add a new match
+    MAX_STORED_PER_SEASON = 2
+
+    def __init__(self, probe=None, scan_seconds=300, db=None, store=None):
+        self._probe = probe
+        self.scan_seconds = scan_seconds
+        self.db = db
+        self.store = store
+
+    @property
+    def probe(self):
+        if self._probe is None:
+            self._probe = get_probe_backend()
+        return self._probe
+
+    @property
+    def available(self):
+        """Detection needs NumPy and ffmpeg"""
+        return np is not None and bool(self.probe.ffmpeg_path)
+
+    def fingerprint(self, path, cancel_event=None):
+        """Fingerprint the start of a file's audio, or None if it could not be decoded"""
+        pcm = self.probe.decode_audio(path, self.scan_seconds, SAMPLE_RATE, cancel_event)
+        if not pcm:
+            return None
+        return compute_fingerprint(pcm)
+
+    def known_intros(self, show_id, season):
+        """Return stored intro fingerprints of the show as arrays backed by the store"""
+        if self.db is None or self.store is None or show_id is None:
+            return []
+        intros = []
+        for entry in self.db.get_fingerprints(show_id, season, self.MAX_KNOWN_INTROS):
+            hashes = self.store.view(entry['offset'], entry['length'])
+            if hashes is not None:
+                intros.append((entry, hashes))
+        return intros
+
+    def detect_season(self, episodes, targets, cancel_event=None, show_id=None, season=None, wait=None):
+        """Detect intros for the target episode numbers of one season.
+
+        episodes maps episode numbers to files for the whole season; the
+        other episodes serve as references when no stored intro matches.
+        wait is an optional callable run before each episode is decoded, e.g.
+        to hold off while a video plays; detection stops once it returns True.
+        Returns {episode: times} for the targets (and references) whose
+        intro was found so far.
+        """
+        if not self.available:
+            return {}
+
+        fingerprints = {}
+        stopped = False
+        def get_fingerprint(number):
+            nonlocal stopped
+            if number not in fingerprints:
+                if stopped or (wait is not None and wait()):
+                    stopped = True
+                    return None
+                fingerprints[number] = self.fingerprint(episodes[number], cancel_event)
+            return fingerprints[number]
+
+        known = self.known_intros(show_id, season)
+        stored = sum(1 for entry, _ in known if entry['season'] == season)
+        found = {}
+        for number in sorted(targets):
+            if number in found or number not in episodes:
+                continue
+            if stopped or (cancel_event is not None and cancel_event.is_set()):
+                break
+            fingerprint = get_fingerprint(number)
+            if fingerprint is None:
+                continue
+
+            match = self._match_known(fingerprint, known)
+            if match:
+                found[number] = self._times(*match)
+                xbmc.log(f'SkipIntro: Stored intro found in episode {number}: {match[0]}-{match[1]}', xbmc.LOGINFO)
+                continue
+
+            # Neighbouring episodes are the most likely to share the same intro
+            references = sorted((other for other in episodes if other != number),
+                                key=lambda other: abs(other - number))[:self.MAX_REFERENCES]
+            best = None
+            for other in references:
+                reference = get_fingerprint(other)
+                if reference is None:
+                    continue
+                match = find_common_segment(fingerprint, reference)
+                if match and (best is None or match[1] - match[0] > best[1][1] - best[1][0]):
+                    best = (other, match)
+            if best is None:
+                xbmc.log(f'SkipIntro: No shared intro found for episode {number}', xbmc.LOGDEBUG)
+                continue
+
+            other, (start, end, other_start, other_end) = best
+            found[number] = self._times(start, end)
+            if other in targets and other not in found:
+                found[other] = self._times(other_start, other_end)
+            xbmc.log(f'SkipIntro: Fingerprint intro for episode {number}: {start}-{end}', xbmc.LOGINFO)
+
+            if stored < self.MAX_STORED_PER_SEASON:
+                intro = self._store_intro(show_id, season, number, fingerprint, start, end)
+                if intro is not None:
+                    # Later targets of this run can match it without decoding references
+                    known.append(({'season': season, 'episode': number}, intro))
+                    stored += 1
+        return found
+
+    @staticmethod
+    def _match_known(fingerprint, known):
+        """Return (start, end) of the longest stored intro found in fingerprint, or None"""
+        best = None
+        for _, intro in known:
+            match = find_common_segment(fingerprint, intro)
+            if match and (best is None or match[1] - match[0] > best[1] - best[0]):
+                best = match[:2]
+        return best
+
+    def _store_intro(self, show_id, season, number, fingerprint, start, end):
+        """Keep the hashes between start and end so later episodes can be matched against them.
+
+        Returns the stored hashes, or None if there is nowhere to store them.
+        """
+        if self.db is None or self.store is None or show_id is None:
+            return None
+        first, last = to_frame(start), to_frame(end)
+        intro = fingerprint[first:last]
+        offset = self.store.append(intro)
+        if not self.db.save_fingerprint(show_id, season, number, offset, len(intro)):
+            return None
+        return intro
+
+    @staticmethod
+    def _times(start, end):
+        return {
+            'intro_start_time': start,
+            'intro_end_time': end,
+            'outro_start_time': None,
+            'source': 'fingerprint'
+        }
@@ -0,0 +1,71 @@
+import mmap
+import os
+import threading
+import xbmc
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Hashes are stored as little-endian uint32, one after another
+ITEM_SIZE = 4
+
+class FingerprintStore:
+    """Append-only file of fingerprint hashes, read through a memory map.
+
+    Callers keep (offset, length) pairs, counted in hashes, in the database's
+    fingerprints table; view() returns a NumPy array backed directly by the map.
+    """
+
+    FILENAME = 'fingerprints.bin'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = None
+
+    @classmethod
+    def for_database(cls, db):
+        """Return the store kept next to the database file, or None for in-memory databases"""
+        if not db or db.db_path == ':memory:':
+            return None
+        return cls(os.path.join(os.path.dirname(db.db_path), cls.FILENAME))
+
+    def append(self, hashes):
+        """Write hashes at the end of the store and return their offset"""
+        data = np.ascontiguousarray(hashes, dtype='<u4').tobytes()
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                offset = f.tell() // ITEM_SIZE
+                f.write(data)
+        return offset
+
+    def view(self, offset, length):
+        """Return the hashes at offset as a read-only array without copying, or None"""
+        end = (offset + length) * ITEM_SIZE
+        with self._lock:
+            if self._map is None or len(self._map) < end:
+                self._remap()
+            if self._map is None or len(self._map) < end:
+                xbmc.log(f'SkipIntro: Fingerprint {offset}+{length} is past the end of the store', xbmc.LOGWARNING)
+                return None
+            return np.frombuffer(self._map, dtype='<u4', count=length, offset=offset * ITEM_SIZE)
+
+    def _remap(self):
+        # Arrays handed out earlier keep the previous map alive until they are dropped
+        try:
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            xbmc.log(f'SkipIntro: Could not open fingerprint store: {str(e)}', xbmc.LOGERROR)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                try:
+                    self._map.close()
+                except BufferError:
+                    pass  # Still referenced by an array; released with it
+                self._map = None
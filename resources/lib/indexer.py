@@ -0,0 +1,274 @@
+import json
+import threading
+import time
+import xbmc
+from resources.lib.probe import background_probes
+
+# NotifyAll message that asks the service to index the library
+INDEX_LIBRARY_MESSAGE = 'IndexLibrary'
+
+class LibraryIndexer:
+    """Finds intros for every episode in the video library ahead of playback.
+
+    Episodes are read a page at a time and probed on the background pool,
+    leaving the probe slots of the playing video free.
+    Each page is saved in one transaction together with the library offset
+    reached, so an interrupted run continues where it stopped. Seasons with
+    episodes still lacking times are then handed to the audio fingerprint
+    detector, one show at a time.
+    """
+
+    PAGE_SIZE = 50
+    SHOW_PAGE_SIZE = 20
+    # Pause before each episode while a video is playing
+    PLAYBACK_DELAY = 5.0
+
+    OFFSET_KEY = 'library_offset'
+    SHOW_OFFSET_KEY = 'fingerprint_offset'
+    COMPLETED_KEY = 'library_completed'
+
+    def __init__(self, db, chapter_manager, player=None, monitor=None, detector=None, refiner=None):
+        self.db = db
+        self.chapter_manager = chapter_manager
+        # Optional IntroDetector for episodes without intro chapters
+        self.detector = detector
+        # Optional BoundaryRefiner that snaps found intros to scene cuts
+        self.refiner = refiner
+        self.player = player or xbmc.Player()
+        self.monitor = monitor or xbmc.Monitor()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start indexing in the background; returns False if a run is already going"""
+        if not self.db:
+            return False
+        if self.running:
+            xbmc.log('SkipIntro: Library indexing already running', xbmc.LOGINFO)
+            return False
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='SkipIntroIndexer', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Stop after the current episode; a running probe is killed"""
+        self._stop.set()
+
+    def _stopping(self):
+        return self._stop.is_set() or self.monitor.abortRequested()
+
+    def _run(self):
+        try:
+            with background_probes():
+                self._index()
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error indexing library: {str(e)}', xbmc.LOGERROR)
+
+    def _index(self):
+        if not self._index_chapters():
+            return
+        if self.detector is not None and self.detector.available and not self._index_fingerprints():
+            return
+        self.db.set_index_state(self.COMPLETED_KEY, int(time.time()))
+
+    def _index_chapters(self):
+        """Look for intro chapters in every episode; returns False if stopped first"""
+        offset = int(self.db.get_index_state(self.OFFSET_KEY, 0))
+        xbmc.log(f'SkipIntro: Library indexing started at episode {offset}', xbmc.LOGINFO)
+        found = 0
+        while not self._stopping():
+            episodes, total = self._fetch_page(offset)
+            if episodes is None:
+                return False
+            if not episodes:
+                break
+
+            rows = self._index_page(episodes)
+            if self._stopping():
+                # Results for a partly indexed page are kept; the page is redone next time
+                self.db.save_episode_times_many(rows)
+                break
+            self.db.save_episode_times_many(rows)
+            found += len(rows)
+            offset += len(episodes)
+            self.db.set_index_state(self.OFFSET_KEY, offset)
+            xbmc.log(f'SkipIntro: Indexed {offset}/{total} episodes', xbmc.LOGINFO)
+            if offset >= total:
+                break
+
+        if self._stopping():
+            xbmc.log(f'SkipIntro: Library indexing paused at episode {offset}', xbmc.LOGINFO)
+            return False
+
+        self.db.set_index_state(self.OFFSET_KEY, None)
+        xbmc.log(f'SkipIntro: Chapter indexing finished, found intros in {found} episode(s)', xbmc.LOGINFO)
+        return True
+
+    def _index_fingerprints(self):
+        """Fingerprint seasons that still have episodes without times; returns False if stopped first"""
+        offset = int(self.db.get_index_state(self.SHOW_OFFSET_KEY, 0))
+        xbmc.log(f'SkipIntro: Fingerprint indexing started at show {offset}', xbmc.LOGINFO)
+        while not self._stopping():
+            shows, total = self._rpc_page('VideoLibrary.GetTVShows', 'tvshows', {
+                'properties': ['title', 'uniqueid'],
+                'sort': {'method': 'dateadded', 'order': 'ascending'}
+            }, offset, self.SHOW_PAGE_SIZE)
+            if shows is None:
+                return False
+            if not shows:
+                break
+
+            for show in shows:
+                if self._stopping():
+                    break
+                self._fingerprint_show(show)
+            if self._stopping():
+                break
+            offset += len(shows)
+            self.db.set_index_state(self.SHOW_OFFSET_KEY, offset)
+            if offset >= total:
+                break
+
+        if self._stopping():
+            xbmc.log(f'SkipIntro: Fingerprint indexing paused at show {offset}', xbmc.LOGINFO)
+            return False
+
+        self.db.set_index_state(self.SHOW_OFFSET_KEY, None)
+        xbmc.log('SkipIntro: Fingerprint indexing finished', xbmc.LOGINFO)
+        return True
+
+    def _fingerprint_show(self, show):
+        """Detect intros for a show's episodes that have no times yet"""
+        show_id = self.db.get_show(show['title'], show['tvshowid'], show.get('uniqueid'))
+        if not show_id:
+            return
+        episodes, _ = self._rpc_page('VideoLibrary.GetEpisodes', 'episodes', {
+            'tvshowid': show['tvshowid'],
+            'properties': ['season', 'episode', 'file']
+        }, 0, None)
+
+        seasons = {}
+        for episode in episodes or []:
+            if episode.get('file'):
+                seasons.setdefault(episode['season'], {})[episode['episode']] = episode['file']
+
+        for season, files in sorted(seasons.items()):
+            if self._stopping():
+                break
+            # A lone episode can only be matched against intros stored earlier
+            if len(files) < 2 and not self.db.get_fingerprints(show_id, season, 1):
+                continue
+            saved = self.db.get_season_times(show_id, season)
+            targets = {number for number in files if number not in saved}
+            if not targets:
+                continue
+            # Playback can already infer these episodes from the ones confirmed so far
+            if self.db.get_inferred_times(show_id, season):
+                xbmc.log(f'SkipIntro: Skipping {show["title"]} season {season}, times can be inferred', xbmc.LOGDEBUG)
+                continue
+
+            # Each episode waits for playback to stop before its audio is decoded
+            found = self.detector.detect_season(files, targets, self._stop, show_id, season,
+                                                wait=self._wait_while_playing)
+            if self.refiner is not None:
+                for number, times in found.items():
+                    if self._wait_while_playing():
+                        break
+                    found[number] = self.refiner.refine_times(files[number], times, self._stop)
+            rows = [(show_id, season, number, times) for number, times in found.items()]
+            self.db.save_episode_times_many(rows)
+            xbmc.log(f'SkipIntro: Fingerprinted {show["title"]} season {season}: '
+                     f'{len(rows)}/{len(targets)} intros found', xbmc.LOGINFO)
+
+    def _wait_while_playing(self):
+        """Hold off while a video plays; returns True if indexing should stop"""
+        while self.player.isPlayingVideo() and not self._stopping():
+            if self.monitor.waitForAbort(self.PLAYBACK_DELAY):
+                return True
+        return self._stopping()
+
+    def _fetch_page(self, offset):
+        """Return (episodes, total) starting at offset, or (None, 0) on error"""
+        return self._rpc_page('VideoLibrary.GetEpisodes', 'episodes', {
+            'properties': ['showtitle', 'season', 'episode', 'file', 'tvshowid'],
+            # Newly added episodes sort last, so saved offsets stay valid
+            'sort': {'method': 'dateadded', 'order': 'ascending'}
+        }, offset, self.PAGE_SIZE)
+
+    def _rpc_page(self, method, key, params, offset, size):
+        """Return (items, total) for one page of a library listing, or (None, 0) on error"""
+        params = dict(params)
+        if size is not None:
+            params['limits'] = {'start': offset, 'end': offset + size}
+        result = json.loads(xbmc.executeJSONRPC(json.dumps({
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params,
+            'id': 1
+        })))
+        if 'result' not in result:
+            xbmc.log(f'SkipIntro: {method} failed: {result.get("error")}', xbmc.LOGERROR)
+            return None, 0
+        items = result['result'].get(key, [])
+        return items, result['result'].get('limits', {}).get('total', len(items))
+
+    def _index_page(self, episodes):
+        """Probe a page of episodes and return rows for save_episode_times_many"""
+        rows = []
+        pending = []
+        probe = self.chapter_manager.probe
+        for episode in episodes:
+            if self._stopping():
+                break
+
+            # While a video plays, probe one episode at a time with a pause before each
+            playing = self.player.isPlayingVideo()
+            if playing and self.monitor.waitForAbort(self.PLAYBACK_DELAY):
+                break
+            limit = 1 if playing else probe.max_workers
+            while len(pending) >= limit:
+                rows.extend(self._collect(pending.pop(0)))
+            pending.append(probe.submit_background(self._index_episode, episode))
+
+        for future in pending:
+            rows.extend(self._collect(future))
+        return rows
+
+    def _collect(self, future):
+        try:
+            row = future.result()
+            return [row] if row else []
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error indexing episode: {str(e)}', xbmc.LOGERROR)
+            return []
+
+    def _index_episode(self, episode):
+        """Return (show_id, season, episode, times) for an episode with an intro chapter"""
+        title = episode.get('showtitle')
+        path = episode.get('file')
+        if not title or not path or self._stopping():
+            return None
+
+        show_id = self.db.get_show(title, episode.get('tvshowid'))
+        if not show_id:
+            return None
+        season = episode.get('season')
+        number = episode.get('episode')
+        if self.db.get_episode_times(show_id, season, number, episode.get('episodeid')):
+            return None
+
+        chapters = self.chapter_manager.get_chapters(path, need_names=True, cancel_event=self._stop)
+        times = self.chapter_manager.detect_intro_times(chapters)
+        if not times:
+            return None
+        if self.refiner is not None:
+            times = self.refiner.refine_times(path, times, self._stop)
+        times['episodeid'] = episode.get('episodeid')
+        xbmc.log(f'SkipIntro: Found intro chapter for {title} S{season:02d}E{number:02d}', xbmc.LOGDEBUG)
+        return show_id, season, number, times
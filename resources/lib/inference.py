@@ -0,0 +1,74 @@
+from collections import Counter
+from statistics import median
+
+# Episodes with confirmed times needed before a season is summarised
+MIN_EPISODES = 2
+# Summaries below this confidence are not used for unseen episodes
+MIN_CONFIDENCE = 0.5
+# Seconds an episode may be off the season median and still agree with it
+TOLERANCE = 5.0
+
+# Times we derived ourselves never count as confirmation
+INFERRED_SOURCE = 'inferred'
+
+def summarize_season(season_times):
+    """Summarise the confirmed intro times of a season's episodes.
+
+    season_times maps episode numbers to saved times. Returns a dict with the
+    median intro start/end, the outro start when most episodes have one, the
+    most common intro chapter numbers and a confidence between 0 and 1, or
+    None when too few episodes are confirmed.
+    """
+    confirmed = [times for times in season_times.values()
+                 if times.get('source') != INFERRED_SOURCE
+                 and times.get('intro_start_time') is not None
+                 and times.get('intro_end_time') is not None]
+    count = len(confirmed)
+    if count < MIN_EPISODES:
+        return None
+
+    start = median(times['intro_start_time'] for times in confirmed)
+    end = median(times['intro_end_time'] for times in confirmed)
+    if end <= start:
+        return None
+
+    outros = [times['outro_start_time'] for times in confirmed if times.get('outro_start_time') is not None]
+    outro = median(outros) if len(outros) * 2 > count else None
+
+    chapters = Counter((times.get('intro_start_chapter'), times.get('intro_end_chapter')) for times in confirmed
+                       if times.get('intro_start_chapter') and times.get('intro_end_chapter'))
+    start_chapter = end_chapter = None
+    if chapters:
+        (start_chapter, end_chapter), hits = chapters.most_common(1)[0]
+        if hits * 2 <= count:
+            start_chapter = end_chapter = None
+
+    # Share of episodes agreeing with the medians, discounted for small samples
+    agreeing = sum(1 for times in confirmed
+                   if abs(times['intro_start_time'] - start) <= TOLERANCE
+                   and abs(times['intro_end_time'] - end) <= TOLERANCE)
+    confidence = round(agreeing / count * count / (count + 1), 2)
+
+    return {
+        'episodes': count,
+        'intro_start_time': start,
+        'intro_end_time': end,
+        'outro_start_time': outro,
+        'intro_start_chapter': start_chapter,
+        'intro_end_chapter': end_chapter,
+        'confidence': confidence
+    }
+
+def inferred_times(summary, min_confidence=MIN_CONFIDENCE):
+    """Episode times for an unseen episode from a season summary, or None"""
+    if not summary or summary['confidence'] < min_confidence:
+        return None
+    return {
+        'intro_start_time': summary['intro_start_time'],
+        'intro_end_time': summary['intro_end_time'],
+        'outro_start_time': summary['outro_start_time'],
+        'intro_start_chapter': summary['intro_start_chapter'],
+        'intro_end_chapter': summary['intro_end_chapter'],
+        'source': INFERRED_SOURCE,
+        'confidence': summary['confidence']
+    }
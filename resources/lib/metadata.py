@@ -1,21 +1,36 @@
-import re
 import json
 import xbmc
-import xbmcvfs
+from resources.lib.cache import LRUCache
+from resources.lib.chapters import get_player_chapters
+from resources.lib.filename_parser import parse_filename
+
+# Everything detection needs about the playing item, fetched in one Player.GetItem call
+PLAYING_ITEM_PROPERTIES = ['showtitle', 'season', 'episode', 'file', 'tvshowid', 'uniqueid', 'runtime']
+
+# External ids of library shows by tvshowid; they only change on a rescrape
+_show_uniqueid_cache = LRUCache(64)
 
 class ShowMetadata:
-    def __init__(self):
-        self.show_regex = re.compile(r'^(.*?)(?:s(\d{1,2})e(\d{1,2})|(\d{1,2})x(\d{1,2}))', re.IGNORECASE)
-        
     def get_show_info(self):
-        """Extract show information from currently playing video"""
+        """Extract show information from currently playing video.
+
+        Returns the episode identity shared for the rest of the playback:
+        title, season, episode and file, plus tvshowid, episodeid, the
+        episode's uniqueid, the show's show_uniqueid and runtime when Kodi
+        knows them.
+        """
         try:
+            item = self.get_playing_item()
+            if item is not None:
+                return self._identity_from_item(item)
+
             # Try to get info from Kodi's video info labels first
             title = xbmc.getInfoLabel('VideoPlayer.TVShowTitle')
             season = xbmc.getInfoLabel('VideoPlayer.Season')
             episode = xbmc.getInfoLabel('VideoPlayer.Episode')
             
             xbmc.log(f'SkipIntro: Video info labels - Title: {title}, Season: {season}, Episode: {episode}', xbmc.LOGINFO)
+            filename = self._get_filename()
             
             # If we got all info from Kodi, return it
             if title and season and episode:
@@ -23,29 +38,101 @@ class ShowMetadata:
                     season = int(season)
                     episode = int(episode)
                     xbmc.log(f'SkipIntro: Found show info from Kodi labels - {title} S{season:02d}E{episode:02d}', xbmc.LOGINFO)
-                    return {'title': title, 'season': season, 'episode': episode}
+                    return self._with_aliases({'title': title, 'season': season, 'episode': episode, 'file': filename})
                 except ValueError as e:
                     xbmc.log(f'SkipIntro: Error converting season/episode numbers: {str(e)}', xbmc.LOGWARNING)
                     pass
             
             # Fall back to filename parsing
-            filename = self._get_filename()
             if not filename:
                 xbmc.log('SkipIntro: No filename available for parsing', xbmc.LOGWARNING)
                 return None
             
             xbmc.log(f'SkipIntro: Attempting to parse filename: {filename}', xbmc.LOGINFO)    
-            return self._parse_filename(filename)
+            info = self._parse_filename(filename)
+            if info:
+                info['file'] = filename
+            return info
             
         except Exception as e:
             xbmc.log(f'SkipIntro: Error getting show info: {str(e)}', xbmc.LOGERROR)
             return None
+
+    def get_playing_item(self):
+        """Return the playing item's PLAYING_ITEM_PROPERTIES, or None if Kodi cannot say"""
+        try:
+            result = json.loads(xbmc.executeJSONRPC(json.dumps({
+                'jsonrpc': '2.0',
+                'method': 'Player.GetItem',
+                'params': {'playerid': 1, 'properties': PLAYING_ITEM_PROPERTIES},
+                'id': 1
+            })))
+            item = result.get('result', {}).get('item')
+            if item and item.get('file'):
+                return item
+            xbmc.log(f'SkipIntro: Player.GetItem returned no item: {result.get("error")}', xbmc.LOGDEBUG)
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error getting playing item: {str(e)}', xbmc.LOGWARNING)
+        return None
+
+    def _identity_from_item(self, item):
+        """Build show info from a Player.GetItem result, parsing the filename for non-library files"""
+        filename = item['file']
+        title = item.get('showtitle')
+        season = item.get('season', -1)
+        episode = item.get('episode', -1)
+        if title and season >= 0 and episode > 0:
+            xbmc.log(f'SkipIntro: Found show info from the library - {title} S{season:02d}E{episode:02d}', xbmc.LOGINFO)
+            info = self._with_aliases({'title': title, 'season': season, 'episode': episode, 'file': filename})
+        else:
+            xbmc.log(f'SkipIntro: Attempting to parse filename: {filename}', xbmc.LOGINFO)
+            info = self._parse_filename(filename)
+            if not info:
+                return None
+            info['file'] = filename
+
+        # Library ids are -1 for files played outside the library
+        if item.get('tvshowid', -1) > 0:
+            info['tvshowid'] = item['tvshowid']
+            info['show_uniqueid'] = self.get_show_uniqueid(item['tvshowid'])
+        if item.get('type') == 'episode' and item.get('id', -1) > 0:
+            info['episodeid'] = item['id']
+        info['uniqueid'] = item.get('uniqueid') or {}
+        info['runtime'] = item.get('runtime') or None
+        return info
+
+    def get_show_uniqueid(self, tvshowid):
+        """Return a library show's external ids such as {'tvdb': '81189'}, or {}"""
+        cached = _show_uniqueid_cache.get(tvshowid)
+        if cached is not None:
+            return dict(cached)
+        try:
+            result = json.loads(xbmc.executeJSONRPC(json.dumps({
+                'jsonrpc': '2.0',
+                'method': 'VideoLibrary.GetTVShowDetails',
+                'params': {'tvshowid': tvshowid, 'properties': ['uniqueid']},
+                'id': 1
+            })))
+            uniqueid = result.get('result', {}).get('tvshowdetails', {}).get('uniqueid') or {}
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error getting show ids: {str(e)}', xbmc.LOGWARNING)
+            return {}
+        _show_uniqueid_cache.put(tvshowid, uniqueid)
+        return dict(uniqueid)
+
+    def _with_aliases(self, info):
+        """Remember the filename spelling so both resolve to the same show"""
+        parsed = self._parse_filename(info.get('file') or '')
+        if parsed and parsed['title'] and parsed['title'] != info['title']:
+            info['aliases'] = [parsed['title']]
+        return info
     
     def _get_filename(self):
         """Get filename of currently playing video"""
         try:
-            if xbmc.Player().isPlaying():
-                return xbmc.Player().getPlayingFile()
+            player = xbmc.Player()
+            if player.isPlaying():
+                return player.getPlayingFile()
         except:
             pass
         return None
@@ -53,64 +140,34 @@ class ShowMetadata:
     def _parse_filename(self, filename):
         """Parse show information from filename"""
         try:
-            # Get just the filename without path
-            filename = xbmcvfs.translatePath(filename)
-            basename = filename.split('/')[-1].split('\\')[-1]
-            xbmc.log(f'SkipIntro: Parsing basename: {basename}', xbmc.LOGINFO)
-            
-            # Try to match show pattern
-            match = self.show_regex.search(basename)
-            if match:
-                groups = match.groups()
-                title = groups[0].strip().replace('.', ' ')
-                
-                # Handle both SxxExx and xxXxx formats
-                season = int(groups[1] or groups[3])
-                episode = int(groups[2] or groups[4])
-                
-                result = {
-                    'title': title,
-                    'season': season,
-                    'episode': episode
-                }
-                xbmc.log(f'SkipIntro: Successfully parsed filename - {title} S{season:02d}E{episode:02d}', xbmc.LOGINFO)
+            result = parse_filename(filename)
+            if result:
+                if result['season'] is not None:
+                    marker = f'S{result["season"]:02d}E{result["episode"]:02d}'
+                else:
+                    marker = result.get('air_date') or f'#{result["absolute"]}'
+                xbmc.log(f'SkipIntro: Parsed filename ({result["pattern"]}) - {result["title"]} {marker}', xbmc.LOGINFO)
                 return result
+            xbmc.log(f'SkipIntro: No episode pattern in filename: {filename}', xbmc.LOGINFO)
         except Exception as e:
             xbmc.log(f'SkipIntro: Error parsing filename: {str(e)}', xbmc.LOGERROR)
         
         return None
         
     def get_chapters(self):
-        """Get chapter information for currently playing video using JSON-RPC"""
+        """Get chapter names and start times for the currently playing video from Kodi"""
         try:
             if not xbmc.Player().isPlayingVideo():
                 xbmc.log('SkipIntro: No video playing to get chapters from', xbmc.LOGWARNING)
                 return []
-                
-            # First, get media details including chapter count
-            json_cmd = {
-                'jsonrpc': '2.0',
-                'id': 1,
-                'method': 'Player.GetProperties',
-                'params': {
-                    'playerid': 1,  # 1 is for video player
-                    'properties': ['chapter', 'chaptercount', 'currenttime']
-                }
-            }
-            
-            result = json.loads(xbmc.executeJSONRPC(json.dumps(json_cmd)))
-            
-            if 'result' not in result:
-                xbmc.log('SkipIntro: No chapter information found in JSON-RPC response', xbmc.LOGWARNING)
-                return []
-                
-            chapter_count = result['result'].get('chaptercount', 0)
-            if chapter_count == 0:
+
+            chapters = get_player_chapters()
+            if not chapters:
                 xbmc.log('SkipIntro: Video has no chapters', xbmc.LOGWARNING)
                 return []
-                
-            xbmc.log(f'SkipIntro: Found {chapter_count} chapters', xbmc.LOGINFO)
-            return [{'number': i + 1} for i in range(chapter_count)]
+
+            xbmc.log(f'SkipIntro: Found {len(chapters)} chapters', xbmc.LOGINFO)
+            return chapters
             
         except Exception as e:
             xbmc.log(f'SkipIntro: Error getting chapters: {str(e)}', xbmc.LOGERROR)
@@ -0,0 +1,117 @@
+import json
+import threading
+import xbmc
+
+class NextEpisodePrefetcher:
+    """Warms the database and chapter caches for the episode after the current one"""
+
+    def __init__(self, db, chapter_manager):
+        self.db = db
+        self.chapter_manager = chapter_manager
+        self._thread = None
+        self._last_key = None
+
+    def prefetch(self, show_info):
+        """Start warming caches for the episode following show_info in the background"""
+        if not self.db or not show_info:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            xbmc.log('SkipIntro: Prefetch already running', xbmc.LOGDEBUG)
+            return
+
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(dict(show_info),),
+            name='SkipIntroPrefetch',
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, show_info):
+        try:
+            next_episode = self._next_episode(show_info)
+            if not next_episode:
+                return
+
+            key = (next_episode['title'], next_episode['season'], next_episode['episode'], next_episode['file'])
+            if key == self._last_key:
+                return
+            self._last_key = key
+
+            xbmc.log('SkipIntro: Prefetching {} S{:02d}E{:02d}'.format(*key[:3]), xbmc.LOGINFO)
+            # Only shows already known are warmed; peeking at a playlist must not create rows
+            show_id = self.db.find_show(next_episode['title'], next_episode.get('tvshowid'), next_episode.get('show_uniqueid'))
+            if not show_id:
+                return
+            config = self.db.get_show_config(show_id)
+            self.db.get_episode_times(show_id, next_episode['season'], next_episode['episode'],
+                                      next_episode.get('episodeid'))
+
+            # Chapters are only read at playback time for shows configured to use them
+            if next_episode.get('file') and config and config.get('use_chapters'):
+                chapters = self.chapter_manager.get_chapters(next_episode['file'])
+                xbmc.log(f'SkipIntro: Prefetched {len(chapters)} chapters for next episode', xbmc.LOGINFO)
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error prefetching next episode: {str(e)}', xbmc.LOGERROR)
+
+    def _next_episode(self, show_info):
+        """Return title/season/episode/file of the next episode, or None"""
+        # Prefer the next item queued in the video playlist
+        try:
+            playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+            position = playlist.getposition()
+            if 0 <= position < playlist.size() - 1:
+                item = playlist[position + 1]
+                tag = item.getVideoInfoTag()
+                season = tag.getSeason()
+                episode = tag.getEpisode()
+                if season >= 0 and episode > 0:
+                    return {
+                        'title': tag.getTVShowTitle() or show_info['title'],
+                        'season': season,
+                        'episode': episode,
+                        'file': item.getPath(),
+                        'episodeid': tag.getDbId() if tag.getDbId() > 0 else None
+                    }
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Could not read video playlist: {str(e)}', xbmc.LOGDEBUG)
+
+        # Otherwise assume the following episode of the same season
+        if show_info.get('season') is None or show_info.get('episode') is None:
+            return None
+        next_episode = {
+            'title': show_info['title'],
+            'season': show_info['season'],
+            'episode': show_info['episode'] + 1,
+            'file': None,
+            'tvshowid': show_info.get('tvshowid'),
+            'show_uniqueid': show_info.get('show_uniqueid')
+        }
+        library_item = self._library_episode(next_episode)
+        if library_item:
+            next_episode['file'] = library_item.get('file') or None
+            next_episode['episodeid'] = library_item.get('episodeid')
+        return next_episode
+
+    def _library_episode(self, episode):
+        """Return the library's file and episodeid for an episode of a library show, or None"""
+        if not episode.get('tvshowid'):
+            return None
+        try:
+            result = json.loads(xbmc.executeJSONRPC(json.dumps({
+                'jsonrpc': '2.0',
+                'method': 'VideoLibrary.GetEpisodes',
+                'params': {
+                    'tvshowid': episode['tvshowid'],
+                    'season': episode['season'],
+                    'properties': ['file'],
+                    'filter': {'field': 'episode', 'operator': 'is', 'value': str(episode['episode'])},
+                    'limits': {'start': 0, 'end': 1}
+                },
+                'id': 1
+            })))
+            episodes = result.get('result', {}).get('episodes') or []
+            return episodes[0] if episodes else None
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Could not look up next library episode: {str(e)}', xbmc.LOGDEBUG)
+            return None
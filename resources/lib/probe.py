@@ -0,0 +1,336 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Union
+import xbmc
+import xbmcvfs
+from resources.lib.settings import Settings
+
+Chapter = Dict[str, Union[str, int, float]]
+
+# Checked after PATH, since Kodi is often started with a minimal environment
+_EXTRA_SEARCH_PATHS = (
+    '/usr/local/bin',
+    '/opt/homebrew/bin',
+    '/usr/bin',
+    '/opt/local/bin',
+    '/storage/.kodi/addons/tools.ffmpeg-tools/bin',
+)
+
+def find_tool(name: str, configured: str = None) -> Optional[str]:
+    """Locate an executable: the configured path, then PATH, then common install locations"""
+    if configured:
+        if os.path.isdir(configured):
+            configured = os.path.join(configured, name)
+        if os.path.isfile(configured) and os.access(configured, os.X_OK):
+            return configured
+        xbmc.log(f'SkipIntro: Configured {name} path is not executable: {configured}', xbmc.LOGWARNING)
+
+    found = shutil.which(name)
+    if found:
+        return found
+    for directory in _EXTRA_SEARCH_PATHS:
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+# Marks threads whose probes are background work, such as library indexing
+_thread_state = threading.local()
+
+@contextmanager
+def background_probes():
+    """Treat probes made by the calling thread as background work until the block ends"""
+    previous = getattr(_thread_state, 'background', False)
+    _thread_state.background = True
+    try:
+        yield
+    finally:
+        _thread_state.background = previous
+
+def _mark_background():
+    _thread_state.background = True
+
+class ProbeRequest:
+    """Handle for work running on the probe pool that can be cancelled"""
+
+    def __init__(self):
+        self.future = None
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Stop the work; a running ffprobe/ffmpeg process is killed"""
+        self.cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def add_done_callback(self, fn, default=None):
+        """Call fn(result) on the worker thread once the work finishes, unless cancelled.
+
+        default is passed instead if the work raised.
+        """
+        def done(future):
+            if future.cancelled() or self.cancelled:
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                xbmc.log(f'SkipIntro: Background probe failed: {str(e)}', xbmc.LOGERROR)
+                result = default
+            fn(result)
+        self.future.add_done_callback(done)
+
+class ProbeBackend:
+    """Reads chapter metadata with ffprobe, or ffmpeg when ffprobe is missing.
+
+    At most max_workers probes run at once; extra callers wait for a slot.
+    Background work runs on its own pool and slots, so probes for the playing
+    video never queue behind it.
+    A probe given a cancel event kills its process as soon as the event is set.
+    """
+
+    # How often a running probe checks its cancel event
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, ffprobe_path=None, ffmpeg_path=None, timeout=10, max_workers=2):
+        self.ffprobe_path = ffprobe_path
+        self.ffmpeg_path = ffmpeg_path
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._background_slots = threading.BoundedSemaphore(max_workers)
+        # Pools keyed by whether they run background work
+        self._executors = {}
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        settings = Settings().settings
+        configured = settings.get('ffprobe_path')
+        ffprobe_path = find_tool('ffprobe', configured)
+        # A configured directory or ffprobe binary usually has ffmpeg next to it
+        ffmpeg_dir = configured if configured and os.path.isdir(configured) else os.path.dirname(ffprobe_path or '')
+        ffmpeg_path = find_tool('ffmpeg', ffmpeg_dir or None)
+        xbmc.log(f'SkipIntro: Probe tools - ffprobe: {ffprobe_path}, ffmpeg: {ffmpeg_path}', xbmc.LOGINFO)
+        return cls(ffprobe_path, ffmpeg_path, settings.get('probe_timeout', 10), settings.get('probe_workers', 2))
+
+    @property
+    def available(self):
+        return bool(self.ffprobe_path or self.ffmpeg_path)
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn on the probe worker pool and return a Future"""
+        return self._get_executor(False).submit(fn, *args, **kwargs)
+
+    def submit_background(self, fn, *args, **kwargs):
+        """Run fn on the background pool and return a Future; its probes never hold playback's slots"""
+        return self._get_executor(True).submit(fn, *args, **kwargs)
+
+    def _get_executor(self, background):
+        with self._executor_lock:
+            executor = self._executors.get(background)
+            if executor is None:
+                if background:
+                    executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='SkipIntroIndex',
+                                                  initializer=_mark_background)
+                else:
+                    executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='SkipIntroProbe')
+                self._executors[background] = executor
+            return executor
+
+    def _slot(self):
+        """The semaphore limiting probes of the calling thread's kind"""
+        return self._background_slots if getattr(_thread_state, 'background', False) else self._slots
+
+    def request(self, fn, *args) -> ProbeRequest:
+        """Run fn(*args, cancel_event=...) on the worker pool and return a cancellable request"""
+        request = ProbeRequest()
+        request.future = self.submit(fn, *args, cancel_event=request.cancel_event)
+        return request
+
+    def shutdown(self):
+        with self._executor_lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._executors.clear()
+
+    def probe_chapters(self, path: str, cancel_event: threading.Event = None) -> Optional[List[Chapter]]:
+        """Return the file's chapters, or None if it could not be probed or was cancelled"""
+        if not self.available:
+            xbmc.log('SkipIntro: Neither ffprobe nor ffmpeg found, cannot probe chapters', xbmc.LOGWARNING)
+            return None
+
+        local_path = xbmcvfs.translatePath(path) if path.startswith('special://') else path
+        with self._slot():
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            if self.ffprobe_path:
+                return self._ffprobe_chapters(local_path, cancel_event)
+            return self._ffmpeg_chapters(local_path, cancel_event)
+
+    def decode_audio(self, path: str, seconds: float, sample_rate: int,
+                     cancel_event: threading.Event = None) -> Optional[bytes]:
+        """Decode the first seconds of audio to mono signed 16-bit PCM, or None on failure"""
+        if not self.ffmpeg_path:
+            xbmc.log('SkipIntro: ffmpeg not found, cannot decode audio', xbmc.LOGWARNING)
+            return None
+
+        local_path = xbmcvfs.translatePath(path) if path.startswith('special://') else path
+        with self._slot():
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            # Decoding minutes of audio takes longer than reading a header
+            return self._run([
+                self.ffmpeg_path, '-v', 'error', '-nostdin',
+                '-t', str(seconds),
+                '-i', local_path,
+                '-vn', '-sn', '-dn',
+                '-ac', '1', '-ar', str(sample_rate),
+                '-f', 's16le', '-'
+            ], cancel_event, timeout=self.timeout + seconds * 0.2, binary=True)
+
+    def detect_boundaries(self, path: str, start: float, duration: float,
+                          cancel_event: threading.Event = None) -> Optional[str]:
+        """Run ffmpeg's silencedetect and blackdetect over a short window.
+
+        Returns ffmpeg's log, in which detected times are relative to start,
+        or None on failure.
+        """
+        if not self.ffmpeg_path:
+            xbmc.log('SkipIntro: ffmpeg not found, cannot detect boundaries', xbmc.LOGWARNING)
+            return None
+
+        local_path = xbmcvfs.translatePath(path) if path.startswith('special://') else path
+        with self._slot():
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            return self._run([
+                self.ffmpeg_path, '-hide_banner', '-nostats', '-nostdin', '-v', 'info',
+                '-ss', f'{start:.3f}', '-t', f'{duration:.3f}',
+                '-i', local_path,
+                '-af', 'silencedetect=noise=-40dB:duration=0.3',
+                # Frames are shrunk first; blackdetect only needs their brightness
+                '-vf', 'scale=160:-2,blackdetect=d=0.1:pix_th=0.10',
+                '-sn', '-dn', '-f', 'null', '-'
+            ], cancel_event, stderr_output=True)
+
+    def _run(self, cmd, cancel_event=None, timeout=None, binary=False, stderr_output=False):
+        name = os.path.basename(cmd[0])
+        timeout = timeout or self.timeout
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=not binary)
+        except OSError as e:
+            xbmc.log(f'SkipIntro: Error running {cmd[0]}: {str(e)}', xbmc.LOGERROR)
+            return None
+
+        deadline = time.monotonic() + timeout
+        with process:
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=self.POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_event is not None and cancel_event.is_set():
+                        xbmc.log(f'SkipIntro: {name} cancelled', xbmc.LOGINFO)
+                    elif time.monotonic() >= deadline:
+                        xbmc.log(f'SkipIntro: {name} timed out after {timeout:.0f}s', xbmc.LOGERROR)
+                    else:
+                        continue
+                    # Leaving the with block closes the pipes and reaps the process
+                    process.kill()
+                    return None
+
+        if process.returncode != 0:
+            if binary:
+                stderr = stderr.decode('utf-8', 'replace')
+            xbmc.log(f'SkipIntro: {name} error: {stderr.strip()}', xbmc.LOGERROR)
+            return None
+        return stderr if stderr_output else stdout
+
+    def _ffprobe_chapters(self, path, cancel_event=None):
+        # Chapters come from the container header; don't let ffprobe read past the first packet
+        output = self._run([
+            self.ffprobe_path, '-v', 'error',
+            '-read_intervals', '%+#1',
+            '-show_chapters',
+            '-of', 'json',
+            path
+        ], cancel_event)
+        if output is None:
+            return None
+        try:
+            entries = json.loads(output).get('chapters', [])
+        except ValueError as e:
+            xbmc.log(f'SkipIntro: Could not parse ffprobe output: {str(e)}', xbmc.LOGERROR)
+            return None
+
+        chapters = []
+        for number, entry in enumerate(entries, 1):
+            chapters.append({
+                'name': entry.get('tags', {}).get('title', f'Chapter {number}'),
+                'time': float(entry['start_time']),
+                'end_time': float(entry['end_time']),
+                'number': number
+            })
+        xbmc.log(f'SkipIntro: ffprobe found {len(chapters)} chapters', xbmc.LOGINFO)
+        return chapters
+
+    def _ffmpeg_chapters(self, path, cancel_event=None):
+        output = self._run([self.ffmpeg_path, '-v', 'error', '-i', path, '-f', 'ffmetadata', '-'], cancel_event)
+        if output is None:
+            return None
+        chapters = parse_ffmetadata(output)
+        xbmc.log(f'SkipIntro: ffmpeg found {len(chapters)} chapters', xbmc.LOGINFO)
+        return chapters
+
+def parse_ffmetadata(metadata: str) -> List[Chapter]:
+    """Parse the [CHAPTER] sections of ffmpeg's ffmetadata output"""
+    chapters = []
+    sections = metadata.split('[CHAPTER]')[1:]
+    for section in sections:
+        number = len(chapters) + 1
+        fields = {}
+        for line in section.splitlines():
+            if line.startswith('['):
+                break
+            key, sep, value = line.partition('=')
+            if sep:
+                fields[key] = value
+        if 'START' not in fields or 'END' not in fields:
+            continue
+        numerator, _, denominator = fields.get('TIMEBASE', '1/1000000000').partition('/')
+        timebase = int(numerator) / int(denominator or 1)
+        chapters.append({
+            'name': fields.get('title', f'Chapter {number}'),
+            'time': int(fields['START']) * timebase,
+            'end_time': int(fields['END']) * timebase,
+            'number': number
+        })
+    return chapters
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_probe_backend() -> ProbeBackend:
+    """Return the process-wide probe backend, discovering tools on first use"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = ProbeBackend.from_settings()
+        return _backend
+
+def shutdown_probe_backend():
+    """Stop the backend's workers, if this process created one"""
+    with _backend_lock:
+        backend = _backend
+    if backend is not None:
+        backend.shutdown()
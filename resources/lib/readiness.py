@@ -0,0 +1,108 @@
+import json
+import time
+import xbmc
+
+def wait_until(predicate, timeout, initial_delay=0.05, max_delay=0.5, monitor=None):
+    """Poll predicate with exponential backoff until it returns something truthy.
+
+    Returns the predicate's result, or None if the deadline passes or Kodi
+    is shutting down first.
+    """
+    monitor = monitor or xbmc.Monitor()
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        result = predicate()
+        if result:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if monitor.waitForAbort(min(delay, remaining)):
+            return None
+        delay = min(delay * 2, max_delay)
+
+class PlaybackReadiness:
+    """Waits for the data Kodi publishes shortly after a file starts playing"""
+
+    # Library items expose a show title almost immediately; plain files never do
+    TITLE_GRACE = 1.0
+    VIDEO_INFO_TIMEOUT = 3.0
+    CHAPTERS_TIMEOUT = 2.0
+    # A chapter count of 0 is only believed once it has held this long
+    CHAPTERS_SETTLE = 0.5
+
+    def __init__(self, player, monitor=None):
+        self.player = player
+        self.monitor = monitor or xbmc.Monitor()
+        self._playerid = None
+        self._chapter_count = None
+        self._chapter_count_since = None
+
+    def wait_for_video_info(self):
+        """Wait until the show title, or at least the playing file, is known.
+
+        Returns False only if playback stopped meanwhile; after the timeout
+        detection goes ahead with whatever Kodi has published by then.
+        """
+        start = time.monotonic()
+        ready = wait_until(lambda: self._stopped() or xbmc.getInfoLabel('VideoPlayer.TVShowTitle'),
+                           self.TITLE_GRACE, monitor=self.monitor)
+        if not ready:
+            remaining = self.VIDEO_INFO_TIMEOUT - (time.monotonic() - start)
+            ready = wait_until(lambda: self._stopped() or xbmc.getInfoLabel('Player.Filenameandpath'),
+                               remaining, monitor=self.monitor)
+        if ready:
+            xbmc.log(f'SkipIntro: Video info ready after {time.monotonic() - start:.2f}s', xbmc.LOGINFO)
+        else:
+            xbmc.log('SkipIntro: Video info not ready in time, detecting with what is known', xbmc.LOGWARNING)
+        return not self._stopped()
+
+    def wait_for_chapters(self):
+        """Wait until the player reports chapters, or that the file has none"""
+        start = time.monotonic()
+        self._chapter_count = self._chapter_count_since = None
+        ready = wait_until(lambda: self._stopped() or self._chapter_count_known(),
+                           self.CHAPTERS_TIMEOUT, monitor=self.monitor)
+        xbmc.log(f'SkipIntro: Chapter info ready after {time.monotonic() - start:.2f}s', xbmc.LOGINFO)
+        return bool(ready) and not self._stopped()
+
+    def _stopped(self):
+        return not self.player.isPlaying()
+
+    def _rpc(self, method, params):
+        try:
+            return json.loads(xbmc.executeJSONRPC(json.dumps({
+                'jsonrpc': '2.0',
+                'id': 1,
+                'method': method,
+                'params': params
+            }))).get('result')
+        except Exception:
+            return None
+
+    def _video_playerid(self):
+        """Return the id of the active video player, or None while there is none"""
+        if self._playerid is None:
+            for player in self._rpc('Player.GetActivePlayers', {}) or []:
+                if player.get('type') == 'video':
+                    self._playerid = player.get('playerid')
+                    break
+        return self._playerid
+
+    def _chapter_count_known(self):
+        """True once chapters are reported, or a count of 0 has held for CHAPTERS_SETTLE"""
+        playerid = self._video_playerid()
+        if playerid is None:
+            return False
+        result = self._rpc('Player.GetProperties', {'playerid': playerid, 'properties': ['chaptercount']}) or {}
+        count = result.get('chaptercount')
+        if count is None:
+            return False
+        if count > 0:
+            return True
+        # The demuxer reports 0 until it has read the chapters, so wait to see whether that changes
+        now = time.monotonic()
+        if count != self._chapter_count:
+            self._chapter_count, self._chapter_count_since = count, now
+        return now - self._chapter_count_since >= self.CHAPTERS_SETTLE
@@ -0,0 +1,102 @@
+import re
+import xbmc
+from resources.lib.probe import get_probe_backend
+
+_SILENCE_START = re.compile(r'silence_start:\s*(-?[\d.]+)')
+_SILENCE_END = re.compile(r'silence_end:\s*(-?[\d.]+)')
+_BLACK = re.compile(r'black_start:\s*(-?[\d.]+)\s+black_end:\s*(-?[\d.]+)')
+
+def parse_boundaries(log, duration):
+    """Return the silent and black (start, end, kind) gaps in an ffmpeg detect log.
+
+    A silence still running when the window ends is closed at duration.
+    """
+    gaps = []
+    silence_start = None
+    for line in log.splitlines():
+        match = _SILENCE_START.search(line)
+        if match:
+            silence_start = max(0.0, float(match.group(1)))
+            continue
+        match = _SILENCE_END.search(line)
+        if match and silence_start is not None:
+            gaps.append((silence_start, float(match.group(1)), 'silence'))
+            silence_start = None
+            continue
+        match = _BLACK.search(line)
+        if match:
+            gaps.append((float(match.group(1)), float(match.group(2)), 'black'))
+    if silence_start is not None:
+        gaps.append((silence_start, duration, 'silence'))
+    return sorted(gaps)
+
+def snap_to_cut(time, gaps, window):
+    """Move time to the end of the nearest gap, where the next shot starts.
+
+    Gaps where black frames and silence overlap are the surest cuts and win
+    over plain silence or black. Returns time unchanged if no gap is within
+    window seconds.
+    """
+    best = None
+    for start, end, kind in gaps:
+        if abs(end - time) > window:
+            continue
+        both = any(other_kind != kind and other_start < end and start < other_end
+                   for other_start, other_end, other_kind in gaps)
+        rank = (not both, abs(end - time))
+        if best is None or rank < best[0]:
+            best = (rank, end)
+    return round(best[1], 2) if best else time
+
+class BoundaryRefiner:
+    """Snaps approximate intro boundaries to the nearest scene cut"""
+
+    # Seconds searched on either side of a boundary
+    WINDOW = 3.0
+
+    def __init__(self, probe=None, window=WINDOW):
+        self._probe = probe
+        self.window = window
+
+    @property
+    def probe(self):
+        if self._probe is None:
+            self._probe = get_probe_backend()
+        return self._probe
+
+    @property
+    def available(self):
+        return bool(self.probe.ffmpeg_path)
+
+    def refine(self, path, time, cancel_event=None):
+        """Return time snapped to a cut within the window, or time itself"""
+        if not time or time <= 0:
+            return time
+        start = max(0.0, time - self.window)
+        duration = time + self.window - start
+        log = self.probe.detect_boundaries(path, start, duration, cancel_event)
+        if not log:
+            return time
+        gaps = [(gap_start + start, gap_end + start, kind)
+                for gap_start, gap_end, kind in parse_boundaries(log, duration)]
+        refined = snap_to_cut(time, gaps, self.window)
+        if refined != time:
+            xbmc.log(f'SkipIntro: Refined boundary {time} to {refined}', xbmc.LOGDEBUG)
+        return refined
+
+    def refine_markers(self, path, intro_start, intro_end, cancel_event=None):
+        """Refine an intro's start and end; either may be None"""
+        start = self.refine(path, intro_start, cancel_event) if intro_start is not None else None
+        end = self.refine(path, intro_end, cancel_event) if intro_end is not None else None
+        if start is not None and end is not None and start >= end:
+            return intro_start, intro_end
+        return start, end
+
+    def refine_times(self, path, times, cancel_event=None):
+        """Return a copy of episode times with the intro boundaries refined"""
+        if not self.available:
+            return times
+        refined = dict(times)
+        refined['intro_start_time'], refined['intro_end_time'] = self.refine_markers(
+            path, times.get('intro_start_time'), times.get('intro_end_time'), cancel_event)
+        return refined
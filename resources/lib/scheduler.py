@@ -0,0 +1,110 @@
+import threading
+import xbmc
+
+class MarkerScheduler:
+    """Calls back when playback reaches a target time.
+
+    Instead of polling the player, a timer is armed for the exact moment the
+    target is due at the current playback speed. Seeks, pauses and speed
+    changes re-arm it.
+    """
+
+    # Upper bound on a single wait so a missed player event cannot strand the timer
+    MAX_WAIT = 60.0
+    # Shortest re-arm after waking before the target, e.g. while buffering
+    MIN_RETRY = 0.02
+
+    def __init__(self, player, callback):
+        self.player = player
+        self.callback = callback
+        self._target = None
+        self._speed = 1.0
+        self._paused = False
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def arm(self, target):
+        """Fire the callback once playback reaches target seconds.
+
+        Armed while paused, the timer only starts when playback resumes.
+        """
+        with self._lock:
+            self._target = target
+        self.rearm()
+
+    def cancel(self):
+        """Forget the target and stop any pending timer"""
+        with self._lock:
+            self._target = None
+            self._cancel_timer()
+
+    def reset(self):
+        """Cancel and forget pause and speed, for a new file"""
+        with self._lock:
+            self._target = None
+            self._paused = False
+            self._speed = 1.0
+            self._cancel_timer()
+
+    def pause(self):
+        """Stop the timer but keep the target for when playback resumes"""
+        with self._lock:
+            self._paused = True
+            self._cancel_timer()
+
+    def resume(self):
+        with self._lock:
+            self._paused = False
+        self.rearm()
+
+    def set_speed(self, speed):
+        """Update the playback speed (1 = normal, 0 = paused, negative = rewinding)"""
+        with self._lock:
+            self._speed = float(speed)
+        self.rearm()
+
+    def rearm(self, current_time=None):
+        """Recompute the wait from the current playback position"""
+        with self._lock:
+            self._cancel_timer()
+            if self._target is None or self._paused or self._speed <= 0:
+                return
+            try:
+                if current_time is None:
+                    current_time = self.player.getTime()
+            except Exception as e:
+                xbmc.log(f'SkipIntro: Cannot arm marker timer: {str(e)}', xbmc.LOGDEBUG)
+                return
+
+            delay = (self._target - current_time) / self._speed
+            delay = max(self.MIN_RETRY, delay) if delay > 0 else 0.0
+            self._timer = threading.Timer(min(delay, self.MAX_WAIT), self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+            xbmc.log(f'SkipIntro: Marker timer armed for {self._target} in {delay:.2f}s', xbmc.LOGDEBUG)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _fire(self):
+        try:
+            current_time = self.player.getTime()
+        except Exception:
+            return
+
+        with self._lock:
+            self._timer = None
+            target = self._target
+            if target is None:
+                return
+            due = current_time >= target
+            if due:
+                self._target = None
+
+        if due:
+            self.callback(current_time)
+        else:
+            # Woken early by MAX_WAIT or clock drift
+            self.rearm(current_time)
@@ -14,6 +14,29 @@ class Settings:
             use_chapters = self.addon.getSettingBool('use_chapters')
             use_api = self.addon.getSettingBool('use_api')
             save_times = self.addon.getSettingBool('save_times')
+            auto_skip = self.addon.getSettingBool('auto_skip')
+            index_on_start = self.addon.getSettingBool('index_on_start')
+            fingerprint_intros = self.addon.getSettingBool('fingerprint_intros')
+            fingerprint_minutes = self.addon.getSetting('fingerprint_minutes')
+            fingerprint_minutes = int(fingerprint_minutes) if fingerprint_minutes else 5
+
+            # Get marker sync settings
+            sync_mode = self.addon.getSetting('sync_mode')
+            sync_port = self.addon.getSetting('sync_port')
+            sync_interval = self.addon.getSetting('sync_interval')
+            sync_mode = int(sync_mode) if sync_mode else 0
+            sync_port = int(sync_port) if sync_port else 8765
+            sync_interval = int(sync_interval) if sync_interval else 15
+            sync_url = self.addon.getSetting('sync_url').strip()
+            sync_token = self.addon.getSetting('sync_token')
+            
+            # Get chapter probe settings
+            ffprobe_path = self.addon.getSetting('ffprobe_path')
+            refine_boundaries = self.addon.getSettingBool('refine_boundaries')
+            probe_timeout = self.addon.getSetting('probe_timeout')
+            probe_workers = self.addon.getSetting('probe_workers')
+            probe_timeout = int(probe_timeout) if probe_timeout else 10
+            probe_workers = int(probe_workers) if probe_workers else 2
             
             # Get chapter settings
             intro_start_chapter = self.addon.getSetting('intro_start_chapter')
@@ -43,6 +66,13 @@ class Settings:
                 default_delay = 300
                 self.addon.setSetting('default_delay', '300')
                 
+            probe_timeout = min(max(probe_timeout, 2), 60)
+            probe_workers = min(max(probe_workers, 1), 4)
+            fingerprint_minutes = min(max(fingerprint_minutes, 2), 15)
+            sync_mode = sync_mode if sync_mode in (0, 1, 2) else 0
+            sync_port = min(max(sync_port, 1024), 65535)
+            sync_interval = min(max(sync_interval, 1), 120)
+                
             if skip_duration < 10:  # Min 10 seconds
                 skip_duration = 60
                 self.addon.setSetting('skip_duration', '60')
@@ -56,6 +86,19 @@ class Settings:
                 'use_chapters': use_chapters,
                 'use_api': use_api,
                 'save_times': save_times,
+                'auto_skip': auto_skip,
+                'index_on_start': index_on_start,
+                'fingerprint_intros': fingerprint_intros,
+                'fingerprint_minutes': fingerprint_minutes,
+                'sync_mode': sync_mode,
+                'sync_port': sync_port,
+                'sync_url': sync_url,
+                'sync_token': sync_token,
+                'sync_interval': sync_interval,
+                'ffprobe_path': ffprobe_path,
+                'refine_boundaries': refine_boundaries,
+                'probe_timeout': probe_timeout,
+                'probe_workers': probe_workers,
                 'intro_start_chapter': intro_start_chapter,
                 'intro_end_chapter': intro_end_chapter,
                 'outro_start_chapter': outro_start_chapter,
@@ -71,6 +114,19 @@ class Settings:
                 'use_chapters': True,
                 'use_api': False,
                 'save_times': True,
+                'auto_skip': False,
+                'index_on_start': False,
+                'fingerprint_intros': True,
+                'fingerprint_minutes': 5,
+                'sync_mode': 0,
+                'sync_port': 8765,
+                'sync_url': '',
+                'sync_token': '',
+                'sync_interval': 15,
+                'ffprobe_path': '',
+                'refine_boundaries': True,
+                'probe_timeout': 10,
+                'probe_workers': 2,
                 'intro_start_chapter': 0,
                 'intro_end_chapter': 1,
                 'outro_start_chapter': None,
@@ -0,0 +1,327 @@
+import hmac
+import io
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import xbmc
+from resources.lib.transfer import (
+    EPISODE_RECORD, SHOW_RECORD, import_records, iter_records, read_ndjson, write_ndjson
+)
+
+# Values of the sync_mode setting
+SYNC_OFF = 0
+SYNC_SERVER = 1
+SYNC_CLIENT = 2
+
+DEFAULT_PORT = 8765
+# Without a shared secret the server only answers this device
+LOOPBACK_HOST = '127.0.0.1'
+SYNC_PATH = '/markers'
+TOKEN_HEADER = 'X-SkipIntro-Token'
+# Last line of a pull, giving the revision the client continues from
+REVISION_RECORD = 'revision'
+NDJSON_TYPE = 'application/x-ndjson'
+MAX_PUSH_BYTES = 4 * 1024 * 1024
+# Clients split a push into requests of about this size, well under MAX_PUSH_BYTES
+PUSH_CHUNK_BYTES = 1024 * 1024
+
+class _SyncHandler(BaseHTTPRequestHandler):
+    """GET streams markers changed since ?since=N; POST upserts markers from the body"""
+
+    # Seconds a client may stall before its connection is dropped
+    timeout = 30
+
+    def log_message(self, format, *args):
+        xbmc.log(f'SkipIntro: Sync server: {format % args}', xbmc.LOGDEBUG)
+
+    def _route(self):
+        """Return the parsed query for a valid, authorised request, or None after replying"""
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != SYNC_PATH:
+            self.send_error(404)
+            return None
+        token = self.server.sync.token
+        if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, '').encode('utf-8'),
+                                             token.encode('utf-8')):
+            self.send_error(403)
+            return None
+        return urllib.parse.parse_qs(url.query)
+
+    def do_GET(self):
+        query = self._route()
+        if query is None:
+            return
+        try:
+            since = int(query.get('since', ['0'])[0])
+        except ValueError:
+            self.send_error(400, 'since must be a revision number')
+            return
+        db = self.server.sync.db
+        revision = db.get_revision()
+        if revision is None:
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', NDJSON_TYPE)
+        self.end_headers()
+        stream = io.TextIOWrapper(self.wfile, encoding='utf-8')
+        try:
+            # Rows changed while streaming carry a later revision and go out with the next pull
+            write_ndjson(stream, iter_records(db, since, revision))
+            write_ndjson(stream, [(REVISION_RECORD, {'revision': revision})])
+            stream.flush()
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error sending markers: {str(e)}', xbmc.LOGERROR)
+        finally:
+            stream.detach()
+
+    def do_POST(self):
+        if self._route() is None:
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.send_error(411)
+            return
+        if length > MAX_PUSH_BYTES:
+            self.send_error(413)
+            return
+
+        db = self.server.sync.db
+        try:
+            counts = import_records(db, read_ndjson(self._body_lines(length), self.client_address[0]),
+                                    keep_manual=True)
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error receiving markers: {str(e)}', xbmc.LOGERROR)
+            self.send_error(500)
+            return
+        xbmc.log(f'SkipIntro: Received {counts["episodes"]} episode(s) from {self.client_address[0]}', xbmc.LOGINFO)
+
+        body = json.dumps(dict(counts, revision=db.get_revision())).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body_lines(self, length):
+        """Yield the request body's lines as they arrive, so it is imported in batches"""
+        while length > 0:
+            line = self.rfile.readline(length)
+            if not line:
+                break
+            length -= len(line)
+            yield line.decode('utf-8', 'replace')
+
+class SyncServer:
+    """Shares this device's markers with SyncClients on other devices.
+
+    Requests are served one at a time on a single thread, so the database
+    is used through one connection however many clients there are. Without
+    a token the server only listens on the loopback interface, so other
+    devices cannot change markers unasked.
+    """
+
+    def __init__(self, db, port=DEFAULT_PORT, host=None, token=None):
+        self.db = db
+        self.token = token or None
+        if host is None:
+            host = '' if self.token else LOOPBACK_HOST
+        self.host = host
+        self._port = port
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def port(self):
+        """The port being served, which differs from the one asked for when that was 0"""
+        return self._httpd.server_address[1] if self._httpd else self._port
+
+    def start(self):
+        """Start serving in the background; returns False if the port cannot be opened"""
+        if not self.db or self._httpd is not None:
+            return False
+        try:
+            self._httpd = HTTPServer((self.host, self._port), _SyncHandler)
+        except OSError as e:
+            xbmc.log(f'SkipIntro: Could not start sync server on port {self._port}: {str(e)}', xbmc.LOGERROR)
+            return False
+        self._httpd.sync = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='SkipIntroSyncServer', daemon=True)
+        self._thread.start()
+        xbmc.log(f'SkipIntro: Sync server listening on port {self.port}', xbmc.LOGINFO)
+        if self.host == LOOPBACK_HOST and not self.token:
+            xbmc.log('SkipIntro: Sync server has no shared secret, only this device can reach it', xbmc.LOGWARNING)
+        return True
+
+    def stop(self):
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd = None
+        self._thread = None
+
+class SyncClient:
+    """Exchanges changed markers with a SyncServer.
+
+    A sync pulls the server's markers changed since the last pull, then
+    pushes local markers changed since the last push. Both high-water marks
+    are database revisions kept in index_state per server URL, and only move
+    once the server has answered completely, so a failed sync is simply
+    repeated. A pull leaves alone local changes not pushed yet, which win
+    over the server's. Pulled rows count as local changes and go straight
+    back with the push, where they still match the server and leave its
+    revision alone.
+    """
+
+    PUSH_KEY = 'sync_push'
+    PULL_KEY = 'sync_pull'
+
+    def __init__(self, db, url, token=None, interval=900, timeout=30, monitor=None):
+        if '://' not in url:
+            url = 'http://' + url
+        self.db = db
+        self.url = url.rstrip('/')
+        self.token = token or None
+        self.interval = interval
+        self.timeout = timeout
+        self.monitor = monitor or xbmc.Monitor()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _key(self, name):
+        return f'{name}:{self.url}'
+
+    def _request(self, path, data=None, content_type=None):
+        headers = {}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        if content_type:
+            headers['Content-Type'] = content_type
+        request = urllib.request.Request(self.url + path, data=data, headers=headers)
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def push(self):
+        """Send markers changed since the last push; returns the number of episodes sent, or None"""
+        revision = self.db.get_revision()
+        since = int(self.db.get_index_state(self._key(self.PUSH_KEY), 0))
+        if revision is None:
+            return None
+        if revision <= since:
+            return 0
+
+        sent = 0
+        try:
+            for body in self._push_bodies(iter_records(self.db, since, revision)):
+                with self._request(SYNC_PATH, body.encode('utf-8'), NDJSON_TYPE) as response:
+                    sent += json.loads(response.read().decode('utf-8')).get('episodes', 0)
+        except (OSError, ValueError) as e:
+            # Parts already sent are simply sent again next time
+            xbmc.log(f'SkipIntro: Error pushing markers to {self.url}: {str(e)}', xbmc.LOGWARNING)
+            return None
+        self.db.set_index_state(self._key(self.PUSH_KEY), revision)
+        return sent
+
+    @staticmethod
+    def _push_bodies(records):
+        """Yield NDJSON request bodies of about PUSH_CHUNK_BYTES.
+
+        Each body repeats the records of the shows its episodes belong to,
+        since the server matches episodes to shows within one request.
+        """
+        shows = {}
+        body = io.StringIO()
+        in_body = set()
+        for kind, record in records:
+            show = record.get('show')
+            if kind == SHOW_RECORD:
+                shows[show] = record
+                in_body.add(show)
+            elif kind == EPISODE_RECORD and show not in in_body and show in shows:
+                write_ndjson(body, [(SHOW_RECORD, shows[show])])
+                in_body.add(show)
+            write_ndjson(body, [(kind, record)])
+            if body.tell() >= PUSH_CHUNK_BYTES:
+                yield body.getvalue()
+                body = io.StringIO()
+                in_body = set()
+        if body.tell():
+            yield body.getvalue()
+
+    def pull(self):
+        """Fetch markers changed on the server since the last pull; returns the number of episodes, or None"""
+        since = int(self.db.get_index_state(self._key(self.PULL_KEY), 0))
+        pushed = int(self.db.get_index_state(self._key(self.PUSH_KEY), 0))
+        mark = {}
+
+        def records(lines):
+            for kind, record in read_ndjson(lines, self.url):
+                if kind == REVISION_RECORD:
+                    mark['revision'] = record.get('revision')
+                else:
+                    yield kind, record
+
+        try:
+            with self._request(f'{SYNC_PATH}?since={since}') as response:
+                counts = import_records(self.db, records(io.TextIOWrapper(response, encoding='utf-8')),
+                                        keep_manual=True, unsent_since=pushed)
+        except Exception as e:
+            xbmc.log(f'SkipIntro: Error pulling markers from {self.url}: {str(e)}', xbmc.LOGWARNING)
+            return None
+        if not isinstance(mark.get('revision'), int):
+            # The stream was cut short; what arrived is kept and asked for again next time
+            xbmc.log(f'SkipIntro: Incomplete marker pull from {self.url}', xbmc.LOGWARNING)
+            return None
+        self.db.set_index_state(self._key(self.PULL_KEY), mark['revision'])
+        return counts['episodes']
+
+    def sync(self):
+        """Pull then push; returns {'pushed': n, 'pulled': n}, or None if either failed"""
+        pulled = self.pull()
+        if pulled is None:
+            return None
+        pushed = self.push()
+        if pushed is None:
+            return None
+        xbmc.log(f'SkipIntro: Synced with {self.url}: sent {pushed}, received {pulled} episode(s)', xbmc.LOGINFO)
+        return {'pushed': pushed, 'pulled': pulled}
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Sync every interval seconds in the background"""
+        if not self.db or self.running:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='SkipIntroSyncClient', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set() and not self.monitor.abortRequested():
+            try:
+                self.sync()
+            except Exception as e:
+                xbmc.log(f'SkipIntro: Error syncing markers: {str(e)}', xbmc.LOGERROR)
+            if self._stop.wait(self.interval):
+                break
+
+def create_sync(db, settings):
+    """Return a SyncServer or SyncClient for the sync settings, or None when sync is off"""
+    mode = settings.get('sync_mode')
+    token = settings.get('sync_token')
+    if mode == SYNC_SERVER:
+        return SyncServer(db, settings.get('sync_port') or DEFAULT_PORT, token=token)
+    if mode == SYNC_CLIENT and settings.get('sync_url'):
+        return SyncClient(db, settings['sync_url'], token=token, interval=settings.get('sync_interval', 15) * 60)
+    return None
@@ -0,0 +1,72 @@
+from bisect import bisect_right, insort
+from collections import namedtuple
+
+# Segment types in the order they usually appear in an episode
+SEGMENT_KINDS = ('recap', 'intro', 'preview', 'outro', 'credits')
+
+SEGMENT_LABELS = {
+    'recap': 'Skip Recap',
+    'intro': 'Skip Intro',
+    'preview': 'Skip Preview',
+    'outro': 'Skip Outro',
+    'credits': 'Skip Credits'
+}
+
+class Segment(namedtuple('Segment', ['start', 'end', 'kind'])):
+    """A skippable [start, end) range of an episode, in seconds"""
+    __slots__ = ()
+
+    @property
+    def label(self):
+        return SEGMENT_LABELS.get(self.kind, 'Skip')
+
+    def contains(self, time):
+        return self.start <= time < self.end
+
+class Timeline:
+    """Ordered, non-overlapping segments of one episode with O(log n) lookups"""
+
+    def __init__(self, segments=()):
+        self._segments = []
+        self._starts = []
+        for segment in segments:
+            self.add(segment)
+
+    def add(self, segment):
+        """Insert a segment, ignoring empty ranges and ones overlapping an existing segment"""
+        if segment.end is None or segment.end <= segment.start:
+            return False
+        index = bisect_right(self._starts, segment.start)
+        if index > 0 and self._segments[index - 1].end > segment.start:
+            return False
+        if index < len(self._segments) and self._segments[index].start < segment.end:
+            return False
+        insort(self._segments, segment)
+        self._starts.insert(index, segment.start)
+        return True
+
+    def segment_at(self, time):
+        """Return the segment containing time, or None"""
+        index = bisect_right(self._starts, time) - 1
+        if index >= 0 and self._segments[index].contains(time):
+            return self._segments[index]
+        return None
+
+    def next_segment(self, time):
+        """Return the first segment starting after time, or None"""
+        index = bisect_right(self._starts, time)
+        if index < len(self._segments):
+            return self._segments[index]
+        return None
+
+    def kinds(self):
+        return {segment.kind for segment in self._segments}
+
+    def __iter__(self):
+        return iter(self._segments)
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __repr__(self):
+        return f'Timeline({self._segments!r})'
@@ -0,0 +1,387 @@
+import csv
+import json
+import os
+import struct
+import xbmc
+
+# Bulk export and import of saved markers: shows with their config, external
+# ids and aliases, then every episode's times. Records are streamed in all
+# three formats, so a database with tens of thousands of episodes is never
+# held in memory at once.
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+FORMAT_BINARY = 'binary'
+
+_EXTENSIONS = {
+    '.ndjson': FORMAT_NDJSON,
+    '.jsonl': FORMAT_NDJSON,
+    '.json': FORMAT_NDJSON,
+    '.csv': FORMAT_CSV,
+    '.bin': FORMAT_BINARY,
+}
+
+SHOW_RECORD = 'show'
+EPISODE_RECORD = 'episode'
+
+# Marker columns shared by shows_config and episodes; shows have no source
+MARKER_COLUMNS = (
+    'intro_start_chapter',
+    'intro_end_chapter',
+    'intro_start_time',
+    'intro_end_time',
+    'outro_start_time',
+    'source'
+)
+
+# One CSV column set covers both record types; unused cells stay empty
+CSV_FIELDS = ('type', 'show', 'title', 'ids', 'aliases', 'use_chapters', 'season', 'episode') + MARKER_COLUMNS
+_INT_FIELDS = ('show', 'season', 'episode', 'intro_start_chapter', 'intro_end_chapter')
+_FLOAT_FIELDS = ('intro_start_time', 'intro_end_time', 'outro_start_time')
+
+# Episodes saved per transaction while importing
+IMPORT_BATCH_SIZE = 2000
+
+# Binary layout: MAGIC, then one tagged record after another. Integers are
+# little-endian int32 with NULL_INT for missing values and times are whole
+# milliseconds, so an episode takes 34 bytes instead of ~130 as NDJSON.
+MAGIC = b'SKIPMRK1'
+NULL_INT = -2 ** 31
+_SHOW_TAG = b'S'
+_EPISODE_TAG = b'E'
+_STRING = struct.Struct('<H')
+# show key, use_chapters (-1 unknown), two chapters, three times
+_SHOW_CONFIG = struct.Struct('<ib5i')
+# show key, season, episode, two chapters, three times, source code
+_EPISODE = struct.Struct('<8iB')
+# Sources written as one byte; anything else follows the record as a string
+SOURCES = (None, 'chapters', 'fingerprint', 'manual', 'inferred', 'default')
+_OTHER_SOURCE = 255
+
+def detect_format(path):
+    """Return the format implied by a file extension, or None if it is unknown"""
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+def export_markers(db, path, fmt=None):
+    """Write every show and episode marker to path.
+
+    Returns {'shows': n, 'episodes': n}, or None on error. The file is
+    written next to path first and only replaces it once complete.
+    """
+    fmt = fmt or detect_format(path)
+    writer = _WRITERS.get(fmt)
+    if writer is None:
+        xbmc.log(f'SkipIntro: Unknown marker export format for {path}', xbmc.LOGERROR)
+        return None
+
+    counts = {'shows': 0, 'episodes': 0}
+    def records():
+        for kind, record in iter_records(db):
+            counts['shows' if kind == SHOW_RECORD else 'episodes'] += 1
+            yield kind, record
+
+    partial = path + '.part'
+    try:
+        writer(partial, records())
+        os.replace(partial, path)
+    except Exception as e:
+        xbmc.log(f'SkipIntro: Error exporting markers: {str(e)}', xbmc.LOGERROR)
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        return None
+    xbmc.log(f'SkipIntro: Exported {counts["shows"]} show(s) and {counts["episodes"]} episode(s) '
+             f'to {path}', xbmc.LOGINFO)
+    return counts
+
+def import_markers(db, path, fmt=None):
+    """Upsert the shows and episodes of an export into db.
+
+    Shows are matched by external id, title or alias, so the show keys in
+    the file need not exist here. Episodes are saved IMPORT_BATCH_SIZE at a
+    time through executemany. Returns {'shows': n, 'episodes': n,
+    'skipped': n}, or None if the file could not be read.
+    """
+    fmt = fmt or detect_format(path)
+    reader = _READERS.get(fmt)
+    if reader is None:
+        xbmc.log(f'SkipIntro: Unknown marker import format for {path}', xbmc.LOGERROR)
+        return None
+
+    try:
+        counts = import_records(db, reader(path))
+    except Exception as e:
+        xbmc.log(f'SkipIntro: Error importing markers: {str(e)}', xbmc.LOGERROR)
+        return None
+    xbmc.log(f'SkipIntro: Imported {counts["shows"]} show(s) and {counts["episodes"]} episode(s) '
+             f'from {path}, skipped {counts["skipped"]} record(s)', xbmc.LOGINFO)
+    return counts
+
+def iter_records(db, since=None, until=None):
+    """Yield (kind, record) for every show and then every episode.
+
+    With since, only markers changed after that database revision, up to
+    and including until, and the shows they belong to.
+    """
+    for record in db.iter_show_records(since, until):
+        yield SHOW_RECORD, record
+    for record in db.iter_episode_records(since, until):
+        yield EPISODE_RECORD, record
+
+def import_records(db, records, keep_manual=False, unsent_since=None):
+    """Upsert (kind, record) pairs as yielded by iter_records or a reader.
+
+    Episode records must follow the record of their show. keep_manual and
+    unsent_since are passed on to save_episode_times_many. Returns
+    {'shows': n, 'episodes': n, 'skipped': n}; raises if a batch cannot be
+    saved, leaving earlier batches in place.
+    """
+    counts = {'shows': 0, 'episodes': 0, 'skipped': 0}
+    show_ids = {}
+    shows = []
+    configs = []
+    episodes = []
+
+    def resolve_shows():
+        if not shows:
+            return
+        ids = db.import_shows([(record['title'], record.get('ids'), record.get('aliases')) for record in shows])
+        if ids is None:
+            raise IOError('could not save imported shows')
+        for record, show_id in zip(shows, ids):
+            show_ids[record.get('show')] = show_id
+            if record.get('use_chapters') is not None:
+                configs.append((show_id, record))
+        counts['shows'] += len(shows)
+        shows.clear()
+
+    def flush():
+        resolve_shows()
+        saved = db.save_show_config_many(configs, unsent_since) and \
+            db.save_episode_times_many(episodes, keep_manual, unsent_since)
+        if not saved:
+            raise IOError('could not save imported markers')
+        counts['episodes'] += len(episodes)
+        configs.clear()
+        episodes.clear()
+
+    for kind, record in records:
+        if kind == SHOW_RECORD:
+            if not record.get('title'):
+                counts['skipped'] += 1
+                continue
+            shows.append(record)
+            if len(shows) >= IMPORT_BATCH_SIZE:
+                resolve_shows()
+        elif kind == EPISODE_RECORD:
+            # Shows read so far are saved together before their episodes need them
+            resolve_shows()
+            show_id = show_ids.get(record.get('show'))
+            if show_id is None or not isinstance(record.get('season'), int) or \
+                    not isinstance(record.get('episode'), int):
+                counts['skipped'] += 1
+                continue
+            episodes.append((show_id, record['season'], record['episode'], record))
+            if len(episodes) >= IMPORT_BATCH_SIZE:
+                flush()
+        else:
+            counts['skipped'] += 1
+    flush()
+    return counts
+
+# NDJSON: one object per line with a "type" key; missing values are left out
+
+def write_ndjson(stream, records):
+    """Write (kind, record) pairs to a text stream, one JSON object per line"""
+    for kind, record in records:
+        line = {'type': kind}
+        line.update((key, value) for key, value in record.items() if value not in (None, [], {}))
+        stream.write(json.dumps(line, ensure_ascii=False, separators=(',', ':')))
+        stream.write('\n')
+
+def read_ndjson(lines, name='stream'):
+    """Yield (kind, record) pairs from lines of NDJSON; unreadable lines yield (None, None)"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            xbmc.log(f'SkipIntro: Skipping unreadable line {number} of {name}', xbmc.LOGWARNING)
+            yield None, None
+            continue
+        if not isinstance(record, dict):
+            yield None, None
+            continue
+        yield record.pop('type', None), record
+
+def _write_ndjson(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        write_ndjson(f, records)
+
+def _read_ndjson(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from read_ndjson(f, path)
+
+# CSV: a header row of CSV_FIELDS; ids as provider=value pairs and aliases
+# separated by "|", both of which normalised titles and ids never contain
+
+def _encode_ids(ids):
+    return ';'.join(f'{provider}={value}' for provider, value in sorted((ids or {}).items()))
+
+def _decode_ids(text):
+    return dict(pair.split('=', 1) for pair in (text or '').split(';') if '=' in pair)
+
+def _encode_aliases(aliases):
+    return '|'.join(aliases or ())
+
+def _decode_aliases(text):
+    return [alias for alias in (text or '').split('|') if alias]
+
+def _write_csv(path, records):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for kind, record in records:
+            row = dict(record, type=kind)
+            if kind == SHOW_RECORD:
+                row['ids'] = _encode_ids(record.get('ids'))
+                row['aliases'] = _encode_aliases(record.get('aliases'))
+                if row.get('use_chapters') is not None:
+                    row['use_chapters'] = int(row['use_chapters'])
+            writer.writerow(['' if row.get(field) is None else row[field] for field in CSV_FIELDS])
+
+def _read_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                record = {key: value for key, value in row.items() if key and value != ''}
+                for field in _INT_FIELDS:
+                    if field in record:
+                        record[field] = int(record[field])
+                for field in _FLOAT_FIELDS:
+                    if field in record:
+                        record[field] = float(record[field])
+            except ValueError:
+                yield None, None
+                continue
+            kind = record.pop('type', None)
+            if kind == SHOW_RECORD:
+                record['ids'] = _decode_ids(record.get('ids'))
+                record['aliases'] = _decode_aliases(record.get('aliases'))
+                if 'use_chapters' in record:
+                    record['use_chapters'] = record['use_chapters'] not in ('0', 'false', 'False')
+            yield kind, record
+
+# Binary: see MAGIC above
+
+def _to_int(value):
+    return NULL_INT if value is None else int(value)
+
+def _from_int(value):
+    return None if value == NULL_INT else value
+
+def _to_ms(seconds):
+    return NULL_INT if seconds is None else int(round(seconds * 1000))
+
+def _from_ms(value):
+    return None if value == NULL_INT else value / 1000.0
+
+def _write_string(f, text):
+    data = (text or '').encode('utf-8')
+    f.write(_STRING.pack(len(data)))
+    f.write(data)
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError('truncated marker file')
+    return data
+
+def _read_string(f):
+    size, = _STRING.unpack(_read_exact(f, _STRING.size))
+    return _read_exact(f, size).decode('utf-8')
+
+def _write_binary(path, records):
+    source_codes = {source: code for code, source in enumerate(SOURCES)}
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        for kind, record in records:
+            if kind == SHOW_RECORD:
+                use_chapters = record.get('use_chapters')
+                f.write(_SHOW_TAG)
+                f.write(_SHOW_CONFIG.pack(
+                    _to_int(record['show']),
+                    -1 if use_chapters is None else int(use_chapters),
+                    _to_int(record.get('intro_start_chapter')),
+                    _to_int(record.get('intro_end_chapter')),
+                    _to_ms(record.get('intro_start_time')),
+                    _to_ms(record.get('intro_end_time')),
+                    _to_ms(record.get('outro_start_time'))))
+                _write_string(f, record.get('title'))
+                _write_string(f, _encode_ids(record.get('ids')))
+                _write_string(f, _encode_aliases(record.get('aliases')))
+            else:
+                source = record.get('source')
+                code = source_codes.get(source, _OTHER_SOURCE)
+                f.write(_EPISODE_TAG)
+                f.write(_EPISODE.pack(
+                    _to_int(record['show']),
+                    _to_int(record.get('season')),
+                    _to_int(record.get('episode')),
+                    _to_int(record.get('intro_start_chapter')),
+                    _to_int(record.get('intro_end_chapter')),
+                    _to_ms(record.get('intro_start_time')),
+                    _to_ms(record.get('intro_end_time')),
+                    _to_ms(record.get('outro_start_time')),
+                    code))
+                if code == _OTHER_SOURCE:
+                    _write_string(f, source)
+
+def _read_binary(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('not a marker file')
+        while True:
+            tag = f.read(1)
+            if not tag:
+                return
+            if tag == _SHOW_TAG:
+                show, use_chapters, *values = _SHOW_CONFIG.unpack(_read_exact(f, _SHOW_CONFIG.size))
+                record = {
+                    'show': show,
+                    'use_chapters': None if use_chapters < 0 else bool(use_chapters),
+                    'intro_start_chapter': _from_int(values[0]),
+                    'intro_end_chapter': _from_int(values[1]),
+                    'intro_start_time': _from_ms(values[2]),
+                    'intro_end_time': _from_ms(values[3]),
+                    'outro_start_time': _from_ms(values[4]),
+                    'title': _read_string(f),
+                    'ids': _decode_ids(_read_string(f)),
+                    'aliases': _decode_aliases(_read_string(f))
+                }
+                yield SHOW_RECORD, record
+            elif tag == _EPISODE_TAG:
+                values = _EPISODE.unpack(_read_exact(f, _EPISODE.size))
+                code = values[8]
+                if code == _OTHER_SOURCE:
+                    source = _read_string(f)
+                else:
+                    source = SOURCES[code] if code < len(SOURCES) else None
+                yield EPISODE_RECORD, {
+                    'show': values[0],
+                    'season': _from_int(values[1]),
+                    'episode': _from_int(values[2]),
+                    'intro_start_chapter': _from_int(values[3]),
+                    'intro_end_chapter': _from_int(values[4]),
+                    'intro_start_time': _from_ms(values[5]),
+                    'intro_end_time': _from_ms(values[6]),
+                    'outro_start_time': _from_ms(values[7]),
+                    'source': source
+                }
+            else:
+                raise ValueError(f'unknown record tag {tag!r}')
+
+_WRITERS = {FORMAT_NDJSON: _write_ndjson, FORMAT_CSV: _write_csv, FORMAT_BINARY: _write_binary}
+_READERS = {FORMAT_NDJSON: _read_ndjson, FORMAT_CSV: _read_csv, FORMAT_BINARY: _read_binary}
@@ -6,6 +6,7 @@ import os
 class SkipIntroDialog(xbmcgui.WindowXMLDialog):
     def __init__(self, *args, **kwargs):
         self.callback = kwargs.get('callback')
+        self.label = kwargs.get('label')
         super(SkipIntroDialog, self).__init__(*args)
 
     def onInit(self):
@@ -13,6 +14,8 @@ class SkipIntroDialog(xbmcgui.WindowXMLDialog):
         try:
             self.button = self.getControl(1)
             xbmc.log('SkipIntro: Got button control', xbmc.LOGINFO)
+            if self.label:
+                self.button.setLabel(self.label)
             self.setFocus(self.button)
             xbmc.log('SkipIntro: Button focused', xbmc.LOGINFO)
         except Exception as e:
@@ -42,7 +45,11 @@ class PlayerUI:
 
     def prompt_skip_intro(self, callback):
         """Show skip intro button and execute callback if user clicks it"""
-        xbmc.log('SkipIntro: Showing skip intro button', xbmc.LOGINFO)
+        return self.prompt_skip(callback, 'Skip Intro')
+
+    def prompt_skip(self, callback, label):
+        """Show a skip button with the given label and execute callback if user clicks it"""
+        xbmc.log(f'SkipIntro: Showing {label} button', xbmc.LOGINFO)
         try:
             if not self.prompt_shown and self._dialog is None:
                 addon = xbmcaddon.Addon()
@@ -57,7 +64,8 @@ class PlayerUI:
                     addon_path,
                     'default',
                     '720p',
-                    callback=callback
+                    callback=callback,
+                    label=label
                 )
                 xbmc.log('SkipIntro: Dialog instance created', xbmc.LOGINFO)
                 
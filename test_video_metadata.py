@@ -7,7 +7,8 @@ from unittest.mock import MagicMock, patch
 class MockXBMC:
     LOGDEBUG = 0
     LOGINFO = 1
-    LOGERROR = 2
+    LOGWARNING = 2
+    LOGERROR = 3
     
     @staticmethod
     def log(msg, level):
@@ -38,6 +39,10 @@ class MockXBMC:
             pass
 
 class MockXBMCGUI:
+    class WindowXMLDialog:
+        def __init__(self, *args, **kwargs):
+            pass
+
     class Dialog:
         def yesno(self, heading, message):
             return True
@@ -91,18 +96,391 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNotNone(show_id)
         
         # Add episode times
-        success = self.db.save_episode_times(
-            show_id, 1, 2, 30, 90, 2700, 2760, 'test'
-        )
+        success = self.db.save_episode_times(show_id, 1, 2, {
+            'intro_start_time': 30,
+            'intro_end_time': 90,
+            'outro_start_time': 2700,
+            'source': 'test'
+        })
         self.assertTrue(success)
         
         # Get episode times
         times = self.db.get_episode_times(show_id, 1, 2)
         self.assertIsNotNone(times)
-        self.assertEqual(times[0], 30)  # intro_start
-        self.assertEqual(times[1], 90)  # intro_end
-        self.assertEqual(times[2], 2700)  # outro_start
-        self.assertEqual(times[3], 2760)  # outro_end
+        self.assertEqual(times['intro_start_time'], 30)
+        self.assertEqual(times['intro_end_time'], 90)
+        self.assertEqual(times['outro_start_time'], 2700)
+        self.assertEqual(times['source'], 'test')
+
+    def test_season_times(self):
+        """Test bulk episode writes and season reads"""
+        show_id = self.db.get_show('Test Show')
+        rows = [(show_id, 1, episode, {'intro_start_time': 10, 'intro_end_time': 70 + episode})
+                for episode in range(1, 4)]
+        self.assertTrue(self.db.save_episode_times_many(rows))
+
+        # Saving again updates the existing rows
+        self.assertTrue(self.db.save_episode_times(show_id, 1, 2, {'intro_start_time': 5, 'intro_end_time': 65}))
+
+        season = self.db.get_season_times(show_id, 1)
+        self.assertEqual(sorted(season), [1, 2, 3])
+        self.assertEqual(season[2]['intro_end_time'], 65)
+        self.assertEqual(season[3]['intro_end_time'], 73)
+        self.assertIsNone(self.db.get_episode_times(show_id, 2, 1))
+
+    def test_library_ids(self):
+        """Test show and episode lookups by Kodi and external ids"""
+        show_id = self.db.get_show('Test Show', tvshowid=7, uniqueid={'tvdb': '81189'})
+
+        # A renamed show is still found by its ids, and the new title becomes an alias
+        self.assertEqual(self.db.get_show('Renamed Show', tvshowid=7), show_id)
+        self.assertEqual(self.db.get_show('Localised Title', uniqueid={'tvdb': '81189'}), show_id)
+        self.assertEqual(self.db.get_show('Renamed Show'), show_id)
+
+        # A reused tvshowid with different external ids belongs to a new show
+        other_id = self.db.get_show('Other Show', tvshowid=7, uniqueid={'tvdb': '12345'})
+        self.assertNotEqual(other_id, show_id)
+
+        # find_show never creates rows, so an unknown show stays unknown
+        self.assertEqual(self.db.find_show('Localised Title'), show_id)
+        for _ in range(2):
+            self.assertIsNone(self.db.find_show('Unknown Show'))
+
+        self.db.save_episode_times(show_id, 1, 2, {'intro_start_time': 30, 'intro_end_time': 90, 'episodeid': 42})
+        times = self.db.get_episode_times(show_id, 0, 5, episodeid=42)
+        self.assertEqual(times['intro_end_time'], 90)
+
+    def test_season_inference(self):
+        """Test inferring times for unseen episodes from confirmed ones"""
+        show_id = self.db.get_show('Test Show')
+        self.assertTrue(self.db.save_episode_times(show_id, 1, 1, {'intro_start_time': 30, 'intro_end_time': 90}))
+        self.assertIsNone(self.db.get_inferred_times(show_id, 1))
+
+        self.db.save_episode_times_many([
+            (show_id, 1, 2, {'intro_start_time': 32, 'intro_end_time': 92}),
+            (show_id, 1, 3, {'intro_start_time': 31, 'intro_end_time': 91}),
+        ])
+        times = self.db.get_inferred_times(show_id, 1)
+        self.assertEqual(times['intro_start_time'], 31)
+        self.assertEqual(times['intro_end_time'], 91)
+        self.assertEqual(times['source'], 'inferred')
+
+        # Episodes that disagree lower the confidence below use
+        self.db.save_episode_times_many([
+            (show_id, 1, 4, {'intro_start_time': 300, 'intro_end_time': 360}),
+            (show_id, 1, 5, {'intro_start_time': 400, 'intro_end_time': 460}),
+            (show_id, 1, 6, {'intro_start_time': 500, 'intro_end_time': 560}),
+        ])
+        self.assertLess(self.db.get_season_summary(show_id, 1)['confidence'], 0.5)
+        self.assertIsNone(self.db.get_inferred_times(show_id, 1))
+
+    def test_index_state(self):
+        """Test library indexer progress storage"""
+        self.assertEqual(self.db.get_index_state('library_offset', 0), 0)
+        self.assertTrue(self.db.set_index_state('library_offset', 150))
+        self.assertEqual(int(self.db.get_index_state('library_offset')), 150)
+        self.assertTrue(self.db.set_index_state('library_offset', None))
+        self.assertIsNone(self.db.get_index_state('library_offset'))
+
+    def test_cache_invalidation(self):
+        """Test that writes replace cached lookups, including cached misses"""
+        from resources.lib.database import ShowDatabase
+        show_id = self.db.get_show('Test Show')
+        self.assertIsNone(self.db.get_episode_times(show_id, 1, 1))
+        self.db.save_episode_times(show_id, 1, 1, {'intro_start_time': 30, 'intro_end_time': 90})
+        self.assertEqual(self.db.get_episode_times(show_id, 1, 1)['intro_end_time'], 90)
+
+        self.assertIsNone(self.db.get_show_config(show_id)['intro_end_time'])
+        self.db.set_manual_show_times(show_id, 5, 65)
+        self.assertEqual(self.db.get_show_config(show_id)['intro_end_time'], 65)
+
+        self.assertEqual(self.db.get_segments(show_id, 1, 1), [])
+        self.db.save_segments(show_id, 1, 1, [{'kind': 'recap', 'start_time': 0, 'end_time': 30}])
+        self.assertEqual([segment['kind'] for segment in self.db.get_segments(show_id, 1, 1)], ['recap'])
+
+        self.assertIsNone(self.db.get_inferred_times(show_id, 1))
+        self.db.save_episode_times_many([(show_id, 1, episode, {'intro_start_time': 30, 'intro_end_time': 90})
+                                         for episode in (2, 3)])
+        self.assertEqual(self.db.get_inferred_times(show_id, 1)['intro_end_time'], 90)
+
+        # Another process writing the same file is only seen once the cache is dropped
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'shows.db')
+            service, script = ShowDatabase(path), ShowDatabase(path)
+            show_id = service.get_show('Test Show')
+            self.assertIsNone(service.get_episode_times(show_id, 1, 1))
+            script.save_episode_times(show_id, 1, 1, {'intro_start_time': 30, 'intro_end_time': 90})
+            self.assertIsNone(service.get_episode_times(show_id, 1, 1))
+            service.invalidate_cache(show_id)
+            self.assertEqual(service.get_episode_times(show_id, 1, 1)['intro_end_time'], 90)
+            service.close()
+            script.close()
+
+    def test_schema_migration(self):
+        """Test upgrading an unversioned database and merging shows whose titles match"""
+        import sqlite3
+        from resources.lib.database import ShowDatabase
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'shows.db')
+            conn = sqlite3.connect(path)
+            conn.executescript('''
+                CREATE TABLE shows (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+                                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+                CREATE TABLE shows_config (show_id INTEGER PRIMARY KEY, use_chapters BOOLEAN DEFAULT 0,
+                                           intro_start_chapter INTEGER, intro_end_chapter INTEGER,
+                                           intro_start_time REAL, intro_end_time REAL, outro_start_time REAL,
+                                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+                CREATE TABLE episodes (id INTEGER PRIMARY KEY AUTOINCREMENT, show_id INTEGER, season INTEGER,
+                                       episode INTEGER, intro_start_time REAL, intro_end_time REAL,
+                                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                       UNIQUE(show_id, season, episode));
+                INSERT INTO shows (id, title) VALUES (1, 'The Office'), (2, 'the.office'), (3, 'Other Show');
+                INSERT INTO shows_config (show_id, use_chapters, intro_start_chapter, intro_end_chapter)
+                    VALUES (1, 0, NULL, NULL), (2, 1, 2, 3);
+                INSERT INTO episodes (show_id, season, episode, intro_start_time, intro_end_time)
+                    VALUES (1, 1, 1, 30, 90), (2, 1, 1, 0, 10), (2, 1, 2, 31, 91);
+            ''')
+            conn.commit()
+            conn.close()
+
+            db = ShowDatabase(path)
+            conn = sqlite3.connect(path)
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], ShowDatabase.SCHEMA_VERSION)
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM shows').fetchone()[0], 2)
+            conn.close()
+
+            # The duplicate's config survives because the oldest row had none; its clashing episode does not
+            self.assertEqual(db.get_show('THE OFFICE'), 1)
+            self.assertEqual(db.get_show_config(1)['intro_start_chapter'], 2)
+            self.assertEqual(db.get_episode_times(1, 1, 1)['intro_end_time'], 90)
+            self.assertEqual(db.get_episode_times(1, 1, 2)['intro_end_time'], 91)
+
+            # Aliases resolve to their show but never take over another show's title
+            self.assertTrue(db.add_show_alias(1, 'The Office (US)'))
+            self.assertEqual(db.get_show('the office us'), 1)
+            self.assertFalse(db.add_show_alias(1, 'Other Show'))
+            self.assertEqual(db.get_show('Other Show'), 3)
+
+            # Rows from before syncing count as the first revision; a new show's empty config has none
+            self.assertEqual(db.get_revision(), 1)
+            self.assertEqual(len(list(db.iter_episode_records(since=0))), 2)
+            new_id = db.get_show('New Show')
+            records = {record['show']: record for record in db.iter_show_records()}
+            self.assertIs(records[1]['use_chapters'], True)
+            self.assertIsNone(records[new_id]['use_chapters'])
+            db.close()
+
+    def test_marker_transfer(self):
+        """Test exporting markers and importing them into another database"""
+        from resources.lib.database import ShowDatabase
+        from resources.lib.transfer import export_markers, import_markers
+        show_id = self.db.get_show('Test Show', uniqueid={'tvdb': '81189'})
+        self.db.add_show_alias(show_id, 'Test Show US')
+        self.db.set_manual_show_times(show_id, 5, 65)
+        self.db.save_episode_times_many([
+            (show_id, 1, 1, {'intro_start_time': 30, 'intro_end_time': 90.25, 'source': 'chapters'}),
+            (show_id, 1, 2, {'intro_start_chapter': 2, 'intro_end_chapter': 3, 'source': 'custom'}),
+        ])
+
+        with tempfile.TemporaryDirectory() as directory:
+            for extension in ('.ndjson', '.csv', '.bin'):
+                path = os.path.join(directory, 'markers' + extension)
+                self.assertEqual(export_markers(self.db, path), {'shows': 1, 'episodes': 2})
+
+                target = ShowDatabase(':memory:')
+                # The show already exists here under another title; its external id matches it
+                target_id = target.get_show('Test Show (2001)', uniqueid={'tvdb': '81189'})
+                self.assertEqual(import_markers(target, path), {'shows': 1, 'episodes': 2, 'skipped': 0})
+                self.assertEqual(target.get_show('Test Show US'), target_id)
+                self.assertEqual(target.get_show_config(target_id)['intro_end_time'], 65)
+                self.assertEqual(target.get_episode_times(target_id, 1, 1)['intro_end_time'], 90.25)
+                self.assertEqual(target.get_episode_times(target_id, 1, 2)['source'], 'custom')
+
+                # Importing again updates the same rows
+                import_markers(target, path)
+                self.assertEqual(len(list(target.iter_episode_records())), 2)
+                target.close()
+
+    def test_marker_sync(self):
+        """Test exchanging changed markers through a sync server on localhost"""
+        from resources.lib.database import ShowDatabase
+        from resources.lib import sync
+        from resources.lib.sync import SyncServer, SyncClient
+        with tempfile.TemporaryDirectory() as directory:
+            # Server threads get their own connection, which needs a file rather than :memory:
+            hub, first, second = (ShowDatabase(os.path.join(directory, name)) for name in ('hub.db', 'a.db', 'b.db'))
+            # Without a shared secret only this device can reach the server
+            self.assertEqual(SyncServer(hub).host, '127.0.0.1')
+            server = SyncServer(hub, port=0, host='127.0.0.1', token='secret')
+            self.assertTrue(server.start())
+            try:
+                url = f'127.0.0.1:{server.port}'
+                self.assertIsNone(SyncClient(first, url, token='wrong').sync())
+                first_client = SyncClient(first, url, token='secret')
+                second_client = SyncClient(second, url, token='secret')
+
+                first_id = first.get_show('Test Show')
+                first.save_episode_times(first_id, 1, 1, {'intro_start_time': 30, 'intro_end_time': 90, 'source': 'chapters'})
+                first_client.sync()
+                self.assertEqual(second_client.sync()['pulled'], 1)
+                second_id = second.get_show('Test Show')
+                self.assertEqual(second.get_episode_times(second_id, 1, 1)['intro_end_time'], 90)
+
+                # Manual times survive detected ones synced from another device
+                second.save_episode_times(second_id, 1, 2, {'intro_start_time': 5, 'intro_end_time': 50, 'source': 'manual'})
+                first.save_episode_times(first_id, 1, 2, {'intro_start_time': 9, 'intro_end_time': 99, 'source': 'chapters'})
+                second_client.sync()
+                first_client.sync()
+                self.assertEqual(first.get_episode_times(first_id, 1, 2)['source'], 'manual')
+
+                # A push split into one request per record still brings each episode's show along
+                first.save_episode_times_many([(first_id, 2, number, {'intro_end_time': 80, 'source': 'chapters'})
+                                               for number in range(1, 4)])
+                with patch.object(sync, 'PUSH_CHUNK_BYTES', 1):
+                    self.assertIsNotNone(first_client.sync())
+                second_client.sync()
+                self.assertEqual(len(second.get_season_times(second_id, 2)), 3)
+
+                # A cleared config reaches the other device; a new show's empty one is never sent as cleared
+                first.set_manual_show_times(first_id, 10, 70)
+                first_client.sync()
+                second_client.sync()
+                self.assertEqual(second.get_show_config(second_id)['intro_end_time'], 70)
+                first.save_show_config(first_id, {'use_chapters': False})
+                first_client.sync()
+                second_client.sync()
+                self.assertIsNone(second.get_show_config(second_id)['intro_end_time'])
+                second.get_show('New Show')
+                records = {record['title']: record for record in second.iter_show_records()}
+                self.assertIs(records['Test Show']['use_chapters'], False)
+                self.assertIsNone(records['New Show']['use_chapters'])
+
+                # Pulled rows go back once without changing the server, after which nothing moves
+                second_client.sync()
+                revision = hub.get_revision()
+                first_client.sync()
+                self.assertEqual(hub.get_revision(), revision)
+                self.assertEqual(first_client.sync(), {'pushed': 0, 'pulled': 0})
+                self.assertEqual(second_client.sync()['pulled'], 0)
+            finally:
+                server.stop()
+                for db in (hub, first, second):
+                    db.close()
+
+class TestTimeline(unittest.TestCase):
+    def test_segment_lookup(self):
+        """Test segment lookup by playback time"""
+        from resources.lib.timeline import Segment, Timeline
+        timeline = Timeline([
+            Segment(60, 120, 'intro'),
+            Segment(0, 30, 'recap'),
+            Segment(100, 110, 'preview'),  # overlaps the intro, ignored
+            Segment(2500, 2700, 'credits')
+        ])
+        self.assertEqual(len(timeline), 3)
+        self.assertEqual(timeline.segment_at(10).kind, 'recap')
+        self.assertEqual(timeline.segment_at(60).kind, 'intro')
+        self.assertIsNone(timeline.segment_at(120))
+        self.assertEqual(timeline.next_segment(30).kind, 'intro')
+        self.assertIsNone(timeline.next_segment(2600))
+
+    def test_marker_scheduler(self):
+        """Test arming the marker timer across pauses, resumes and speed changes"""
+        import threading
+        from resources.lib.scheduler import MarkerScheduler
+        player = MagicMock()
+        player.getTime.return_value = 10.0
+        fired = threading.Event()
+        scheduler = MarkerScheduler(player, lambda current_time: fired.set())
+        try:
+            scheduler.arm(20)
+            self.assertAlmostEqual(scheduler._timer.interval, 10)
+            scheduler.set_speed(2)
+            self.assertAlmostEqual(scheduler._timer.interval, 5)
+
+            # A target armed during a pause waits for the resume
+            scheduler.pause()
+            self.assertIsNone(scheduler._timer)
+            scheduler.arm(30)
+            self.assertIsNone(scheduler._timer)
+            scheduler.resume()
+            self.assertAlmostEqual(scheduler._timer.interval, 10)
+
+            # Rewinding never reaches a target ahead
+            scheduler.set_speed(-2)
+            self.assertIsNone(scheduler._timer)
+
+            # A new file starts unpaused at normal speed, and a target already passed fires at once
+            scheduler.pause()
+            scheduler.reset()
+            scheduler.arm(5)
+            self.assertTrue(fired.wait(1))
+        finally:
+            scheduler.cancel()
+
+class TestChapterReader(unittest.TestCase):
+    @staticmethod
+    def element(element_id, body):
+        """Encode an EBML element with an 8-byte size field"""
+        return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + \
+            b'\x01' + len(body).to_bytes(7, 'big') + body
+
+    def chapter_atom(self, start, name):
+        return self.element(0xB6, self.element(0x91, int(start * 1e9).to_bytes(8, 'big')) +
+                            self.element(0x80, self.element(0x85, name.encode())))
+
+    def test_matroska_chapters(self):
+        """Test reading chapters located through the Matroska SeekHead"""
+        import io
+        import struct
+        from resources.lib.chapter_reader import parse_chapters
+
+        chapters = self.element(0x1043A770, self.element(0x45B9,
+            self.chapter_atom(0, 'Prologue') + self.chapter_atom(95.5, 'Opening') + self.chapter_atom(185, 'Part A')))
+        cluster = self.element(0x1F43B675, bytes(4096))
+        seek_head = lambda position: self.element(0x114D9B74, self.element(0x4DBB,
+            self.element(0x53AB, (0x1043A770).to_bytes(4, 'big')) + self.element(0x53AC, position.to_bytes(4, 'big'))))
+        segment = seek_head(len(seek_head(0)) + len(cluster)) + cluster + chapters
+        data = self.element(0x1A45DFA3, b'') + self.element(0x18538067, segment)
+
+        stream = io.BytesIO(data)
+        stream.size = lambda: len(data)
+        result = parse_chapters(stream)
+        self.assertEqual([c['name'] for c in result], ['Prologue', 'Opening', 'Part A'])
+        self.assertEqual(result[1]['time'], 95.5)
+        self.assertEqual(result[1]['end_time'], 185)
+        self.assertEqual(result[2]['number'], 3)
+
+        # A SeekHead that only indexes Info, with Chapters stored before the first Cluster
+        info = self.element(0x1549A966, self.element(0x4489, struct.pack('>d', 1500000.0)))
+        seek_head = lambda position: self.element(0x114D9B74, self.element(0x4DBB,
+            self.element(0x53AB, (0x1549A966).to_bytes(4, 'big')) + self.element(0x53AC, position.to_bytes(4, 'big'))))
+        seek_head = seek_head(len(seek_head(0)))
+        data = self.element(0x1A45DFA3, b'') + self.element(0x18538067, seek_head + info + chapters + cluster)
+        result = parse_chapters(io.BytesIO(data))
+        self.assertEqual(result[2]['end_time'], 1500)
+
+        # No Chapters before the media data is left to ffprobe rather than cached as empty
+        data = self.element(0x1A45DFA3, b'') + self.element(0x18538067, seek_head + info + cluster)
+        self.assertIsNone(parse_chapters(io.BytesIO(data)))
+
+    def test_unsupported_format(self):
+        """Test that unknown formats are left to ffmpeg"""
+        import io
+        from resources.lib.chapter_reader import parse_chapters
+        self.assertIsNone(parse_chapters(io.BytesIO(b'RIFF' + bytes(20))))
+
+    def test_resolve_chapter_times(self):
+        """Test turning chapter numbers into episode times"""
+        from resources.lib.chapters import ChapterManager
+        manager = ChapterManager()
+        chapters = [{'number': i + 1, 'name': '', 'time': float(i * 60)} for i in range(4)]
+
+        times = manager.resolve_chapter_times(chapters, 2, 3, 4)
+        self.assertEqual((times['intro_start_time'], times['intro_end_time'], times['outro_start_time']),
+                         (60.0, 120.0, 180.0))
+        self.assertIsNone(manager.resolve_chapter_times(chapters, 2, 6))
+        self.assertIsNone(manager.resolve_chapter_times(chapters, 3, 2))
 
 class TestMetadata(unittest.TestCase):
     def setUp(self):
@@ -139,6 +517,129 @@ class TestMetadata(unittest.TestCase):
             self.assertEqual(info['season'], 1)
             self.assertEqual(info['episode'], 2)
 
+    def test_show_detection_player_item(self):
+        """Test show detection from a single Player.GetItem call"""
+        import json
+        item = {'type': 'episode', 'id': 42, 'file': '/tv/Test.Show.S01E03.mkv', 'showtitle': 'Test Show',
+                'season': 1, 'episode': 3, 'tvshowid': 7, 'uniqueid': {'tvdb': '123'}, 'runtime': 1500}
+        responses = {
+            'Player.GetItem': {'item': item},
+            'VideoLibrary.GetTVShowDetails': {'tvshowdetails': {'uniqueid': {'tvdb': '81189'}}}
+        }
+        rpc = MagicMock(side_effect=lambda request: json.dumps({'result': responses[json.loads(request)['method']]}))
+        with patch('xbmc.executeJSONRPC', rpc, create=True):
+            info = self.metadata.get_show_info()
+        methods = [json.loads(call.args[0])['method'] for call in rpc.call_args_list]
+        self.assertEqual(methods.count('Player.GetItem'), 1)
+        self.assertEqual((info['title'], info['season'], info['episode']), ('Test Show', 1, 3))
+        self.assertEqual((info['file'], info['tvshowid'], info['episodeid']), (item['file'], 7, 42))
+        self.assertEqual(info['show_uniqueid'], {'tvdb': '81189'})
+
+    def test_filename_patterns(self):
+        """Test the filename pattern table"""
+        from resources.lib.filename_parser import parse_many
+        results = parse_many([
+            'Show.S01E01E02.720p.mkv',
+            'Daily.Show.S2024E05.mkv',
+            'Daily.Show.2024.03.15.Guest.mkv',
+            '[Group] Anime Title - 1071 (1080p) [ABCD1234].mkv',
+            'Show.1x02.Title.S03E05.mkv',
+            'Movie.1920x1080.mkv'
+        ])
+        parsed = [(r['title'], r['season'], r['episode']) if r else None for r in results.values()]
+        self.assertEqual(parsed, [
+            ('Show', 1, 1),
+            ('Daily Show', 2024, 5),
+            ('Daily Show', None, None),
+            ('Anime Title', None, None),
+            ('Show 1x02 Title', 3, 5),
+            None
+        ])
+        self.assertEqual(results['Show.S01E01E02.720p.mkv']['episodes'], [1, 2])
+        self.assertEqual(results['Daily.Show.2024.03.15.Guest.mkv']['air_date'], '2024-03-15')
+        self.assertEqual(results['[Group] Anime Title - 1071 (1080p) [ABCD1234].mkv']['absolute'], 1071)
+
+        # SxxEyy names skip the pattern table: 100k paths take about 0.6 s here,
+        # so 20k staying under a second leaves room for slow machines
+        import time
+        paths = [f'/tv/Show/Season 1/Show.Name.S01E{episode % 100:02d}.{episode}.1080p.mkv' for episode in range(20000)]
+        start = time.perf_counter()
+        results = parse_many(paths)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(results[paths[-1]]['episode'], 99)
+
+class TestFingerprint(unittest.TestCase):
+    def test_common_segment(self):
+        """Test finding an intro shared by two episodes"""
+        from resources.lib import fingerprint
+        if fingerprint.np is None:
+            self.skipTest('NumPy not installed')
+        np = fingerprint.np
+        rng = np.random.default_rng(1)
+        noise = lambda seconds: rng.normal(0, 3000, int(seconds * fingerprint.SAMPLE_RATE))
+        theme = noise(40)
+
+        def episode(before, after):
+            samples = np.concatenate([noise(before), theme, noise(after)])
+            return np.clip(samples, -32768, 32767).astype('<i2').tobytes()
+
+        first = fingerprint.compute_fingerprint(episode(20, 60))
+        second = fingerprint.compute_fingerprint(episode(55, 30))
+        start_a, end_a, start_b, end_b = fingerprint.find_common_segment(first, second)
+        self.assertAlmostEqual(start_a, 20, delta=1)
+        self.assertAlmostEqual(end_a, 60, delta=1)
+        self.assertAlmostEqual(start_b, 55, delta=1)
+        self.assertAlmostEqual(end_b, 95, delta=1)
+
+        unrelated = fingerprint.compute_fingerprint(np.clip(noise(120), -32768, 32767).astype('<i2').tobytes())
+        self.assertIsNone(fingerprint.find_common_segment(first, unrelated))
+
+    def test_fingerprint_store(self):
+        """Test storing intro fingerprints and reading them back through the map"""
+        from resources.lib.database import ShowDatabase
+        from resources.lib.fingerprint_store import FingerprintStore, np
+        if np is None:
+            self.skipTest('NumPy not installed')
+        with tempfile.TemporaryDirectory() as directory:
+            db = ShowDatabase(os.path.join(directory, 'shows.db'))
+            store = FingerprintStore.for_database(db)
+            show_id = db.get_show('Test Show')
+
+            first = np.arange(100, dtype=np.uint32)
+            second = np.arange(1000, 1050, dtype=np.uint32)
+            db.save_fingerprint(show_id, 1, 1, store.append(first), len(first))
+            db.save_fingerprint(show_id, 2, 1, store.append(second), len(second))
+
+            entries = db.get_fingerprints(show_id, 2)
+            self.assertEqual([entry['season'] for entry in entries], [2, 1])
+            hashes = store.view(entries[0]['offset'], entries[0]['length'])
+            self.assertTrue(np.array_equal(hashes, second))
+            self.assertFalse(hashes.flags['OWNDATA'])
+            self.assertIsNone(store.view(150, 10))
+
+            del hashes
+            store.close()
+            db.close()
+
+class TestBoundaryRefiner(unittest.TestCase):
+    def test_snap_to_cut(self):
+        """Test snapping a boundary to detected black frames and silence"""
+        from resources.lib.refine import parse_boundaries, snap_to_cut
+        log = '\n'.join([
+            '[silencedetect @ 0x1] silence_start: 1.2',
+            '[silencedetect @ 0x1] silence_end: 2.05 | silence_duration: 0.85',
+            '[blackdetect @ 0x2] black_start:1.5 black_end:2.1 black_duration:0.6',
+            '[blackdetect @ 0x2] black_start:4.0 black_end:4.3 black_duration:0.3',
+            '[silencedetect @ 0x1] silence_start: 5.5',
+        ])
+        gaps = parse_boundaries(log, 6.0)
+        self.assertEqual(gaps[-1], (5.5, 6.0, 'silence'))
+
+        # Black frames that coincide with silence beat a closer black-only gap
+        self.assertEqual(snap_to_cut(3.5, gaps, 3.0), 2.1)
+        self.assertEqual(snap_to_cut(3.5, gaps[2:3], 3.0), 4.3)
+        self.assertEqual(snap_to_cut(30.0, gaps, 3.0), 30.0)
+
 class TestSkipIntro(unittest.TestCase):
     def setUp(self):
         self.player = default.SkipIntroPlayer()
@@ -198,6 +699,96 @@ class TestSkipIntro(unittest.TestCase):
         intro_time = self.player.find_intro_chapter(chapters)
         self.assertIsNone(intro_time)
 
+    def test_playback_readiness(self):
+        """Test waiting for video info and for a chapter count that is real"""
+        import json
+        import time
+        from resources.lib.readiness import PlaybackReadiness
+        counts = [0, 0, 3]
+        methods = []
+
+        def rpc(request):
+            request = json.loads(request)
+            methods.append(request['method'])
+            if request['method'] == 'Player.GetActivePlayers':
+                return json.dumps({'result': [{'playerid': 0, 'type': 'audio'}, {'playerid': 1, 'type': 'video'}]})
+            self.assertEqual(request['params']['playerid'], 1)
+            count = counts.pop(0) if len(counts) > 1 else counts[0]
+            return json.dumps({'result': {'chaptercount': count}})
+
+        player = MagicMock()
+        player.isPlaying.return_value = True
+        monitor = MagicMock()
+        monitor.waitForAbort.side_effect = lambda delay: time.sleep(delay)
+        readiness = PlaybackReadiness(player, monitor)
+        readiness.CHAPTERS_SETTLE = 0.2
+        with patch('xbmc.executeJSONRPC', rpc, create=True):
+            # An early count of 0 is not taken for a file without chapters
+            self.assertTrue(readiness.wait_for_chapters())
+            self.assertEqual(counts, [3])
+            self.assertEqual(methods.count('Player.GetActivePlayers'), 1)
+
+            counts[:] = [0]
+            start = time.monotonic()
+            self.assertTrue(readiness.wait_for_chapters())
+            self.assertGreaterEqual(time.monotonic() - start, readiness.CHAPTERS_SETTLE)
+
+            player.isPlaying.return_value = False
+            self.assertFalse(readiness.wait_for_chapters())
+            self.assertFalse(readiness.wait_for_video_info())
+
+        # Detection goes ahead when the video info does not arrive in time
+        player.isPlaying.return_value = True
+        self.assertTrue(readiness.wait_for_video_info())
+        readiness.TITLE_GRACE = readiness.VIDEO_INFO_TIMEOUT = 0.1
+        with patch('xbmc.getInfoLabel', return_value=''):
+            self.assertTrue(readiness.wait_for_video_info())
+
+    def test_chapter_generation_guard(self):
+        """Test that background results for a previous file are dropped"""
+        chapters = [{'name': 'Intro', 'time': 0}, {'name': 'Main', 'time': 90}]
+        self.player.isPlaying = MagicMock(return_value=True)
+        self.player.resolve_markers = MagicMock()
+        self.player.show_skip_button = MagicMock()
+
+        # A new request cancels the one still running
+        first, second = MagicMock(), MagicMock()
+        self.player.chapter_manager.get_chapters_async = MagicMock(side_effect=[first, second])
+        self.player.show_info = {'file': '/tv/Test.Show.S01E02.mkv'}
+        self.player.request_chapters({}, MagicMock())
+        self.player.request_chapters({}, MagicMock())
+        first.cancel.assert_called_once_with()
+
+        stale = self.player.request_generation
+        self.player.cancel_background_requests()
+        self.player.on_chapters_ready(stale, chapters)
+        self.player.resolve_markers.assert_not_called()
+        self.player.on_chapters_ready(self.player.request_generation, chapters)
+        self.player.resolve_markers.assert_called_once_with(chapters)
+
+        # Refinement while the intro button is up moves the time it is hidden
+        self.player.scheduler.arm = MagicMock()
+        self.player.show_info = None
+        self.player.intro_start, self.player.intro_bookmark = 10, 70
+        self.player.active_segment = default.Segment(10, 70, 'intro')
+        self.player.start_timer(70)
+        stale = self.player.request_generation
+        self.player.cancel_background_requests()
+        self.player.on_refined(stale, (11, 71))
+        self.assertEqual(self.player.intro_bookmark, 70)
+        self.player.on_refined(self.player.request_generation, (11, 71))
+        self.assertEqual((self.player.intro_start, self.player.intro_bookmark), (11, 71))
+        self.assertEqual(self.player.active_segment, default.Segment(11, 71, 'intro'))
+        self.player.scheduler.arm.assert_called_with(71)
+        self.player.show_skip_button.assert_not_called()
+
+        # A marker timer that fires after the file changed does nothing
+        self.player.schedule_next_segment = MagicMock()
+        self.player.start_timer(90)
+        self.player.cancel_background_requests()
+        self.player.onPlayBackTime(95)
+        self.player.schedule_next_segment.assert_not_called()
+
     def test_cleanup(self):
         """Test cleanup method"""
         self.player.intro_bookmark = 100